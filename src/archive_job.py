@@ -0,0 +1,32 @@
+import logfire
+
+from data import archive, database
+from data.shard_router import ShardRouter
+from service.database_manager import SHARDS_DIRECTORY
+from service.monthly_invoice_manager import ARCHIVE_RETENTION_MONTHS
+
+logfire.configure()
+
+
+def main():
+    """
+    Archives the closed periods of every shard, e.g. from a monthly cron job.
+    Run it on the machine that owns the database files while no app process
+    or database server has them open, since DuckDB allows a single writer.
+    """
+    before = archive.retention_cutoff(ARCHIVE_RETENTION_MONTHS)
+    logfire.info(f"APP-STARTUP: Archiving closed periods before {before}")
+    router = ShardRouter(SHARDS_DIRECTORY, default_path=database.DB_PATH)
+    try:
+        for user_email in [None, *router.known_users()]:
+            with router.lease(user_email) as shard, shard.pool.cursor() as cursor:
+                result = archive.archive_closed_periods(cursor, before)
+            logfire.info(
+                f"APP-STARTUP: Archived {result.rows} of {shard.path} up to {result.archived_before}"
+            )
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+
+import logfire
+
+from data import backup, database
+from data.shard_router import ShardRouter
+from service.database_manager import (
+    DATABASE_BACKEND,
+    SHARDS_DIRECTORY,
+    get_remote_database,
+)
+
+logfire.configure()
+
+
+def main():
+    """
+    Backs up every shard (incrementally unless --full), e.g. from a nightly
+    cron job, or restores a bundle into a new database file. With
+    PSICOLOGIA_DB_BACKEND=remote the backups run inside the database server,
+    so the app keeps running; otherwise no app process may have the files open.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup_command = commands.add_parser("backup")
+    backup_command.add_argument("--full", action="store_true")
+    restore_command = commands.add_parser("restore")
+    restore_command.add_argument("bundle")
+    restore_command.add_argument("target")
+    arguments = parser.parse_args()
+
+    if arguments.command == "restore":
+        backup.restore_database(arguments.bundle, arguments.target)
+        return
+
+    router = ShardRouter(SHARDS_DIRECTORY, default_path=database.DB_PATH)
+    try:
+        for user_email in [None, *router.known_users()]:
+            if DATABASE_BACKEND == "remote":
+                result = get_remote_database().call(
+                    user_email, backup.backup_shard, incremental=not arguments.full
+                )
+            else:
+                with router.lease(user_email) as shard, shard.pool.cursor() as cursor:
+                    result = backup.backup_database(
+                        cursor, incremental=not arguments.full
+                    )
+            logfire.info(
+                f"APP-STARTUP: Backed up {result.rows} rows to {result.path} "
+                f"({result.bytes_per_second / 1e6:.1f} MB/s)"
+            )
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares validated and trusted reads of a year of appointments.
+
+Run from the `src` directory:
+
+    python -m benchmarks.trusted_reads
+"""
+
+import datetime
+import os
+import random
+import tempfile
+import timeit
+import uuid
+
+from data import appointment, database
+from data.models.appointment_models import Appointment, AppointmentStatus
+
+APPOINTMENTS_PER_YEAR: int = 10_000
+REPETITIONS: int = 5
+
+
+def _make_appointments(year: int) -> list[Appointment]:
+    patient_ids = [uuid.uuid4() for _ in range(60)]
+    first_day = datetime.date(year, 1, 1)
+    return [
+        Appointment(
+            patient_id=random.choice(patient_ids),
+            appointment_date=first_day + datetime.timedelta(days=random.randrange(365)),
+            appointment_time=datetime.time(random.randrange(8, 19), 0),
+            duration=random.choice([45, 90]),
+            status=AppointmentStatus.DONE,
+        )
+        for _ in range(APPOINTMENTS_PER_YEAR)
+    ]
+
+
+def main() -> None:
+    year = datetime.date.today().year - 1
+    period = [datetime.date(year, 1, 1), datetime.date(year, 12, 31)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = database.connect(os.path.join(directory, "benchmark.db"))
+        database.initialize(connection)
+        appointment.insert_many(connection, _make_appointments(year))
+
+        validated = min(
+            timeit.repeat(
+                lambda: appointment.get_all(connection, period),
+                number=1,
+                repeat=REPETITIONS,
+            )
+        )
+        trusted = min(
+            timeit.repeat(
+                lambda: appointment.get_all(connection, period, trusted=True),
+                number=1,
+                repeat=REPETITIONS,
+            )
+        )
+
+        # Decoding only, without the DuckDB fetch shared by both paths
+        rows = connection.execute(
+            "SELECT * FROM appointments WHERE appointment_date BETWEEN ? AND ?;",
+            period,
+        ).fetchall()
+        mapper = appointment.APPOINTMENT_MAPPER
+        validated_decode = min(
+            timeit.repeat(
+                lambda: mapper.many(connection, rows), number=1, repeat=REPETITIONS
+            )
+        )
+        trusted_decode = min(
+            timeit.repeat(
+                lambda: mapper.many(connection, rows, trusted=True),
+                number=1,
+                repeat=REPETITIONS,
+            )
+        )
+        connection.close()
+
+    print(f"Appointments read: {APPOINTMENTS_PER_YEAR}")
+    print(f"Validated read:    {validated * 1000:8.1f} ms")
+    print(f"Trusted read:      {trusted * 1000:8.1f} ms")
+    print(f"Speedup:           {validated / trusted:8.2f}x")
+    print(f"Validated decode:  {validated_decode * 1000:8.1f} ms")
+    print(f"Trusted decode:    {trusted_decode * 1000:8.1f} ms")
+    print(f"Decode speedup:    {validated_decode / trusted_decode:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,33 @@
 import datetime
-from typing import Any, Optional
-from uuid import UUID
+from typing import TYPE_CHECKING, Any, Optional
+from uuid import UUID, uuid4
 
 import duckdb
 import logfire
+import numpy as np
 
-from data.db_utils import insert_model
-from data.models.appointment_models import Appointment
+from data import archive
+from data.change_feed import ChangeKind
+from data.db_utils import (
+    ColumnarFormat,
+    WriteResult,
+    check_patch,
+    execute,
+    fetch_all,
+    fetch_columns,
+    fetch_one,
+    insert_model,
+    insert_models,
+    record_changes,
+    save_row,
+    transaction,
+    update_row,
+)
+from data.models.appointment_models import Appointment, AppointmentStatus
+from data.row_mapping import ChangeSet, RowMapper, construct_trusted
+
+if TYPE_CHECKING:
+    import pyarrow as pa
 
 logfire.configure()
 
@@ -36,12 +57,16 @@ def create_appointments_table(connection: duckdb.DuckDBPyConnection) -> None:
         raise
 
 
+def appointment_field_map(model: Appointment) -> dict[str, Any]:
+    return model.model_dump()
+
+
 def insert(connection: duckdb.DuckDBPyConnection, appointment: Appointment) -> None:
     try:
-        insert_model(
+        appointment.row_version = insert_model(
             connection,
             "appointments",
-            appointment.model_dump(),
+            appointment_field_map(appointment),
         )
         logfire.info(f"Inserted appointment with ID {appointment.id}")
     except Exception:
@@ -51,11 +76,140 @@ def insert(connection: duckdb.DuckDBPyConnection, appointment: Appointment) -> N
         raise
 
 
+def insert_many(
+    connection: duckdb.DuckDBPyConnection, appointments: list[Appointment]
+) -> None:
+    try:
+        versions = insert_models(
+            connection,
+            "appointments",
+            [appointment_field_map(appointment) for appointment in appointments],
+        )
+        for appointment in appointments:
+            appointment.row_version = versions.get(appointment.id)
+        logfire.info(f"Inserted {len(appointments)} appointments")
+    except Exception:
+        logfire.error(
+            f"Failed to insert {len(appointments)} appointments", exc_info=True
+        )
+        raise
+
+
+def save(
+    connection: duckdb.DuckDBPyConnection, appointment: Appointment
+) -> WriteResult:
+    """
+    Saves an appointment, refusing to overwrite changes made since it was read.
+    On success the model carries its new `row_version`.
+
+    Raises:
+        ValueError: If the appointment falls in an archived month, which is
+            closed.
+    """
+    if is_archived(connection, appointment.appointment_date):
+        raise ValueError(f"Appointment {appointment.id} is in an archived month.")
+    try:
+        result = save_row(
+            connection,
+            "appointments",
+            appointment_field_map(appointment),
+            appointment.row_version,
+        )
+        if result.applied:
+            appointment.row_version = result.row_version
+        logfire.info(
+            f"APP-LOGIC: Saved appointment {appointment.id}: {result.outcome.value}"
+        )
+        return result
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to save appointment {appointment.id}", exc_info=True
+        )
+        raise
+
+
+def patch(
+    connection: duckdb.DuckDBPyConnection,
+    appointment_id: UUID,
+    changes: dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> WriteResult:
+    """
+    Updates only the given columns (as stored) of an appointment, optionally
+    only if it is still at `expected_version`.
+    """
+    check_patch(changes, _PATCHABLE_COLUMNS)
+    try:
+        result = update_row(
+            connection, "appointments", changes, appointment_id, expected_version
+        )
+        logfire.info(
+            f"APP-LOGIC: Patched appointment {appointment_id}: {result.outcome.value}"
+        )
+        return result
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to patch appointment {appointment_id}", exc_info=True
+        )
+        raise
+
+
+def set_status(
+    connection: duckdb.DuckDBPyConnection,
+    appointment_id: UUID,
+    status: AppointmentStatus,
+    expected_version: Optional[int] = None,
+) -> WriteResult:
+    """Changes only the status of an appointment."""
+    return patch(connection, appointment_id, {"status": status.value}, expected_version)
+
+
+APPOINTMENT_COLUMNS: tuple[str, ...] = tuple(Appointment.model_fields.keys())
+_PATCHABLE_COLUMNS: frozenset[str] = frozenset(APPOINTMENT_COLUMNS) - {
+    "id",
+    "row_version",
+}
+
+
+def _make_appointment_from_(values: tuple[Any, ...]) -> Appointment:
+    return Appointment(**dict(zip(APPOINTMENT_COLUMNS, values)))
+
+
+_STATUSES: dict[str, AppointmentStatus] = {s.value: s for s in AppointmentStatus}
+
+
+def _construct_appointment_from_(values: tuple[Any, ...]) -> Appointment:
+    fields = dict(zip(APPOINTMENT_COLUMNS, values))
+    fields["status"] = _STATUSES[fields["status"]]
+    return construct_trusted(Appointment, fields)
+
+
+APPOINTMENT_MAPPER: RowMapper[Appointment] = RowMapper(
+    "appointments",
+    APPOINTMENT_COLUMNS,
+    _make_appointment_from_,
+    _construct_appointment_from_,
+)
+
+
 def _fetch_appointment_row(
     connection: duckdb.DuckDBPyConnection, appointment_id: UUID
 ) -> tuple[Any, ...] | None:
-    sql = "SELECT * FROM appointments WHERE id = ?;"
-    return connection.execute(sql, (appointment_id,)).fetchone()  # type: ignore
+    sql = "SELECT * FROM {source} WHERE id = ?;"
+    row = fetch_one(connection, sql.format(source="appointments"), (appointment_id,))
+    if row is None:
+        # Calendar events of archived months point at archived rows.
+        source = archive.all_view("appointments")
+        row = fetch_one(connection, sql.format(source=source), (appointment_id,))
+    return row
+
+
+def is_archived(
+    connection: duckdb.DuckDBPyConnection, appointment_date: datetime.date
+) -> bool:
+    """Returns whether the appointments of a day were moved to the archive."""
+    boundary = archive.archived_before(connection, "appointments")
+    return boundary is not None and appointment_date < boundary
 
 
 def get_by_id(
@@ -76,9 +230,7 @@ def get_by_id(
             )
             raise ValueError(f"No appointment found with ID {appointment_id}.")
 
-        appointment = Appointment(
-            **{k: v for k, v in zip(Appointment.model_fields.keys(), row)}
-        )
+        appointment = APPOINTMENT_MAPPER.one(connection, row)
         logfire.info(
             f"APP-LOGIC: Successfully retrieved appointment with ID {appointment.id}."
         )
@@ -91,43 +243,186 @@ def get_by_id(
         raise
 
 
+_GET_ALL_SQL: str = """
+        SELECT * FROM {source} 
+        WHERE status == 'done' AND 
+        appointment_date BETWEEN ? AND ?
+        """
+
+
+def _get_all_sql(
+    connection: duckdb.DuckDBPyConnection, period: list[datetime.date]
+) -> str:
+    # Periods reaching into archived months also read the Parquet archive.
+    return _GET_ALL_SQL.format(
+        source=archive.source_for(connection, "appointments", period[0])
+    )
+
+
+def _default_period() -> list[datetime.date]:
+    today: datetime.date = datetime.date.today()
+    return [
+        datetime.date(today.year, 1, 1),
+        today + datetime.timedelta(days=30),
+    ]
+
+
 def get_all(
     connection: duckdb.DuckDBPyConnection,
     period: Optional[list[datetime.date]] = None,  # type: ignore
+    trusted: bool = False,
 ) -> list[Appointment]:
     """
     Lists all appointments for a given period.
+    With `trusted`, models are built without validation (see `RowMapper`).
     """
     try:
         logfire.info("APP-LOGIC: Attempting to list appointments with patient names.")
-        sql = """
-        SELECT * FROM appointments 
-        WHERE status == 'done' AND 
-        appointment_date BETWEEN ? AND ?
+        period = period or _default_period()
+        results = fetch_all(
+            connection, _get_all_sql(connection, period), (period[0], period[1])
+        )
+
+        return APPOINTMENT_MAPPER.many(connection, results, trusted)
+    except Exception:
+        logfire.error(
+            "Failed to retrieve appointments.",
+            exc_info=True,
+        )
+        raise
+
+
+def copy_week(
+    connection: duckdb.DuckDBPyConnection,
+    source_week: list[datetime.date],
+    target_week: list[datetime.date],
+) -> int:
+    """
+    Copies the appointments of `source_week` into `target_week` (both as
+    `[first_day, last_day]`) unless the target week already has appointments.
+
+    Returns:
+        int: The number of appointments copied.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to copy appointments of {source_week[0]} to {target_week[0]}."
+        )
+        offset = target_week[0] - source_week[0]
+        with transaction(connection):
+            if get_all(connection, period=target_week, trusted=True):
+                logfire.info("APP-LOGIC: Target week already has appointments.")
+                return 0
+            appointments = get_all(connection, period=source_week)
+            for appointment in appointments:
+                appointment.id = uuid4()
+                appointment.appointment_date += offset
+            insert_many(connection, appointments)
+        return len(appointments)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to copy appointments of {source_week[0]}.",
+            exc_info=True,
+        )
+        raise
+
+
+def get_all_columns(
+    connection: duckdb.DuckDBPyConnection,
+    period: Optional[list[datetime.date]] = None,
+    columnar_format: ColumnarFormat = "numpy",
+) -> "dict[str, np.ndarray] | pa.Table":
+    """
+    Columnar variant of `get_all`: returns the same rows as NumPy columns or an
+    Arrow table, without building a model per row.
+    """
+    try:
+        logfire.info("APP-LOGIC: Attempting to list appointment columns.")
+        period = period or _default_period()
+        return fetch_columns(
+            connection,
+            _get_all_sql(connection, period),
+            (period[0], period[1]),
+            columnar_format,
+        )
+    except Exception:
+        logfire.error(
+            "APP-LOGIC: Failed to retrieve appointment columns.", exc_info=True
+        )
+        raise
+
+
+UNKNOWN_PATIENT_NAME: str = "Paciente desconhecido"
+
+_CALENDAR_EVENTS_SQL: str = """
+        SELECT
+            CAST(a.id AS VARCHAR) AS id,
+            CASE WHEN a.notes != ''
+                THEN COALESCE(p.name, ?) || ' (' || a.notes || ')'
+                ELSE COALESCE(p.name, ?)
+            END AS title,
+            a.appointment_date + a.appointment_time AS start,
+            a.duration
+        FROM {source} AS a
+        LEFT JOIN patients AS p ON p.id = a.patient_id
+        WHERE a.status == 'done' AND a.appointment_date BETWEEN ? AND ?
+        ORDER BY start, a.id
         """
 
-        if not period:
-            today: datetime.date = datetime.date.today()
-            period: list[datetime.date] = [
-                datetime.date(today.year, 1, 1),
-                today + datetime.timedelta(days=30),
-            ]
-        cursor = connection.execute(sql, (period[0], period[1]))
 
+def get_calendar_events(
+    connection: duckdb.DuckDBPyConnection,
+    period: Optional[list[datetime.date]] = None,
+) -> list[dict[str, Any]]:
+    """
+    Lists the appointments of a period as calendar event payloads (id, title,
+    ISO start and end), joined with their patient's name in one query.
+    Events of archived months are not `editable`.
+    """
+    try:
+        logfire.info("APP-LOGIC: Attempting to list calendar events.")
+        period = period or _default_period()
+        source = archive.source_for(connection, "appointments", period[0])
+        columns = fetch_columns(
+            connection,
+            _CALENDAR_EVENTS_SQL.format(source=source),
+            (UNKNOWN_PATIENT_NAME, UNKNOWN_PATIENT_NAME, period[0], period[1]),
+        )
+        starts = columns["start"].astype("datetime64[m]")
+        ends = event_end_times(starts, columns["duration"])
+        boundary = archive.archived_before(connection, "appointments")
+        editable = (
+            starts >= np.datetime64(boundary, "m")
+            if boundary is not None
+            else np.ones(len(starts), dtype=bool)
+        )
         return [
-            Appointment(
-                **{k: v for k, v in zip(Appointment.model_fields.keys(), result)}  # type: ignore
+            {
+                "id": id_,
+                "title": title,
+                "start": start,
+                "end": end,
+                "allDay": False,
+                "editable": is_editable,
+            }
+            for id_, title, start, end, is_editable in zip(
+                columns["id"].tolist(),
+                columns["title"].tolist(),
+                np.datetime_as_string(starts, unit="s").tolist(),
+                np.datetime_as_string(ends, unit="s").tolist(),
+                editable.tolist(),
             )
-            for result in cursor.fetchall()
         ]
     except Exception:
-        logfire.error(
-            "Failed to retrieve appointments.",
-            exc_info=True,
-        )
+        logfire.error("APP-LOGIC: Failed to retrieve calendar events.", exc_info=True)
         raise
 
 
+def event_end_times(starts: np.ndarray, durations: np.ndarray) -> np.ndarray:
+    """Adds the durations, in minutes, to the start times in one array operation."""
+    return starts.astype("datetime64[m]") + durations.astype("timedelta64[m]")
+
+
 def remove(connection: duckdb.DuckDBPyConnection, appointment_id: UUID) -> None:
     """
     Removes an appointment by ID from the 'appointments' table.
@@ -137,7 +432,8 @@ def remove(connection: duckdb.DuckDBPyConnection, appointment_id: UUID) -> None:
             f"APP-LOGIC: Attempting to remove appointment with ID {appointment_id}."
         )
         sql = "DELETE FROM appointments WHERE id = ?;"
-        connection.execute(sql, (appointment_id,))
+        execute(connection, sql, (appointment_id,))
+        record_changes(connection, "appointments", (appointment_id,), ChangeKind.DELETE)
         logfire.info(
             f"APP-LOGIC: Successfully removed appointment with ID {appointment_id}."
         )
@@ -147,3 +443,23 @@ def remove(connection: duckdb.DuckDBPyConnection, appointment_id: UUID) -> None:
             exc_info=True,
         )
         raise
+
+
+def get_changed_since(
+    connection: duckdb.DuckDBPyConnection, version: int, trusted: bool = False
+) -> ChangeSet[Appointment]:
+    """
+    Retrieves the appointments written or deleted after row `version`, for callers
+    that keep a copy in sync without reloading everything.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to retrieve appointments changed since version {version}."
+        )
+        return APPOINTMENT_MAPPER.changed_since(connection, version, trusted)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve appointments changed since version {version}.",
+            exc_info=True,
+        )
+        raise
@@ -0,0 +1,244 @@
+import datetime
+import glob
+import os
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+import duckdb
+import logfire
+
+from data.change_feed import ChangeKind
+from data.db_utils import execute, fetch_all, fetch_one, record_changes, transaction
+
+# Archived tables and the expression giving the first day of each row's
+# period. Appointments and invoices of a month are archived together.
+ARCHIVED_TABLES: dict[str, str] = {
+    "appointments": "date_trunc('month', appointment_date)",
+    "monthly_invoices": "make_date(invoice_year, invoice_month, 1)",
+}
+ARCHIVE_STATE_TABLE: str = "archive_state"
+# Months kept in the live tables by `archive_closed_periods` by default.
+DEFAULT_RETENTION_MONTHS: int = 12
+
+logfire.configure()
+
+
+@dataclass
+class ArchiveResult:
+    """What one archival run moved out of the live tables."""
+
+    archived_before: Optional[datetime.date]
+    rows: dict[str, int] = field(default_factory=dict)
+
+
+def all_view(table: str) -> str:
+    """Name of the view that unions `table` with its archive."""
+    return f"{table}_all"
+
+
+def create_views_statements() -> tuple[str, ...]:
+    """DDL of the unified views while nothing is archived yet."""
+    return tuple(
+        f"CREATE OR REPLACE VIEW {all_view(table)} AS SELECT * FROM {table};"
+        for table in ARCHIVED_TABLES
+    )
+
+
+def retention_cutoff(
+    retention_months: int = DEFAULT_RETENTION_MONTHS,
+    today: Optional[datetime.date] = None,
+) -> datetime.date:
+    """First day of the oldest month kept live when keeping `retention_months`."""
+    today = today or datetime.date.today()
+    months = today.year * 12 + today.month - 1 - retention_months
+    return datetime.date(months // 12, months % 12 + 1, 1)
+
+
+def archive_directory(connection: duckdb.DuckDBPyConnection) -> str:
+    """
+    Returns where the archive of the connection's current database lives:
+    next to its file, as `<name>_archive/<table>/year=YYYY/month=M/*.parquet`.
+    """
+    row = fetch_one(
+        connection,
+        "SELECT path FROM duckdb_databases() WHERE database_name = current_database();",
+    )
+    if not row or not row[0]:
+        raise ValueError("In-memory databases cannot be archived.")
+    return os.path.abspath(os.path.splitext(row[0])[0] + "_archive")
+
+
+def archived_before(
+    connection: duckdb.DuckDBPyConnection, table: str
+) -> Optional[datetime.date]:
+    """Returns the first period of `table` still kept live, if any was archived."""
+    row = fetch_one(
+        connection,
+        f"SELECT archived_before FROM {ARCHIVE_STATE_TABLE} WHERE table_name = ?;",
+        (table,),
+    )
+    return row[0] if row else None
+
+
+def source_for(
+    connection: duckdb.DuckDBPyConnection, table: str, since: datetime.date
+) -> str:
+    """
+    Returns the relation to read rows of `table` from `since` onwards: the
+    live table when that period is not archived, the unified view otherwise.
+    """
+    boundary = archived_before(connection, table)
+    if boundary is not None and since < boundary:
+        return all_view(table)
+    return table
+
+
+def archive_closed_periods(
+    connection: duckdb.DuckDBPyConnection, before: datetime.date
+) -> ArchiveResult:
+    """
+    Moves the appointments and invoices of every closed month before `before`
+    into Parquet files partitioned by year and month, and points the unified
+    views at them.
+
+    A month is closed once it has no pending or overdue invoice; archival
+    stops at the first month that is not, so `archived_before` always marks a
+    contiguous history. Archived rows leave the live tables as deletions on
+    the change feed.
+    """
+    directory = archive_directory(connection)
+    batch = uuid.uuid4().hex
+    try:
+        logfire.info(f"APP-LOGIC: Attempting to archive periods before {before}.")
+        with transaction(connection):
+            cutoff = _closed_cutoff(connection, before.replace(day=1))
+            result = ArchiveResult(archived_before=cutoff)
+            if cutoff is None:
+                logfire.info("APP-LOGIC: No closed periods to archive.")
+                return result
+            for table, period in ARCHIVED_TABLES.items():
+                result.rows[table] = _archive_table(
+                    connection, directory, batch, table, period, cutoff
+                )
+            refresh_views(connection)
+        logfire.info(f"APP-LOGIC: Archived periods before {cutoff}: {result.rows}.")
+        return result
+    except Exception:
+        # The Parquet files are not part of the rolled back transaction.
+        for path in glob.glob(
+            os.path.join(directory, "**", f"{batch}_*.parquet"), recursive=True
+        ):
+            os.remove(path)
+        logfire.error(
+            f"APP-LOGIC: Failed to archive periods before {before}.", exc_info=True
+        )
+        raise
+
+
+def refresh_views(connection: duckdb.DuckDBPyConnection) -> None:
+    """Recreates the unified views over the live tables and their archive."""
+    directory = archive_directory(connection)
+    for table in ARCHIVED_TABLES:
+        files = os.path.join(directory, table, "**", "*.parquet")
+        if glob.glob(files, recursive=True):
+            escaped = files.replace("'", "''")
+            execute(
+                connection,
+                f"""
+                CREATE OR REPLACE VIEW {all_view(table)} AS
+                SELECT * FROM {table}
+                UNION ALL BY NAME
+                SELECT * EXCLUDE (year, month)
+                FROM read_parquet('{escaped}', hive_partitioning = true);
+                """,
+            )
+        else:
+            execute(
+                connection,
+                f"CREATE OR REPLACE VIEW {all_view(table)} AS SELECT * FROM {table};",
+            )
+
+
+def drop_archive(connection: duckdb.DuckDBPyConnection) -> None:
+    """Deletes the archive files and forgets the archived periods."""
+    with transaction(connection):
+        execute(connection, f"DELETE FROM {ARCHIVE_STATE_TABLE};")
+        shutil.rmtree(archive_directory(connection), ignore_errors=True)
+        refresh_views(connection)
+
+
+def _closed_cutoff(
+    connection: duckdb.DuckDBPyConnection, before: datetime.date
+) -> Optional[datetime.date]:
+    row = fetch_one(
+        connection,
+        """
+        SELECT MIN(make_date(invoice_year, invoice_month, 1))
+        FROM monthly_invoices
+        WHERE payment_status IN ('pending', 'overdue');
+        """,
+    )
+    first_open = row[0] if row else None
+    cutoff = min(before, first_open) if first_open else before
+    current = archived_before(connection, "appointments")
+    if current is not None and cutoff < current:
+        # Rows added to already archived months are still swept up.
+        cutoff = current
+    has_rows = any(
+        fetch_one(
+            connection,
+            f"SELECT COUNT(*) FROM {table} WHERE {period} < ?;",
+            (cutoff,),
+        )[0]  # type: ignore
+        for table, period in ARCHIVED_TABLES.items()
+    )
+    return cutoff if has_rows else None
+
+
+def _archive_table(
+    connection: duckdb.DuckDBPyConnection,
+    directory: str,
+    batch: str,
+    table: str,
+    period: str,
+    cutoff: datetime.date,
+) -> int:
+    target = os.path.join(directory, table)
+    os.makedirs(target, exist_ok=True)
+    keys = [
+        key
+        for (key,) in fetch_all(
+            connection, f"SELECT id FROM {table} WHERE {period} < ?;", (cutoff,)
+        )
+    ]
+    if keys:
+        escaped = target.replace("'", "''")
+        execute(
+            connection,
+            f"""
+            COPY (
+                SELECT *, year({period}) AS year, month({period}) AS month
+                FROM {table} WHERE {period} < ?
+            ) TO '{escaped}' (
+                FORMAT parquet,
+                COMPRESSION zstd,
+                PARTITION_BY (year, month),
+                OVERWRITE_OR_IGNORE,
+                FILENAME_PATTERN '{batch}_{{i}}'
+            );
+            """,
+            (cutoff,),
+        )
+        execute(connection, f"DELETE FROM {table} WHERE {period} < ?;", (cutoff,))
+        record_changes(connection, table, keys, ChangeKind.DELETE)
+    execute(
+        connection,
+        f"""
+        INSERT INTO {ARCHIVE_STATE_TABLE} (table_name, archived_before) VALUES (?, ?)
+        ON CONFLICT (table_name) DO UPDATE SET archived_before = excluded.archived_before;
+        """,
+        (table, cutoff),
+    )
+    return len(keys)
@@ -0,0 +1,361 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+import duckdb
+import logfire
+
+from data import archive, database, patient_search
+from data.db_utils import (
+    ROW_VERSION_SEQUENCE,
+    VERSIONED_TABLES,
+    execute,
+    fetch_one,
+    transaction,
+    version_watermark,
+)
+from data.migrations import LATEST_VERSION, get_current_version
+
+# Tables in a bundle and their key columns, copied incrementally above their
+# high-water mark. Archived rows are read through the unified views and
+# restored as live rows, so `archive_state` is left out: a restored database
+# has no archive until the next archival run.
+BACKED_UP_TABLES: dict[str, tuple[str, ...]] = {
+    "patients": ("id",),
+    "appointments": ("id",),
+    "monthly_invoices": ("id",),
+    "documents": ("id",),
+    "psychologist_settings": ("user_email",),
+    "row_tombstones": ("table_name", "row_key"),
+}
+MANIFEST_FILE: str = "manifest.json"
+CHECKSUM_CHUNK_SIZE: int = 1 << 20
+
+logfire.configure()
+
+
+class BackupError(RuntimeError):
+    """Raised when a backup bundle is missing, incomplete or corrupted."""
+
+
+@dataclass
+class TableBackup:
+    """One table of a bundle: its Parquet file and what it covers."""
+
+    file: str
+    rows: int
+    bytes: int
+    sha256: str
+    # Highest row version the bundle (with its parents) holds for the table.
+    high_water_mark: int
+
+
+@dataclass
+class BackupResult:
+    """A written bundle; the manifest is this object as JSON."""
+
+    name: str
+    path: str
+    incremental: bool
+    parent: Optional[str]
+    schema_version: int
+    created_at: str
+    seconds: float = 0.0
+    tables: dict[str, TableBackup] = field(default_factory=dict)
+
+    @property
+    def rows(self) -> int:
+        return sum(table.rows for table in self.tables.values())
+
+    @property
+    def bytes(self) -> int:
+        return sum(table.bytes for table in self.tables.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+def backup_directory(connection: duckdb.DuckDBPyConnection) -> str:
+    """Returns where the bundles of the connection's current database go."""
+    row = fetch_one(
+        connection,
+        "SELECT path FROM duckdb_databases() WHERE database_name = current_database();",
+    )
+    if not row or not row[0]:
+        raise ValueError("In-memory databases cannot be backed up.")
+    return os.path.abspath(os.path.splitext(row[0])[0] + "_backups")
+
+
+def list_backups(directory: str) -> list[BackupResult]:
+    """Returns the complete bundles in `directory`, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        read_manifest(os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+        if os.path.exists(os.path.join(directory, name, MANIFEST_FILE))
+    ]
+
+
+def read_manifest(path: str) -> BackupResult:
+    """Loads the manifest of the bundle at `path`."""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as manifest:
+            values = json.load(manifest)
+    except (OSError, ValueError) as error:
+        raise BackupError(f"Unreadable backup manifest in '{path}'.") from error
+    values["tables"] = {
+        table: TableBackup(**backup) for table, backup in values["tables"].items()
+    }
+    values["path"] = path
+    return BackupResult(**values)
+
+
+def backup_database(
+    connection: duckdb.DuckDBPyConnection,
+    directory: Optional[str] = None,
+    incremental: bool = True,
+) -> BackupResult:
+    """
+    Writes a bundle of zstd-compressed Parquet files, one per table, plus a
+    manifest with row counts, SHA-256 checksums and high-water marks.
+
+    An incremental bundle holds only the rows and tombstones written after
+    the latest bundle's high-water marks (a full one is written when there is
+    none yet). All tables are read in one transaction, so a bundle is
+    consistent. Marks never pass a version an uncommitted write may still
+    commit (see `version_watermark`), so such a write lands in the next
+    bundle; rows above the mark are then copied twice, which restores apply
+    harmlessly.
+
+    Archived months are backed up with the live rows, from the Parquet
+    archive, and the deletions archival records are left out.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): The connection object to the database.
+        directory (Optional[str]): Where bundles go; see `backup_directory`.
+        incremental (bool): Only copy what changed since the latest bundle.
+
+    Returns:
+        BackupResult: The manifest of the new bundle, with throughput metrics.
+    """
+    directory = directory or backup_directory(connection)
+    started = time.perf_counter()
+    now = datetime.datetime.now()
+    previous = list_backups(directory)
+    parent = previous[-1] if incremental and previous else None
+    name = now.strftime("%Y%m%dT%H%M%S%f") + ("_incremental" if parent else "_full")
+    partial = os.path.join(directory, f".{name}.partial")
+    try:
+        logfire.info(f"APP-LOGIC: Attempting to write backup '{name}'.")
+        os.makedirs(partial)
+        result = BackupResult(
+            name=name,
+            path=os.path.join(directory, name),
+            incremental=parent is not None,
+            parent=parent.name if parent else None,
+            schema_version=get_current_version(connection),
+            created_at=now.isoformat(),
+        )
+        # Read before the snapshot starts: whatever is settled by now is in it.
+        watermark = version_watermark(connection)
+        with transaction(connection):
+            for table in BACKED_UP_TABLES:
+                since = parent.tables[table].high_water_mark if parent else 0
+                result.tables[table] = _backup_table(
+                    connection, partial, table, since, watermark
+                )
+        result.seconds = time.perf_counter() - started
+        _write_manifest(partial, result)
+        os.rename(partial, result.path)
+        logfire.info(
+            f"APP-LOGIC: Wrote backup '{name}': {result.rows} rows, {result.bytes} bytes "
+            f"in {result.seconds:.2f}s ({result.bytes_per_second / 1e6:.1f} MB/s)."
+        )
+        return result
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        logfire.error(f"APP-LOGIC: Failed to write backup '{name}'.", exc_info=True)
+        raise
+
+
+def backup_shard(
+    connection: duckdb.DuckDBPyConnection, incremental: bool = True
+) -> BackupResult:
+    """
+    `backup_database` into the bundles directory next to the database file,
+    the only form the database server runs for its clients.
+    """
+    return backup_database(connection, incremental=incremental)
+
+
+def verify_backup(path: str) -> BackupResult:
+    """Checks the files of the bundle at `path` against its manifest checksums."""
+    result = read_manifest(path)
+    for table, backup in result.tables.items():
+        file_path = os.path.join(path, backup.file)
+        if not os.path.exists(file_path) or _sha256(file_path) != backup.sha256:
+            raise BackupError(f"Backup '{result.name}' has a corrupted '{table}' file.")
+    return result
+
+
+def restore_database(path: str, target_path: str) -> BackupResult:
+    """
+    Restores the bundle at `path`, applied on top of the bundles it
+    increments, into a new database file at `target_path`. Every bundle of
+    the chain is verified before anything is written.
+
+    Returns:
+        BackupResult: The restored bundle, with the restore's own throughput.
+    """
+    started = time.perf_counter()
+    if os.path.exists(target_path):
+        raise ValueError(f"'{target_path}' already exists.")
+    try:
+        logfire.info(f"APP-LOGIC: Attempting to restore '{path}' into '{target_path}'.")
+        chain = _backup_chain(path)
+        if chain[-1].schema_version > LATEST_VERSION:
+            raise BackupError("The backup comes from a newer version of the app.")
+        connection = database.connect(target_path)
+        try:
+            database.initialize(connection)
+            with transaction(connection):
+                for bundle in chain:
+                    _restore_bundle(connection, bundle)
+                # Derived from the patients, so rebuilt rather than backed up.
+                patient_search.rebuild_search_index(connection)
+                row = fetch_one(
+                    connection,
+                    "SELECT MAX(v) FROM ("
+                    + " UNION ALL ".join(
+                        f"SELECT MAX(row_version) AS v FROM {table}"
+                        for table in BACKED_UP_TABLES
+                    )
+                    + ");",
+                )
+                execute(
+                    connection,
+                    f"CREATE OR REPLACE SEQUENCE {ROW_VERSION_SEQUENCE} "
+                    f"START WITH {(row[0] or 0) + 1 if row else 1};",
+                )
+        finally:
+            connection.close()
+        restored = chain[-1]
+        restored.seconds = time.perf_counter() - started
+        logfire.info(
+            f"APP-LOGIC: Restored {len(chain)} bundles into '{target_path}' "
+            f"in {restored.seconds:.2f}s."
+        )
+        return restored
+    except Exception:
+        for leftover in (target_path, f"{target_path}.wal"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        logfire.error(f"APP-LOGIC: Failed to restore '{path}'.", exc_info=True)
+        raise
+
+
+def _backup_table(
+    connection: duckdb.DuckDBPyConnection,
+    directory: str,
+    table: str,
+    since: int,
+    watermark: int,
+) -> TableBackup:
+    file = f"{table}.parquet"
+    file_path = os.path.join(directory, file)
+    source = archive.all_view(table) if table in archive.ARCHIVED_TABLES else table
+    where = "WHERE row_version > ?"
+    if table == "row_tombstones":
+        # Archival deletes rows from the live tables, but they still exist.
+        where += "".join(
+            f" AND NOT EXISTS (SELECT 1 FROM {archive.all_view(archived)} AS a "
+            f"WHERE row_tombstones.table_name = '{archived}' "
+            "AND CAST(a.id AS VARCHAR) = row_tombstones.row_key)"
+            for archived in archive.ARCHIVED_TABLES
+        )
+    row = fetch_one(connection, f"SELECT MAX(row_version) FROM {source};")
+    mark = max(since, min(row[0] or 0, watermark)) if row else since
+    escaped = file_path.replace("'", "''")
+    execute(
+        connection,
+        f"COPY (SELECT * FROM {source} {where}) TO '{escaped}' "
+        "(FORMAT parquet, COMPRESSION zstd);",
+        (since,),
+    )
+    row = fetch_one(connection, f"SELECT COUNT(*) FROM read_parquet('{escaped}');")
+    return TableBackup(
+        file=file,
+        rows=row[0] if row else 0,
+        bytes=os.path.getsize(file_path),
+        sha256=_sha256(file_path),
+        high_water_mark=mark,
+    )
+
+
+def _restore_bundle(
+    connection: duckdb.DuckDBPyConnection, bundle: BackupResult
+) -> None:
+    files = {
+        table: os.path.join(bundle.path, backup.file).replace("'", "''")
+        for table, backup in bundle.tables.items()
+    }
+    for table, keys in BACKED_UP_TABLES.items():
+        # Not INSERT OR REPLACE: with a secondary index on the table, DuckDB's
+        # replace keeps the old values of the indexed columns.
+        matches = " AND ".join(f"f.{key} = {table}.{key}" for key in keys)
+        execute(
+            connection,
+            f"DELETE FROM {table} WHERE EXISTS ("
+            f"SELECT 1 FROM read_parquet('{files[table]}') AS f WHERE {matches});",
+        )
+        execute(
+            connection,
+            f"INSERT INTO {table} BY NAME SELECT * FROM read_parquet('{files[table]}');",
+        )
+        if bundle.incremental and table in VERSIONED_TABLES:
+            # Rows deleted since the parent bundle and not written again.
+            execute(
+                connection,
+                f"DELETE FROM {table} WHERE EXISTS ("
+                f"SELECT 1 FROM read_parquet('{files['row_tombstones']}') AS t "
+                f"WHERE t.table_name = ? "
+                f"AND t.row_key = CAST({table}.{keys[0]} AS VARCHAR) "
+                f"AND t.row_version > {table}.row_version);",
+                (table,),
+            )
+
+
+def _backup_chain(path: str) -> list[BackupResult]:
+    chain = [verify_backup(path)]
+    while chain[0].parent is not None:
+        parent_path = os.path.join(os.path.dirname(path), chain[0].parent)
+        if not os.path.isdir(parent_path):
+            raise BackupError(f"Backup '{chain[0].name}' is missing its parent.")
+        chain.insert(0, verify_backup(parent_path))
+    return chain
+
+
+def _write_manifest(directory: str, result: BackupResult) -> None:
+    values = asdict(result)
+    values.pop("path")
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as file:
+        json.dump(values, file, indent=2)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(CHECKSUM_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,152 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Iterable, Optional
+
+import logfire
+
+logfire.configure()
+
+# Number of recent events kept for `changes_since`; readers that fall further
+# behind have to reload everything.
+HISTORY_SIZE: int = 4096
+# Table name of the events published by `publish_reset`.
+RESET_TABLE: str = "*"
+
+
+class ChangeKind(str, Enum):
+    # Writes are upserts, which do not tell new rows from replaced ones.
+    UPSERT = "upsert"
+    UPDATE = "update"
+    DELETE = "delete"
+    # Changes were missed, e.g. the database server was lost: anything
+    # derived from the data has to be reloaded.
+    RESET = "reset"
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """One committed change of a single row."""
+
+    sequence: int
+    table: str
+    key: Any
+    kind: ChangeKind
+
+
+Subscriber = Callable[[list[ChangeEvent]], None]
+
+_subscribers: dict[int, tuple[Subscriber, Optional[frozenset[str]]]] = {}
+_history: deque[ChangeEvent] = deque(maxlen=HISTORY_SIZE)
+_sequence: int = 0
+_next_token: int = 0
+_lock = threading.Lock()
+
+
+def subscribe(callback: Subscriber, tables: Optional[Iterable[str]] = None) -> int:
+    """
+    Registers `callback` for committed changes, optionally only of `tables`.
+
+    The callback runs synchronously on the committing thread with the events
+    of one write; it must be quick and must not raise.
+
+    Returns:
+        int: A token for `unsubscribe`.
+    """
+    global _next_token
+    with _lock:
+        _next_token += 1
+        _subscribers[_next_token] = (
+            callback,
+            frozenset(tables) if tables is not None else None,
+        )
+        return _next_token
+
+
+def unsubscribe(token: int) -> None:
+    with _lock:
+        _subscribers.pop(token, None)
+
+
+def publish(table: str, keys: Iterable[Any], kind: ChangeKind) -> list[ChangeEvent]:
+    """Records committed changes of `table` and hands them to the subscribers."""
+    global _sequence
+    with _lock:
+        events = []
+        for key in keys:
+            _sequence += 1
+            events.append(ChangeEvent(_sequence, table, key, kind))
+        _history.extend(events)
+        subscribers = [
+            callback
+            for callback, tables in _subscribers.values()
+            if tables is None or table in tables
+        ]
+    if not events:
+        return events
+    for callback in subscribers:
+        try:
+            callback(events)
+        except Exception:
+            logfire.error(
+                f"APP-LOGIC: Change feed subscriber failed for {table}.", exc_info=True
+            )
+    return events
+
+
+def publish_reset() -> ChangeEvent:
+    """
+    Tells every subscriber, whatever its tables, that changes were missed.
+
+    The history is cleared too, so `changes_since` asks readers that are
+    behind to reload.
+    """
+    global _sequence
+    with _lock:
+        _sequence += 1
+        event = ChangeEvent(_sequence, RESET_TABLE, None, ChangeKind.RESET)
+        _history.clear()
+        subscribers = [callback for callback, _ in _subscribers.values()]
+    for callback in subscribers:
+        try:
+            callback([event])
+        except Exception:
+            logfire.error(
+                "APP-LOGIC: Change feed subscriber failed on reset.", exc_info=True
+            )
+    return event
+
+
+def current_sequence() -> int:
+    """Returns the sequence number of the latest published change."""
+    with _lock:
+        return _sequence
+
+
+def changes_since(
+    sequence: int, tables: Optional[Iterable[str]] = None
+) -> Optional[list[ChangeEvent]]:
+    """
+    Returns the changes published after `sequence`, oldest first.
+
+    Returns None when some of them already fell out of the history, in which
+    case the caller has to reload instead of applying a delta.
+    """
+    wanted = frozenset(tables) if tables is not None else None
+    with _lock:
+        if sequence < _sequence and (
+            not _history or _history[0].sequence > sequence + 1
+        ):
+            return None
+        return [
+            event
+            for event in _history
+            if event.sequence > sequence and (wanted is None or event.table in wanted)
+        ]
+
+
+def reset() -> None:
+    """Clears the history; subscribers stay registered."""
+    with _lock:
+        _history.clear()
@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import duckdb
+import logfire
+
+logfire.configure()
+
+
+class PoolTimeoutError(TimeoutError):
+    """Raised when no cursor becomes available within the checkout timeout."""
+
+
+@dataclass
+class PoolStats:
+    """Snapshot of the cursor pool wait-time metrics."""
+
+    size: int
+    open_cursors: int
+    checkouts: int = 0
+    timeouts: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def average_wait_seconds(self) -> float:
+        return self.total_wait_seconds / self.checkouts if self.checkouts else 0.0
+
+
+class CursorPool:
+    """
+    A bounded pool of DuckDB cursors created from a single parent connection.
+
+    Each `connection.cursor()` is an independent handle on the same database,
+    so threads holding different cursors can read in parallel without sharing
+    one connection object. Cursors are created lazily up to `size` and handed
+    out through the `cursor()` context manager. A `cursor_factory` replaces
+    `connection.cursor` when new cursors need extra setup (e.g. `USE`).
+
+    A cursor returned by a block that raised has its transaction rolled back
+    before it is reused, and is discarded if that fails. Cursors returned
+    after `close()` are closed instead of pooled.
+    """
+
+    def __init__(
+        self,
+        connection: duckdb.DuckDBPyConnection,
+        size: int = 4,
+        checkout_timeout: float = 5.0,
+        cursor_factory: Optional[Callable[[], duckdb.DuckDBPyConnection]] = None,
+    ) -> None:
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self._open_cursor = cursor_factory or connection.cursor
+        self._size = size
+        self._checkout_timeout = checkout_timeout
+        self._idle: queue.LifoQueue[duckdb.DuckDBPyConnection] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open_cursors = 0
+        self._closed = False
+        self._stats = PoolStats(size=size, open_cursors=0)
+
+    def _acquire(self, timeout: float) -> duckdb.DuckDBPyConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._open_cursors < self._size:
+                self._open_cursors += 1
+                return self._open_cursor()
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(
+                f"No database cursor available after {timeout:.1f}s."
+            ) from None
+
+    @contextmanager
+    def cursor(
+        self, timeout: float | None = None
+    ) -> Iterator[duckdb.DuckDBPyConnection]:
+        """
+        Checks out a cursor for the duration of the `with` block.
+
+        Args:
+            timeout (float | None): Seconds to wait for a free cursor. Defaults
+                to the pool's checkout timeout.
+
+        Raises:
+            PoolTimeoutError: If every cursor stays busy for the whole timeout.
+        """
+        timeout = self._checkout_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        try:
+            cursor = self._acquire(timeout)
+        except PoolTimeoutError:
+            with self._lock:
+                self._stats.timeouts += 1
+            logfire.warning(
+                f"APP-LOGIC: Cursor pool exhausted after waiting {timeout:.1f}s."
+            )
+            raise
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._stats.checkouts += 1
+            self._stats.total_wait_seconds += waited
+            self._stats.max_wait_seconds = max(self._stats.max_wait_seconds, waited)
+
+        try:
+            yield cursor
+        except BaseException:
+            self._release(cursor, failed=True)
+            raise
+        self._release(cursor, failed=False)
+
+    def _release(self, cursor: duckdb.DuckDBPyConnection, failed: bool) -> None:
+        if failed and not self._reset(cursor):
+            self._discard(cursor)
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle.put(cursor)
+                return
+        self._discard(cursor)
+
+    def _reset(self, cursor: duckdb.DuckDBPyConnection) -> bool:
+        """Rolls back what the failed block left open; False if unusable."""
+        try:
+            cursor.rollback()
+        except duckdb.TransactionException:
+            # No transaction was active.
+            pass
+        except Exception:
+            logfire.warning(
+                "APP-LOGIC: Discarding a pooled cursor that could not be reset.",
+                exc_info=True,
+            )
+            return False
+        return True
+
+    def _discard(self, cursor: duckdb.DuckDBPyConnection) -> None:
+        try:
+            cursor.close()
+        finally:
+            with self._lock:
+                self._open_cursors -= 1
+
+    def stats(self) -> PoolStats:
+        """Returns a copy of the current pool metrics."""
+        with self._lock:
+            return PoolStats(
+                size=self._size,
+                open_cursors=self._open_cursors,
+                checkouts=self._stats.checkouts,
+                timeouts=self._stats.timeouts,
+                total_wait_seconds=self._stats.total_wait_seconds,
+                max_wait_seconds=self._stats.max_wait_seconds,
+            )
+
+    def close(self) -> None:
+        """
+        Closes every idle cursor; checked-out ones are closed when returned.
+        The parent connection is left open.
+        """
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                cursor = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(cursor)
@@ -1,8 +1,14 @@
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+
 import duckdb
 import logfire
 
 from data.appointment import create_appointments_table
 from data.documents import create_documents_table
+from data.migrations import LATEST_VERSION, get_current_version, migrate
 from data.monthly_invoice import create_monthly_invoices_table
 from data.patient import create_patients_table
 from data.psychologist_settings import create_psychologist_settings_table
@@ -12,7 +18,21 @@ DB_PATH: str = "data/psychologist_app.db"
 logfire.configure()
 
 
-def connect(db_path: str) -> duckdb.DuckDBPyConnection:
+@dataclass
+class BootstrapStats:
+    """Counters showing how often schema bootstrap actually touched the database."""
+
+    calls: int = 0
+    version_checks: int = 0
+    ddl_runs: int = 0
+
+
+_bootstrap_stats = BootstrapStats()
+_bootstrapped_databases: set[tuple[str, int, int]] = set()
+_bootstrap_lock = threading.Lock()
+
+
+def connect(db_path: str, read_only: bool = False) -> duckdb.DuckDBPyConnection:
     """
     Establishes a connection to the DuckDB database.
 
@@ -21,6 +41,9 @@ def connect(db_path: str) -> duckdb.DuckDBPyConnection:
 
     Args:
         db_path (str): The file path for the database.
+        read_only (bool): Opens the file without write access, e.g. an
+            analytics snapshot (see `copy_database`). DuckDB does not allow a
+            read-write and a read-only connection to the same file at once.
 
     Returns:
         duckdb.DuckDBPyConnection: A connection object to the database.
@@ -28,7 +51,7 @@ def connect(db_path: str) -> duckdb.DuckDBPyConnection:
     try:
         logfire.info(f"APP-LOGIC: Attempting to connect to database at '{db_path}'")
         connection: duckdb.DuckDBPyConnection = duckdb.connect(  # type: ignore
-            database=db_path, read_only=False
+            database=db_path, read_only=read_only
         )
         logfire.info("APP-LOGIC: Database connection successful.")
     except Exception:
@@ -38,12 +61,39 @@ def connect(db_path: str) -> duckdb.DuckDBPyConnection:
     return connection
 
 
+def copy_database(connection: duckdb.DuckDBPyConnection, target_path: str) -> None:
+    """
+    Writes a transactionally consistent copy of the connection's current
+    database (schema and data) to a new file at `target_path`.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): A connection on the source database.
+        target_path (str): Where the copy is written; must not exist yet.
+    """
+    catalog = f"copy_{uuid.uuid4().hex}"
+    try:
+        logfire.info(f"APP-LOGIC: Copying the database to '{target_path}'.")
+        source = connection.execute("SELECT current_database();").fetchone()[0]  # type: ignore
+        escaped_path = target_path.replace("'", "''")
+        connection.execute(f"ATTACH '{escaped_path}' AS \"{catalog}\";")
+        try:
+            connection.execute(f'COPY FROM DATABASE "{source}" TO "{catalog}";')
+        finally:
+            connection.execute(f'DETACH "{catalog}";')
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to copy the database to '{target_path}'.", exc_info=True
+        )
+        raise
+
+
 def initialize(connection: duckdb.DuckDBPyConnection) -> None:
     """
     Initializes the database by creating necessary tables.
 
     This function is called to set up the database schema, ensuring that
     all required tables are created before any operations are performed.
+    Pending schema migrations (e.g. secondary indexes) are applied afterwards.
 
     Args:
         connection (duckdb.DuckDBPyConnection): The connection object to the database.
@@ -55,5 +105,72 @@ def initialize(connection: duckdb.DuckDBPyConnection) -> None:
     create_monthly_invoices_table(connection)
     create_documents_table(connection)
     create_psychologist_settings_table(connection)
+    migrate(connection)
 
     logfire.info("APP-LOGIC: Database schema initialized successfully.")
+
+
+def get_bootstrap_stats() -> BootstrapStats:
+    """Returns a copy of the schema bootstrap counters."""
+    with _bootstrap_lock:
+        return BootstrapStats(**vars(_bootstrap_stats))
+
+
+def _database_fingerprint(
+    connection: duckdb.DuckDBPyConnection, db_path: str | None
+) -> tuple[str, int, int]:
+    if db_path is None:
+        row = connection.execute(
+            "SELECT path FROM duckdb_databases() WHERE database_name = current_database();"
+        ).fetchone()
+        db_path = row[0] if row and row[0] else ":memory:"  # type: ignore
+    path = os.path.abspath(db_path)  # type: ignore
+    if not os.path.exists(path):
+        return (path, id(connection), 0)
+    stat = os.stat(path)
+    return (path, stat.st_dev, stat.st_ino)
+
+
+def _is_schema_current(connection: duckdb.DuckDBPyConnection) -> bool:
+    row = connection.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() "
+        "WHERE table_name = 'schema_version' AND database_name = current_database();"
+    ).fetchone()
+    if not row or not row[0]:
+        return False
+    return get_current_version(connection) >= LATEST_VERSION
+
+
+def ensure_schema(
+    connection: duckdb.DuckDBPyConnection, db_path: str | None = None
+) -> bool:
+    """
+    Bootstraps the schema at most once per process and database file.
+
+    The first call for a database file compares its 'schema_version' with the
+    latest migration and only runs `initialize` when they differ. Later calls
+    for the same file return immediately; when `db_path` is given they do not
+    issue any SQL at all.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): The connection object to the database.
+        db_path (str | None): The database file path, used to fingerprint it.
+
+    Returns:
+        bool: True if the DDL in `initialize` was executed by this call.
+    """
+    fingerprint = _database_fingerprint(connection, db_path)
+    with _bootstrap_lock:
+        _bootstrap_stats.calls += 1
+        if fingerprint in _bootstrapped_databases:
+            return False
+
+        _bootstrap_stats.version_checks += 1
+        ran_ddl = not _is_schema_current(connection)
+        if ran_ddl:
+            _bootstrap_stats.ddl_runs += 1
+            initialize(connection)
+        else:
+            logfire.info("APP-LOGIC: Database schema already at the latest version.")
+        _bootstrapped_databases.add(fingerprint)
+        return ran_ddl
@@ -1,27 +1,598 @@
-from typing import Any
+import threading
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Sequence,
+)
 
 import duckdb
 import logfire
+import numpy as np
+
+from data import change_feed
+from data.change_feed import ChangeKind
+from data.entity_cache import entity_cache
+from data.query_stats import QueryTimer
+
+if TYPE_CHECKING:
+    import pyarrow as pa
 
 logfire.configure()
 
+ColumnarFormat = Literal["numpy", "arrow"]
+
+# Keeps the number of bound parameters per statement well below DuckDB's limits.
+BULK_INSERT_CHUNK_SIZE: int = 500
+
+# Tables whose rows carry `created_at`, `updated_at` and `row_version`; the
+# columns are added by migration 5 and maintained by the write helpers below.
+VERSIONED_TABLES: tuple[str, ...] = (
+    "patients",
+    "appointments",
+    "monthly_invoices",
+    "documents",
+    "psychologist_settings",
+)
+# Shared by every versioned table, so versions are ordered across tables.
+ROW_VERSION_SEQUENCE: str = "row_version_seq"
+NEXT_ROW_VERSION: str = f"nextval('{ROW_VERSION_SEQUENCE}')"
+
+
+class WriteOutcome(str, Enum):
+    APPLIED = "applied"
+    CONFLICT = "conflict"
+    NOT_FOUND = "not found"
+    # Accepted by the write-behind queue; a conflict is reported later.
+    QUEUED = "queued"
+
+
+@dataclass(frozen=True)
+class WriteResult:
+    """
+    Result of a version-checked write.
+
+    `row_version` is the row's new version when the write was applied, or the
+    version that is now in the database when it conflicted.
+    """
+
+    outcome: WriteOutcome
+    row_version: Optional[int] = None
+
+    @property
+    def applied(self) -> bool:
+        return self.outcome == WriteOutcome.APPLIED
+
+
+class TransactionAbortedError(RuntimeError):
+    """
+    Raised when an outer transaction reaches its end after a nested block
+    failed: the whole transaction is rolled back instead of committed.
+    """
+
+
+@dataclass
+class _TransactionState:
+    depth: int = 0
+    rollback_only: bool = False
+    after_commit: list[Callable[[], None]] = field(default_factory=list)
+
+
+# Keyed by connection (or cursor) so nesting is tracked per handle; cursors
+# are only used by one thread at a time (see `CursorPool`).
+_transactions: "weakref.WeakKeyDictionary[duckdb.DuckDBPyConnection, _TransactionState]" = weakref.WeakKeyDictionary()
+
+
+WriteHook = Callable[[duckdb.DuckDBPyConnection, list[Any], ChangeKind], None]
+# Run by `record_changes` for every write to their table, on the writing
+# connection, e.g. to keep a derived table such as the patient search index
+# in step with its source.
+_write_hooks: dict[str, list[WriteHook]] = {}
+
+
+def on_write(table: str, hook: WriteHook) -> None:
+    """Registers `hook(connection, keys, kind)` for the writes to `table`."""
+    _write_hooks.setdefault(table, []).append(hook)
+
+
+def in_transaction(connection: duckdb.DuckDBPyConnection) -> bool:
+    """Tells whether `transaction()` currently has a transaction open on `connection`."""
+    state = _transactions.get(connection)
+    return bool(state and state.depth)
+
+
+@contextmanager
+def transaction(
+    connection: duckdb.DuckDBPyConnection,
+) -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Runs the enclosed statements in one transaction that commits once, on exit.
+
+    Blocks may be nested: only the outermost one issues `BEGIN`/`COMMIT`, so
+    helpers that open their own transaction (e.g. `insert_models`) join the
+    caller's. DuckDB has no savepoints, so a nested block cannot be rolled
+    back on its own: when it fails, the transaction is marked rollback-only
+    and, even if the caller handles the exception, the outermost block rolls
+    everything back and raises `TransactionAbortedError`.
+    """
+    state = _transactions.setdefault(connection, _TransactionState())
+    if state.depth:
+        state.depth += 1
+        try:
+            yield connection
+        except BaseException:
+            state.rollback_only = True
+            raise
+        finally:
+            state.depth -= 1
+        return
+
+    connection.execute("BEGIN TRANSACTION;")
+    state.depth, state.rollback_only = 1, False
+    try:
+        yield connection
+        if state.rollback_only:
+            raise TransactionAbortedError(
+                "A nested transaction block failed; rolling back the transaction."
+            )
+        connection.execute("COMMIT;")
+    except BaseException:
+        connection.execute("ROLLBACK;")
+        raise
+    else:
+        callbacks = state.after_commit
+        state.after_commit = []
+        for callback in callbacks:
+            callback()
+    finally:
+        state.depth, state.rollback_only = 0, False
+        state.after_commit = []
+        _release_versions(connection)
+
+
+def after_commit(
+    connection: duckdb.DuckDBPyConnection, callback: Callable[[], None]
+) -> None:
+    """
+    Runs `callback` once the current `transaction()` on `connection` commits,
+    or right away when no transaction is open. Dropped on rollback.
+    """
+    state = _transactions.get(connection)
+    if state and state.depth:
+        state.after_commit.append(callback)
+    else:
+        callback()
+
+
+# Row versions come from a sequence, which hands them out when a statement
+# runs rather than when it commits: a writer may still commit version N after
+# a reader has seen N + 1. Until it commits, every writer is registered here
+# with the sequence value it started from (see `version_watermark`).
+_version_lock = threading.Lock()
+_version_writers: dict[int, tuple[Any, int]] = {}
+_databases: "weakref.WeakKeyDictionary[duckdb.DuckDBPyConnection, Any]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _database_of(connection: duckdb.DuckDBPyConnection) -> Any:
+    database = _databases.get(connection)
+    if database is None:
+        database = fetch_one(
+            connection,
+            "SELECT database_name, path FROM duckdb_databases() "
+            "WHERE database_name = current_database();",
+        )
+        _databases[connection] = database
+    return database
+
+
+def _sequence_value(connection: duckdb.DuckDBPyConnection) -> int:
+    # Sequences are not transactional: this sees versions drawn by every
+    # connection, committed or not.
+    row = fetch_one(
+        connection,
+        "SELECT COALESCE(last_value, start_value - 1) FROM duckdb_sequences() "
+        "WHERE sequence_name = ? AND database_name = current_database();",
+        (ROW_VERSION_SEQUENCE,),
+    )
+    return row[0] if row else 0
+
+
+@contextmanager
+def drawing_versions(connection: duckdb.DuckDBPyConnection) -> Iterator[None]:
+    """
+    Wraps a statement that draws row versions: `connection` stays registered
+    as an uncommitted writer until its `transaction()` ends, or until the
+    statement returns when it runs in autocommit mode.
+    """
+    database = _database_of(connection)
+    with _version_lock:
+        if id(connection) not in _version_writers:
+            _version_writers[id(connection)] = (database, _sequence_value(connection))
+    try:
+        yield
+    finally:
+        if not in_transaction(connection):
+            _release_versions(connection)
+
+
+def _release_versions(connection: duckdb.DuckDBPyConnection) -> None:
+    with _version_lock:
+        _version_writers.pop(id(connection), None)
+
+
+def version_watermark(connection: duckdb.DuckDBPyConnection) -> int:
+    """
+    Returns the highest row version up to which every version is settled:
+    committed or rolled back by its writer, so a transaction started after
+    the call sees all of them. Versions above it may still be committed later.
+    """
+    database = _database_of(connection)
+    with _version_lock:
+        # Taken under the lock, so writers registering afterwards draw above it.
+        floors = [
+            floor for writer, floor in _version_writers.values() if writer == database
+        ]
+        return min([_sequence_value(connection), *floors])
+
+
+def record_changes(
+    connection: duckdb.DuckDBPyConnection,
+    table: str,
+    keys: Iterable[Any],
+    kind: ChangeKind = ChangeKind.UPSERT,
+) -> None:
+    """
+    Reports rows written by a data-layer write.
+
+    Deletes are recorded as tombstones and the table's `on_write` hooks run
+    before the write commits. The keys are dropped from the entity
+    cache immediately, and the change is
+    published on the change feed once it is committed (see `after_commit`);
+    the cache also listens to the feed, so a read that raced with the write
+    cannot leave the pre-commit row cached.
+    """
+    keys = list(keys)
+    if kind == ChangeKind.DELETE and keys:
+        # Deleted rows leave a tombstone so `fetch_changed_since` reports them.
+        with drawing_versions(connection):
+            execute(
+                connection,
+                "INSERT INTO row_tombstones (table_name, row_key, row_version, deleted_at) "
+                f"VALUES {', '.join([f'(?, ?, {NEXT_ROW_VERSION}, current_timestamp)'] * len(keys))} "
+                "ON CONFLICT (table_name, row_key) DO UPDATE SET "
+                "row_version = EXCLUDED.row_version, deleted_at = EXCLUDED.deleted_at;",
+                [value for key in keys for value in (table, str(key))],
+            )
+    for hook in _write_hooks.get(table, ()):
+        hook(connection, keys, kind)
+    entity_cache.invalidate(table, keys)
+    after_commit(connection, lambda: change_feed.publish(table, keys, kind))
+
+
+def execute(
+    connection: duckdb.DuckDBPyConnection,
+    sql: str,
+    parameters: Sequence[Any] | None = None,
+) -> duckdb.DuckDBPyConnection:
+    """
+    Executes a statement through the query instrumentation.
+
+    The statement gets a logfire span and its duration is added to the
+    per-statement latency histogram and, if slow, to the slow-query log.
+    """
+    with QueryTimer(sql):
+        return connection.execute(sql, parameters)
+
+
+def fetch_all(
+    connection: duckdb.DuckDBPyConnection,
+    sql: str,
+    parameters: Sequence[Any] | None = None,
+) -> list[tuple[Any, ...]]:
+    """Executes a query and fetches all rows, recording its duration and row count."""
+    with QueryTimer(sql) as timer:
+        rows = connection.execute(sql, parameters).fetchall()
+        timer.rows = len(rows)
+    return rows
+
+
+def fetch_one(
+    connection: duckdb.DuckDBPyConnection,
+    sql: str,
+    parameters: Sequence[Any] | None = None,
+) -> tuple[Any, ...] | None:
+    """Executes a query and fetches one row, recording its duration."""
+    with QueryTimer(sql) as timer:
+        row = connection.execute(sql, parameters).fetchone()
+        timer.rows = 0 if row is None else 1
+    return row
+
+
+def fetch_numpy(
+    connection: duckdb.DuckDBPyConnection,
+    sql: str,
+    parameters: Sequence[Any] | None = None,
+) -> dict[str, np.ndarray]:
+    """Executes a query and fetches the result as a dict of NumPy columns."""
+    with QueryTimer(sql) as timer:
+        columns = connection.execute(sql, parameters).fetchnumpy()
+        timer.rows = len(next(iter(columns.values()))) if columns else 0
+    return columns
+
+
+def fetch_arrow(
+    connection: duckdb.DuckDBPyConnection,
+    sql: str,
+    parameters: Sequence[Any] | None = None,
+) -> "pa.Table":
+    """Executes a query and fetches the result as an Arrow table."""
+    with QueryTimer(sql) as timer:
+        table = connection.execute(sql, parameters).fetch_arrow_table()
+        timer.rows = table.num_rows
+    return table
+
+
+def fetch_columns(
+    connection: duckdb.DuckDBPyConnection,
+    sql: str,
+    parameters: Sequence[Any] | None = None,
+    columnar_format: ColumnarFormat = "numpy",
+) -> "dict[str, np.ndarray] | pa.Table":
+    """Dispatches to `fetch_numpy` or `fetch_arrow` according to `columnar_format`."""
+    if columnar_format == "arrow":
+        return fetch_arrow(connection, sql, parameters)
+    return fetch_numpy(connection, sql, parameters)
+
+
+def union_across(catalogs: dict[Optional[str], str], table: str) -> str:
+    """
+    Builds a `UNION ALL` of `table` over attached databases, for queries that
+    span shards (see `shard_router.ShardRouter.attach_all`). Each row is tagged
+    with the `user_email` of the shard it came from.
+
+    Args:
+        catalogs (dict[Optional[str], str]): Shard owner to attached database
+            name; None stands for the shared default database.
+        table (str): The table to read from every shard.
+    """
+    if not catalogs:
+        raise ValueError("At least one attached database is required.")
+    selects = []
+    for user_email, catalog in catalogs.items():
+        owner = (
+            "NULL" if user_email is None else "'" + user_email.replace("'", "''") + "'"
+        )
+        selects.append(f'SELECT {owner} AS user_email, * FROM "{catalog}".{table}')
+    return "\nUNION ALL\n".join(selects)
+
+
+def upsert_statement(
+    table: str, columns: Sequence[str], key: str, row_count: int = 1
+) -> str:
+    """
+    Builds a multi-row upsert of `columns` into `table`.
+
+    Versioned tables also get `updated_at` and a fresh `row_version`, while
+    `created_at` keeps the value of the row being replaced; the statement
+    returns the key and new version of every row.
+
+    This is `ON CONFLICT DO UPDATE` rather than `INSERT OR REPLACE`: with a
+    secondary index on the table (see `migrations`), DuckDB's replace keeps
+    the old values of the indexed columns. An update of an indexed column is
+    run as a delete and insert of the new row, which is why `created_at` is
+    carried over in the inserted values instead of in the `SET` list.
+    """
+    placeholders = ", ".join(["?"] * len(columns))
+    rows = ", ".join([f"({placeholders})"] * row_count)
+    assignments = [
+        f"{column} = EXCLUDED.{column}" for column in columns if column != key
+    ]
+    if table not in VERSIONED_TABLES:
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {rows} "
+            f"ON CONFLICT ({key}) DO UPDATE SET {', '.join(assignments)};"
+        )
+    assignments += [
+        "updated_at = EXCLUDED.updated_at",
+        "row_version = EXCLUDED.row_version",
+    ]
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}, created_at, updated_at, row_version) "
+        f"SELECT new.*, COALESCE(old.created_at, current_timestamp), "
+        f"current_timestamp, {NEXT_ROW_VERSION} "
+        f"FROM (VALUES {rows}) AS new ({', '.join(columns)}) "
+        f"LEFT JOIN {table} AS old ON old.{key} = new.{key} "
+        f"ON CONFLICT ({key}) DO UPDATE SET {', '.join(assignments)} "
+        f"RETURNING {key}, row_version;"
+    )
+
+
+def version_assignments(table: str) -> str:
+    """The `SET` fragment that stamps a change on a versioned table's row."""
+    if table not in VERSIONED_TABLES:
+        return ""
+    return f", updated_at = current_timestamp, row_version = {NEXT_ROW_VERSION}"
+
 
 def insert_model(
     connection: duckdb.DuckDBPyConnection,
     table: str,
     field_map: dict[str, Any],
-) -> None:
+    key: str = "id",
+) -> Optional[int]:
     """
     Inserts a Pydantic model into the given DuckDB table using parameterized SQL.
     fields: list of column names (order matters)
     field_map: optional mapping for custom field extraction/flattening
+    Returns the new row version of versioned tables.
     """
     try:
         values = tuple(field_map.values())
-        placeholders = ", ".join(["?"] * len(field_map.keys()))
-        sql = f"INSERT OR REPLACE INTO {table} ({', '.join(field_map.keys())}) VALUES ({placeholders})"
-        connection.execute(sql, values)
+        sql = upsert_statement(table, list(field_map.keys()), key)
+        with drawing_versions(connection):
+            returned = fetch_all(connection, sql, values)
+        record_changes(connection, table, (field_map[key],))
         logfire.info(f"APP-LOGIC: Inserted into {table}: {values}")
+        return returned[0][1] if returned else None
     except Exception:
         logfire.error(f"APP-LOGIC: Failed to insert into {table}.", exc_info=True)
         raise
+
+
+def upsert_rows(
+    connection: duckdb.DuckDBPyConnection,
+    table: str,
+    rows: Sequence[dict[str, Any]],
+    key: str = "id",
+) -> dict[Any, Optional[int]]:
+    """
+    Writes field maps with chunked multi-row upserts (see `upsert_statement`).
+
+    Does not manage a transaction; callers wrap it in one (see `insert_models`).
+    Rows sharing the same `key` are collapsed so the last one wins, as DuckDB
+    refuses to replace the same row twice within one statement.
+
+    Returns:
+        dict[Any, Optional[int]]: The new row version of every distinct key
+        written (None for tables without versions).
+    """
+    if not rows:
+        return {}
+
+    columns = list(rows[0].keys())
+    unique_rows = list({row[key]: row for row in rows}.values())
+    versions: dict[Any, Optional[int]] = dict.fromkeys(row[key] for row in unique_rows)
+
+    for start in range(0, len(unique_rows), BULK_INSERT_CHUNK_SIZE):
+        chunk = unique_rows[start : start + BULK_INSERT_CHUNK_SIZE]
+        sql = upsert_statement(table, columns, key, len(chunk))
+        values = [row[column] for row in chunk for column in columns]
+        with drawing_versions(connection):
+            versions.update(fetch_all(connection, sql, values))
+    record_changes(connection, table, versions.keys())
+    return versions
+
+
+def insert_models(
+    connection: duckdb.DuckDBPyConnection,
+    table: str,
+    rows: Sequence[dict[str, Any]],
+    key: str = "id",
+) -> dict[Any, Optional[int]]:
+    """
+    Inserts a batch of field maps into the given DuckDB table.
+
+    All rows are written with `upsert_rows` inside a single `transaction()`,
+    so the batch pays one commit instead of one per row (or joins the caller's
+    transaction) and the last duplicate of a `key` wins.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): The connection object to the database.
+        table (str): The table to write to.
+        rows (Sequence[dict[str, Any]]): Field maps built by the `*_field_map` helpers.
+        key (str): The primary key column used to deduplicate the batch.
+
+    Returns:
+        dict[Any, Optional[int]]: The new row version of every key written.
+    """
+    if not rows:
+        return {}
+
+    try:
+        with transaction(connection):
+            versions = upsert_rows(connection, table, rows, key)
+        logfire.info(f"APP-LOGIC: Inserted {len(versions)} rows into {table}.")
+        return versions
+    except Exception:
+        logfire.error(f"APP-LOGIC: Failed to insert batch into {table}.", exc_info=True)
+        raise
+
+
+def update_row(
+    connection: duckdb.DuckDBPyConnection,
+    table: str,
+    changes: dict[str, Any],
+    key_value: Any,
+    expected_version: Optional[int] = None,
+    key: str = "id",
+) -> WriteResult:
+    """
+    Updates only the `changes` columns of one row of a versioned table.
+
+    With `expected_version`, the update only applies if the row is still at
+    that version, so a concurrent edit is reported as a conflict instead of
+    being overwritten. Either way, columns not in `changes` are left alone.
+
+    Returns:
+        WriteResult: Applied with the new version, a conflict with the
+        current version, or not found.
+    """
+    assignments = ", ".join(f"{column} = ?" for column in changes if column != key)
+    if not assignments:
+        raise ValueError("An update needs at least one column to change.")
+    values = [value for column, value in changes.items() if column != key]
+    sql = (
+        f"UPDATE {table} SET {assignments}{version_assignments(table)} WHERE {key} = ?"
+    )
+    values.append(key_value)
+    if expected_version is not None:
+        sql += " AND row_version = ?"
+        values.append(expected_version)
+    with drawing_versions(connection):
+        returned = fetch_all(connection, f"{sql} RETURNING row_version;", values)
+    if returned:
+        record_changes(connection, table, (key_value,), ChangeKind.UPDATE)
+        return WriteResult(WriteOutcome.APPLIED, returned[0][0])
+
+    current = fetch_one(
+        connection, f"SELECT row_version FROM {table} WHERE {key} = ?;", (key_value,)
+    )
+    if current is None:
+        return WriteResult(WriteOutcome.NOT_FOUND)
+    logfire.warning(
+        f"APP-LOGIC: Version conflict on {table} {key_value}: expected "
+        f"{expected_version}, found {current[0]}."
+    )
+    return WriteResult(WriteOutcome.CONFLICT, current[0])
+
+
+def save_row(
+    connection: duckdb.DuckDBPyConnection,
+    table: str,
+    field_map: dict[str, Any],
+    expected_version: Optional[int],
+    key: str = "id",
+) -> WriteResult:
+    """
+    Writes a whole model, checking its version when it has one.
+
+    A model read from the database carries the version it was read at and is
+    written with `update_row` against that version; a model that was never
+    saved (`expected_version` is None) is upserted.
+    """
+    if expected_version is None:
+        return WriteResult(
+            WriteOutcome.APPLIED, insert_model(connection, table, field_map, key)
+        )
+    return update_row(
+        connection, table, field_map, field_map[key], expected_version, key
+    )
+
+
+def check_patch(changes: dict[str, Any], patchable: frozenset[str]) -> None:
+    """Rejects patches touching columns outside `patchable`."""
+    unknown = set(changes) - patchable
+    if unknown:
+        raise ValueError(f"Cannot patch columns: {', '.join(sorted(unknown))}.")
+    if not changes:
+        raise ValueError("A patch needs at least one column to change.")
@@ -4,7 +4,15 @@ from uuid import UUID
 import duckdb
 import logfire
 
-from data.db_utils import insert_model
+from data.change_feed import ChangeKind
+from data.db_utils import (
+    execute,
+    fetch_all,
+    fetch_one,
+    insert_model,
+    insert_models,
+    record_changes,
+)
 from data.models.document_models import (
     Document,
     DocumentCategory,
@@ -12,6 +20,7 @@ from data.models.document_models import (
     PsychologicalOpinionContent,
     PsychologicalReportContent,
 )
+from data.row_mapping import ChangeSet, RowMapper, construct_trusted
 
 logfire.configure()
 
@@ -69,10 +78,26 @@ def insert(connection: duckdb.DuckDBPyConnection, document: Document) -> None:
         raise
 
 
+def insert_many(
+    connection: duckdb.DuckDBPyConnection, documents: list[Document]
+) -> None:
+    try:
+        insert_models(
+            connection,
+            "documents",
+            [document_field_map(document) for document in documents],
+        )
+        logfire.info(f"Inserted {len(documents)} documents")
+    except Exception:
+        logfire.error(f"Failed to insert {len(documents)} documents", exc_info=True)
+        raise
+
+
 def remove(connection: duckdb.DuckDBPyConnection, document_id: UUID) -> None:
     try:
         logfire.info(f"Removing document with ID: {document_id}")
-        connection.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+        execute(connection, "DELETE FROM documents WHERE id = ?", (document_id,))
+        record_changes(connection, "documents", (document_id,), ChangeKind.DELETE)
         logfire.info(f"Removed document with ID: {document_id}")
     except Exception:
         logfire.error(
@@ -81,11 +106,59 @@ def remove(connection: duckdb.DuckDBPyConnection, document_id: UUID) -> None:
         raise
 
 
+DOCUMENT_COLUMNS: tuple[str, ...] = (
+    "id",
+    "patient_id",
+    "category",
+    "file_name",
+    "content",
+)
+
+
+def _make_document_from_(values: tuple[Any, ...]) -> Document:
+    id, patient_id, category, file_name, content_json = values
+    category_enum = DocumentCategory(category)
+    content_model = CONTENT_MODEL_MAP.get(category_enum, ProntuaryContent)
+    content = content_model.model_validate_json(content_json)
+    return Document(
+        id=id,
+        patient_id=patient_id,
+        category=category_enum,
+        file_name=file_name,
+        content=content,
+    )
+
+
+_CATEGORIES: dict[str, DocumentCategory] = {c.value: c for c in DocumentCategory}
+
+
+def _construct_document_from_(values: tuple[Any, ...]) -> Document:
+    id, patient_id, category, file_name, content_json = values
+    category_enum = _CATEGORIES[category]
+    content_model = CONTENT_MODEL_MAP.get(category_enum, ProntuaryContent)
+    return construct_trusted(
+        Document,
+        {
+            "id": id,
+            "patient_id": patient_id,
+            "category": category_enum,
+            "file_name": file_name,
+            # JSON is not checked by the table constraints, so it is validated.
+            "content": content_model.model_validate_json(content_json),
+        },
+    )
+
+
+DOCUMENT_MAPPER: RowMapper[Document] = RowMapper(
+    "documents", DOCUMENT_COLUMNS, _make_document_from_, _construct_document_from_
+)
+
+
 def _fetch_document_row(
     connection: duckdb.DuckDBPyConnection, document_id: UUID
 ) -> tuple[Any, ...] | None:
     sql = "SELECT * FROM documents WHERE id = ?"
-    return connection.execute(sql, (str(document_id),)).fetchone()  # type: ignore
+    return fetch_one(connection, sql, (str(document_id),))
 
 
 def get_by_id(connection: duckdb.DuckDBPyConnection, document_id: UUID) -> Document:
@@ -95,18 +168,7 @@ def get_by_id(connection: duckdb.DuckDBPyConnection, document_id: UUID) -> Docum
         logfire.info(f"Retrieved document with ID: {document_id}")
         if row is None:
             raise ValueError(f"No document found with ID {document_id}")
-        # Unpack fields
-        id, patient_id, category, file_name, content_json = row  # type: ignore
-        category_enum = DocumentCategory(category)
-        content_model = CONTENT_MODEL_MAP.get(category_enum, ProntuaryContent)
-        content = content_model.model_validate_json(content_json)  # type: ignore
-        return Document(
-            id=id,  # type: ignore
-            patient_id=patient_id,  # type: ignore
-            category=category_enum,
-            file_name=file_name,  # type: ignore
-            content=content,
-        )
+        return DOCUMENT_MAPPER.one(connection, row)
     except Exception:
         logfire.error(
             f"Failed to retrieve document with ID: {document_id}", exc_info=True
@@ -115,32 +177,39 @@ def get_by_id(connection: duckdb.DuckDBPyConnection, document_id: UUID) -> Docum
 
 
 def get_all_for_patient_id(
-    connection: duckdb.DuckDBPyConnection, patient_id: UUID
+    connection: duckdb.DuckDBPyConnection, patient_id: UUID, trusted: bool = False
 ) -> list[Document]:
     try:
         logfire.info(
             "Retrieving all documents for patient with ID: " + str(patient_id) + "."
         )
-        results = connection.execute(
-            "SELECT * FROM documents WHERE patient_id = ?", (str(patient_id),)
-        ).fetchall()
+        results = fetch_all(
+            connection,
+            "SELECT * FROM documents WHERE patient_id = ?",
+            (str(patient_id),),
+        )
         logfire.info("Retrieved all documents for the patient.")
-        documents_list: list[Document] = []
-        for result in results:
-            id, patient_id, category, file_name, content_json = result
-            category_enum = DocumentCategory(category)
-            content_model = CONTENT_MODEL_MAP.get(category_enum, ProntuaryContent)
-            content = content_model.model_validate_json(content_json)
-            documents_list.append(
-                Document(
-                    id=id,
-                    patient_id=patient_id,
-                    category=category_enum,
-                    file_name=file_name,
-                    content=content,
-                )
-            )
-        return documents_list
+        return DOCUMENT_MAPPER.many(connection, results, trusted)
     except Exception:
         logfire.error("Failed to retrieve the patient's documents.", exc_info=True)
         raise
+
+
+def get_changed_since(
+    connection: duckdb.DuckDBPyConnection, version: int, trusted: bool = False
+) -> ChangeSet[Document]:
+    """
+    Retrieves the documents written or deleted after row `version`, for callers
+    that keep a copy in sync without reloading everything.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to retrieve documents changed since version {version}."
+        )
+        return DOCUMENT_MAPPER.changed_since(connection, version, trusted)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve documents changed since version {version}.",
+            exc_info=True,
+        )
+        raise
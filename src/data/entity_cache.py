@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, TypeVar
+
+import logfire
+from pydantic import BaseModel
+
+from data import change_feed
+from data.change_feed import ChangeEvent, ChangeKind
+
+logfire.configure()
+
+M = TypeVar("M", bound=BaseModel)
+
+DEFAULT_MAX_ENTRIES: int = 2048
+
+
+@dataclass
+class CacheStats:
+    """Snapshot of the entity cache counters."""
+
+    size: int
+    max_entries: int
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class EntityCache:
+    """
+    A bounded, process-wide LRU cache of models keyed by `(table, id)`.
+
+    Entries never expire on their own: the data-layer write helpers invalidate
+    exactly the keys they write (see `db_utils.record_changes`), so a read
+    after an edit is never stale. Models are mutable, so callers always get
+    their own deep copy.
+
+    Args:
+        max_entries (int): Number of models kept before the least recently
+            used one is evicted.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        if max_entries < 1:
+            raise ValueError("The entity cache must hold at least one entry.")
+        self._entries: OrderedDict[tuple[str, Hashable], BaseModel] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load racing with a write does not
+        # put the pre-write row back into the cache.
+        self._generation = 0
+        self._stats = CacheStats(size=0, max_entries=max_entries)
+
+    def get(self, table: str, key: Hashable) -> Any:
+        """Returns a copy of the cached model, or None on a miss."""
+        with self._lock:
+            model = self._entries.get((table, key))
+            if model is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end((table, key))
+            self._stats.hits += 1
+        return model.model_copy(deep=True)
+
+    def put(self, table: str, key: Hashable, model: BaseModel) -> None:
+        with self._lock:
+            self._put(table, key, model.model_copy(deep=True))
+
+    def _put(self, table: str, key: Hashable, model: BaseModel) -> None:
+        self._entries[(table, key)] = model
+        self._entries.move_to_end((table, key))
+        while len(self._entries) > self._stats.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def get_or_load(self, table: str, key: Hashable, loader: Callable[[], M]) -> M:
+        """Returns the cached model or loads, caches and returns it."""
+        cached = self.get(table, key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            generation = self._generation
+        model = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._put(table, key, model.model_copy(deep=True))
+        return model
+
+    def invalidate(self, table: str, keys: Any) -> None:
+        """Drops the given keys of `table`."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop((table, key), None) is not None:
+                    self._stats.invalidations += 1
+
+    def invalidate_table(self, table: str) -> None:
+        """Drops every cached model of `table`."""
+        with self._lock:
+            self._generation += 1
+            for entry in [entry for entry in self._entries if entry[0] == table]:
+                del self._entries[entry]
+                self._stats.invalidations += 1
+
+    def clear(self) -> None:
+        """Drops every entry and resets the counters."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._stats = CacheStats(size=0, max_entries=self._stats.max_entries)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                size=len(self._entries),
+                max_entries=self._stats.max_entries,
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                invalidations=self._stats.invalidations,
+            )
+
+
+entity_cache = EntityCache()
+
+
+def _invalidate_committed(events: list[ChangeEvent]) -> None:
+    if events[0].kind == ChangeKind.RESET:
+        entity_cache.clear()
+        return
+    entity_cache.invalidate(events[0].table, [event.key for event in events])
+
+
+change_feed.subscribe(_invalidate_committed)
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import duckdb
+import logfire
+
+DEFAULT_WAL_THRESHOLD_BYTES: int = 8 * 1024 * 1024
+DEFAULT_MAX_INTERVAL_SECONDS: float = 300.0
+DEFAULT_POLL_INTERVAL_SECONDS: float = 5.0
+DEFAULT_QUIET_PERIOD_SECONDS: float = 2.0
+# A WAL this many times over the threshold is checkpointed even while busy.
+FORCE_CHECKPOINT_FACTOR: int = 4
+
+logfire.configure()
+
+
+@dataclass
+class MaintenanceStats:
+    """Snapshot of the maintenance worker counters and file sizes."""
+
+    checkpoints: int = 0
+    deferred: int = 0
+    failed: int = 0
+    wal_bytes: int = 0
+    peak_wal_bytes: int = 0
+    file_bytes: int = 0
+    # Growth of the database file since the worker started.
+    file_growth_bytes: int = 0
+    last_checkpoint_seconds: float = 0.0
+    seconds_since_checkpoint: float = 0.0
+
+
+class MaintenanceWorker:
+    """
+    Checkpoints a database file in the background, so the WAL that small UI
+    writes keep appending to is folded into the file before it grows large
+    and slows down the replay at the next start.
+
+    Every `poll_interval` seconds the worker checks the WAL: a checkpoint is
+    due once it reaches `wal_threshold` bytes, or holds anything at all and
+    the last checkpoint is `max_interval` seconds old. While writes are in
+    flight (this file's WAL grew less than `quiet_period` seconds before the
+    check that noticed it, or `busy()` returning True) a due checkpoint is
+    deferred, unless the WAL is `FORCE_CHECKPOINT_FACTOR` times over the
+    threshold. Only commits to this file count, so one busy shard does not
+    hold back the checkpoints of the others. DuckDB itself
+    refuses a checkpoint while a write transaction is open; that counts as
+    deferred too.
+
+    Args:
+        cursor_factory (Callable[[], duckdb.DuckDBPyConnection]): Opens a
+            cursor whose current database is the one to maintain.
+        path (str): The database file, whose WAL is `<path>.wal`.
+        busy (Optional[Callable[[], bool]]): Extra probe for pending writes,
+            e.g. a non-empty write-behind queue.
+        wal_threshold (int): WAL size in bytes that triggers a checkpoint.
+        max_interval (float): Seconds after which any WAL is checkpointed.
+        poll_interval (float): Seconds between checks.
+        quiet_period (float): Seconds without commits before checkpointing.
+    """
+
+    def __init__(
+        self,
+        cursor_factory: Callable[[], duckdb.DuckDBPyConnection],
+        path: str,
+        busy: Optional[Callable[[], bool]] = None,
+        wal_threshold: int = DEFAULT_WAL_THRESHOLD_BYTES,
+        max_interval: float = DEFAULT_MAX_INTERVAL_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+        quiet_period: float = DEFAULT_QUIET_PERIOD_SECONDS,
+    ) -> None:
+        self._cursor_factory = cursor_factory
+        self._path = path
+        self._busy = busy
+        self._wal_threshold = wal_threshold
+        self._max_interval = max_interval
+        self._poll_interval = poll_interval
+        self._quiet_period = quiet_period
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._last_checkpoint = time.monotonic()
+        self._last_wal_bytes = _size(f"{path}.wal")
+        self._last_activity = 0.0
+        self._initial_file_bytes = _size(path)
+        self._stats = MaintenanceStats()
+        self._worker = threading.Thread(
+            target=self._run, name="db-maintenance", daemon=True
+        )
+        self._worker.start()
+
+    def run_once(self) -> bool:
+        """Checkpoints if a trigger fired and nothing holds it back."""
+        wal_bytes = self._measure()
+        self._note_activity(wal_bytes)
+        since = time.monotonic() - self._last_checkpoint
+        due = wal_bytes >= self._wal_threshold or (
+            wal_bytes > 0 and since >= self._max_interval
+        )
+        if not due:
+            return False
+        forced = wal_bytes >= self._wal_threshold * FORCE_CHECKPOINT_FACTOR
+        if not forced and self._is_busy():
+            with self._lock:
+                self._stats.deferred += 1
+            return False
+        return self.checkpoint()
+
+    def checkpoint(self) -> bool:
+        """Runs `CHECKPOINT` now; False when DuckDB refused it or it failed."""
+        wal_before = _size(f"{self._path}.wal")
+        started = time.monotonic()
+        cursor = self._cursor_factory()
+        try:
+            cursor.execute('CHECKPOINT "' + _current_database(cursor) + '";')
+        except duckdb.TransactionException:
+            logfire.info("APP-LOGIC: Checkpoint deferred; writes are in progress.")
+            with self._lock:
+                self._stats.deferred += 1
+            return False
+        except Exception:
+            logfire.error(
+                f"APP-LOGIC: Failed to checkpoint '{self._path}'.", exc_info=True
+            )
+            with self._lock:
+                self._stats.failed += 1
+            return False
+        finally:
+            cursor.close()
+        elapsed = time.monotonic() - started
+        wal_after = _size(f"{self._path}.wal")
+        with self._lock:
+            # The WAL shrank because of us, not because of a write.
+            self._last_wal_bytes = wal_after
+            self._last_checkpoint = time.monotonic()
+            self._stats.checkpoints += 1
+            self._stats.last_checkpoint_seconds = elapsed
+        stats = self.stats()
+        logfire.info(
+            f"APP-LOGIC: Checkpointed '{self._path}' in {elapsed:.3f}s: WAL "
+            f"{wal_before} -> {stats.wal_bytes} bytes, file {stats.file_bytes} bytes "
+            f"({stats.file_growth_bytes:+d} since start)."
+        )
+        return True
+
+    def stats(self) -> MaintenanceStats:
+        self._measure()
+        with self._lock:
+            return MaintenanceStats(
+                checkpoints=self._stats.checkpoints,
+                deferred=self._stats.deferred,
+                failed=self._stats.failed,
+                wal_bytes=self._stats.wal_bytes,
+                peak_wal_bytes=self._stats.peak_wal_bytes,
+                file_bytes=self._stats.file_bytes,
+                file_growth_bytes=self._stats.file_growth_bytes,
+                last_checkpoint_seconds=self._stats.last_checkpoint_seconds,
+                seconds_since_checkpoint=time.monotonic() - self._last_checkpoint,
+            )
+
+    def close(self) -> None:
+        """Stops the worker; a checkpoint in progress is finished first."""
+        self._closed.set()
+        self._worker.join()
+
+    def _run(self) -> None:
+        while not self._closed.wait(self._poll_interval):
+            try:
+                self.run_once()
+            except Exception:
+                logfire.error("APP-LOGIC: Database maintenance failed.", exc_info=True)
+
+    def _measure(self) -> int:
+        wal_bytes = _size(f"{self._path}.wal")
+        file_bytes = _size(self._path)
+        with self._lock:
+            self._stats.wal_bytes = wal_bytes
+            self._stats.peak_wal_bytes = max(self._stats.peak_wal_bytes, wal_bytes)
+            self._stats.file_bytes = file_bytes
+            self._stats.file_growth_bytes = file_bytes - self._initial_file_bytes
+        return wal_bytes
+
+    def _note_activity(self, wal_bytes: int) -> None:
+        with self._lock:
+            if wal_bytes != self._last_wal_bytes:
+                self._last_wal_bytes = wal_bytes
+                self._last_activity = time.monotonic()
+
+    def _is_busy(self) -> bool:
+        with self._lock:
+            last_activity = self._last_activity
+        if time.monotonic() - last_activity < self._quiet_period:
+            return True
+        return bool(self._busy and self._busy())
+
+
+def _current_database(cursor: duckdb.DuckDBPyConnection) -> str:
+    row = cursor.execute("SELECT current_database();").fetchone()
+    return row[0]  # type: ignore
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
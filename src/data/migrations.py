@@ -0,0 +1,190 @@
+from dataclasses import dataclass
+
+import duckdb
+import logfire
+
+from data.archive import ARCHIVE_STATE_TABLE, create_views_statements
+from data.db_utils import ROW_VERSION_SEQUENCE, VERSIONED_TABLES, transaction
+from data.patient_search import search_index_statements
+
+logfire.configure()
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A single, ordered schema change applied on top of the base tables."""
+
+    version: int
+    description: str
+    statements: tuple[str, ...]
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(
+        version=1,
+        description="Index appointments by date",
+        statements=(
+            "CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (appointment_date);",
+        ),
+    ),
+    Migration(
+        version=2,
+        description="Index appointments by patient",
+        statements=(
+            "CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient_id);",
+        ),
+    ),
+    Migration(
+        version=3,
+        description="Index monthly invoices by period",
+        statements=(
+            "CREATE INDEX IF NOT EXISTS idx_monthly_invoices_period ON monthly_invoices (invoice_year, invoice_month);",
+        ),
+    ),
+    Migration(
+        version=4,
+        description="Index documents by patient and category",
+        statements=(
+            "CREATE INDEX IF NOT EXISTS idx_documents_patient_category ON documents (patient_id, category);",
+        ),
+    ),
+    Migration(
+        version=5,
+        description="Track row creation, last change and version",
+        statements=(
+            f"CREATE SEQUENCE IF NOT EXISTS {ROW_VERSION_SEQUENCE};",
+            *(
+                statement
+                for table in VERSIONED_TABLES
+                for statement in (
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS created_at TIMESTAMP;",
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;",
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS row_version BIGINT;",
+                    f"UPDATE {table} SET created_at = current_timestamp, updated_at = current_timestamp, row_version = nextval('{ROW_VERSION_SEQUENCE}') WHERE row_version IS NULL;",
+                )
+            ),
+            """
+            CREATE TABLE IF NOT EXISTS row_tombstones (
+                table_name VARCHAR NOT NULL,
+                row_key VARCHAR NOT NULL,
+                row_version BIGINT NOT NULL,
+                deleted_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (table_name, row_key)
+            );
+            """,
+        ),
+    ),
+    Migration(
+        version=6,
+        description="Archive closed periods",
+        statements=(
+            f"""
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_STATE_TABLE} (
+                table_name VARCHAR PRIMARY KEY,
+                archived_before DATE NOT NULL
+            );
+            """,
+            *create_views_statements(),
+        ),
+    ),
+    Migration(
+        version=7,
+        description="Index patients for fuzzy search",
+        statements=search_index_statements(),
+    ),
+)
+
+if any(
+    previous.version >= current.version
+    for previous, current in zip(MIGRATIONS, MIGRATIONS[1:])
+):
+    raise ValueError("Migrations must be declared in strictly increasing order.")
+
+LATEST_VERSION: int = MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def create_schema_version_table(connection: duckdb.DuckDBPyConnection) -> None:
+    """Creates the 'schema_version' table that records applied migrations."""
+    try:
+        logfire.info("APP-LOGIC: Attempting to create 'schema_version' table.")
+        sql_command = """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR NOT NULL,
+            applied_at TIMESTAMP DEFAULT current_timestamp NOT NULL
+        );
+        """
+        connection.execute(sql_command)
+        logfire.info("APP-LOGIC: 'schema_version' table created or already exists.")
+    except Exception:
+        logfire.error(
+            "APP-LOGIC: Failed to create 'schema_version' table.", exc_info=True
+        )
+        raise
+
+
+def get_current_version(connection: duckdb.DuckDBPyConnection) -> int:
+    """Returns the highest applied migration version, or 0 for a fresh database."""
+    row = connection.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM schema_version;"
+    ).fetchone()
+    return int(row[0]) if row else 0  # type: ignore
+
+
+def get_pending(connection: duckdb.DuckDBPyConnection) -> list[Migration]:
+    """Returns the migrations that have not been applied yet, in order."""
+    current_version = get_current_version(connection)
+    return [m for m in MIGRATIONS if m.version > current_version]
+
+
+def migrate(
+    connection: duckdb.DuckDBPyConnection, dry_run: bool = False
+) -> list[Migration]:
+    """
+    Applies every pending migration in version order.
+
+    Each migration runs in its own transaction together with its
+    'schema_version' record, so a failing step leaves the database at the
+    last fully applied version.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): The connection object to the database.
+        dry_run (bool): When True, only reports what would be applied.
+
+    Returns:
+        list[Migration]: The migrations that were (or would be) applied.
+    """
+    create_schema_version_table(connection)
+    pending = get_pending(connection)
+    if not pending:
+        logfire.info("APP-LOGIC: Database schema is up to date.")
+        return []
+
+    for migration in pending:
+        if dry_run:
+            logfire.info(
+                f"APP-LOGIC: [dry-run] Would apply migration {migration.version}: {migration.description}"
+            )
+            for statement in migration.statements:
+                logfire.info(f"APP-LOGIC: [dry-run] {statement}")
+            continue
+
+        logfire.info(
+            f"APP-LOGIC: Applying migration {migration.version}: {migration.description}"
+        )
+        try:
+            with transaction(connection):
+                for statement in migration.statements:
+                    connection.execute(statement)
+                connection.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?);",
+                    (migration.version, migration.description),
+                )
+        except Exception:
+            logfire.error(
+                f"APP-LOGIC: Failed to apply migration {migration.version}.",
+                exc_info=True,
+            )
+            raise
+
+    return pending
@@ -10,7 +10,7 @@ from data.models.patient_models import (
     PatientInfo,
     PatientStatus,
 )
-from service.database_manager import get_db_connection
+from service.database_manager import db_cursor
 
 
 def get_patients() -> list[Patient]:
@@ -59,9 +59,8 @@ def get_patients() -> list[Patient]:
 
 
 def insert_patients() -> None:
-    connection = get_db_connection()
-    for patient_ in get_patients():
-        patient.insert(connection, patient_)
+    with db_cursor() as connection:
+        patient.insert_many(connection, get_patients())
 
 
 def get_appointments(patients: list[Patient]) -> list[Appointment]:
@@ -83,7 +82,6 @@ def get_appointments(patients: list[Patient]) -> list[Appointment]:
 
 
 def insert_appointments() -> None:
-    connection = get_db_connection()
-    patients = patient.get_all(connection)
-    for appt in get_appointments(patients):
-        appointment.insert(connection, appt)
+    with db_cursor() as connection:
+        patients = patient.get_all(connection)
+        appointment.insert_many(connection, get_appointments(patients))
@@ -1,5 +1,6 @@
 from datetime import date, datetime, time
 from enum import Enum
+from typing import Optional
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel, Field
@@ -31,6 +32,9 @@ class Appointment(BaseModel):
     is_free_of_charge: bool = False
     notes: str = ""
     status: AppointmentStatus = AppointmentStatus.DONE
+    # Version of the row this model was read at or last written as; not a
+    # column of its own and never dumped (see `db_utils.save_row`).
+    row_version: Optional[int] = Field(default=None, exclude=True)
 
     class ConfigDict:
         from_attributes = True
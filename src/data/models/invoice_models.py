@@ -55,6 +55,9 @@ class MonthlyInvoice(BaseModel):
     nf_number: Optional[int] = None
     payment_date: Optional[date] = None
     total: int = Field(default=0, ge=0)
+    # Version of the row this model was read at or last written as; not a
+    # column of its own and never dumped (see `db_utils.save_row`).
+    row_version: Optional[int] = Field(default=None, exclude=True)
 
     class ConfigDict:
         from_attributes = True
@@ -74,3 +77,33 @@ class MonthlyInvoice(BaseModel):
     @property
     def appointment_dates(self) -> list[date]:
         return self.appointment_data.appointment_dates
+
+
+class PsychologistRevenue(BaseModel):
+    """
+    Revenue of one psychologist in one month, aggregated across shards for
+    clinic-wide reports. Amounts are in cents.
+    """
+
+    user_email: Optional[str] = Field(
+        default=None, description="Shard owner; None for the shared database."
+    )
+    invoice_month: int = Field(ge=1, le=12)
+    invoiced: int = Field(default=0, ge=0)
+    paid: int = Field(default=0, ge=0)
+
+
+class InvoicePeriodSummary(BaseModel):
+    """
+    Totals of the invoices of one month, for the financial report. Amounts are
+    in cents.
+    """
+
+    invoice_month: int = Field(ge=1, le=12)
+    invoice_year: int
+    invoice_count: int = Field(default=0, ge=0)
+    invoiced: int = Field(default=0, ge=0)
+    paid: int = Field(default=0, ge=0)
+    outstanding: int = Field(
+        default=0, ge=0, description="Pending and overdue invoices."
+    )
@@ -86,6 +86,44 @@ class Patient(BaseModel):
     diagnosis: Optional[str] = None
     contract: Optional[str] = None
     child: Optional[Child] = None
+    # Version of the row this model was read at or last written as; not a
+    # column of its own and never dumped (see `db_utils.save_row`).
+    row_version: Optional[int] = Field(default=None, exclude=True)
 
     class ConfigDict:
         from_attributes = True
+
+
+class PatientPage(BaseModel):
+    """One keyset page of the patients of a status, in name order."""
+
+    patients: list[Patient] = Field(default_factory=list)
+    # (name, id) of the page's last patient, to request the next page with;
+    # None on the last page.
+    next_key: Optional[tuple[str, UUID]] = None
+
+
+class PatientSummary(BaseModel):
+    """The few patient columns that pickers and joins need."""
+
+    id: UUID
+    name: str
+    status: PatientStatus
+
+
+class PatientSummaries(BaseModel):
+    """Patient summaries in name order, indexed by id for pickers."""
+
+    items: list[PatientSummary] = Field(default_factory=list)
+    positions: dict[UUID, int] = Field(default_factory=dict)
+
+    @classmethod
+    def of(cls, items: list[PatientSummary]) -> "PatientSummaries":
+        return cls(
+            items=items,
+            positions={summary.id: position for position, summary in enumerate(items)},
+        )
+
+    def index_of(self, patient_id: UUID) -> Optional[int]:
+        """Position of the patient in `items`, or None if it is not listed."""
+        return self.positions.get(patient_id)
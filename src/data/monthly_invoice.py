@@ -1,15 +1,40 @@
 import datetime
 import json
-from typing import Any
+from typing import TYPE_CHECKING, Any, Optional
 from uuid import UUID
 
 import duckdb
 import logfire
-
-from data.db_utils import insert_model
-from data.models.invoice_models import AppointmentData, MonthlyInvoice
+import numpy as np
+
+from data import archive
+from data.db_utils import (
+    ColumnarFormat,
+    WriteResult,
+    check_patch,
+    fetch_all,
+    fetch_columns,
+    fetch_one,
+    insert_model,
+    insert_models,
+    save_row,
+    transaction,
+    union_across,
+    update_row,
+)
+from data.models.invoice_models import (
+    AppointmentData,
+    InvoicePeriodSummary,
+    MonthlyInvoice,
+    MonthlyInvoiceStatus,
+    PsychologistRevenue,
+)
+from data.row_mapping import ChangeSet, RowMapper, construct_trusted
 from utils.helpers import get_last_day_of_month
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 logfire.configure()
 
 
@@ -44,17 +69,20 @@ def create_monthly_invoices_table(connection: duckdb.DuckDBPyConnection) -> None
         raise
 
 
+def monthly_invoice_field_map(model: MonthlyInvoice) -> dict[str, Any]:
+    field_map = model.model_dump()
+    # Remove appointment_data and add it as JSON
+    appointment_data = field_map.pop("appointment_data")
+    field_map["appointment_data"] = json.dumps(appointment_data, default=str)
+    return field_map
+
+
 def insert(connection: duckdb.DuckDBPyConnection, invoice: MonthlyInvoice) -> UUID:
     try:
-        field_map = invoice.model_dump()
-        # Remove appointment_data and add it as JSON
-        appointment_data = field_map.pop("appointment_data")
-        field_map["appointment_data"] = json.dumps(appointment_data, default=str)
-
-        insert_model(
+        invoice.row_version = insert_model(
             connection,
             "monthly_invoices",
-            field_map,
+            monthly_invoice_field_map(invoice),
         )
         logfire.info(
             f"APP-LOGIC: Successfully inserted monthly invoice with ID {invoice.id}."
@@ -68,26 +96,38 @@ def insert(connection: duckdb.DuckDBPyConnection, invoice: MonthlyInvoice) -> UU
         raise
 
 
-def update(connection: duckdb.DuckDBPyConnection, invoice: MonthlyInvoice) -> None:
-    """Updates an existing monthly invoice in the database."""
+def insert_many(
+    connection: duckdb.DuckDBPyConnection, invoices: list[MonthlyInvoice]
+) -> list[UUID]:
     try:
-        field_map = invoice.model_dump()
-
-        # Handle appointment_data as JSON
-        appointment_data = field_map.pop("appointment_data")
-        field_map["appointment_data"] = json.dumps(appointment_data, default=str)
+        versions = insert_models(
+            connection,
+            "monthly_invoices",
+            [monthly_invoice_field_map(invoice) for invoice in invoices],
+        )
+        for invoice in invoices:
+            invoice.row_version = versions.get(invoice.id)
+        logfire.info(
+            f"APP-LOGIC: Successfully inserted {len(invoices)} monthly invoices."
+        )
+        return [invoice.id for invoice in invoices]
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to add {len(invoices)} monthly invoices.",
+            exc_info=True,
+        )
+        raise
 
-        # Build the SET clause for UPDATE
-        set_clause = ", ".join([f"{k} = ?" for k in field_map.keys() if k != "id"])
-        values = [v for k, v in field_map.items() if k != "id"]
-        values.append(invoice.id)  # Add id for WHERE clause
 
-        sql = f"""
-            UPDATE monthly_invoices 
-            SET {set_clause}
-            WHERE id = ?;
-        """
-        connection.execute(sql, values)
+def update(connection: duckdb.DuckDBPyConnection, invoice: MonthlyInvoice) -> None:
+    """
+    Updates an existing monthly invoice in the database, regardless of its
+    version (see `save` for the version-checked write).
+    """
+    try:
+        field_map = monthly_invoice_field_map(invoice)
+        result = update_row(connection, "monthly_invoices", field_map, invoice.id)
+        invoice.row_version = result.row_version
 
         logfire.info(
             f"APP-LOGIC: Successfully updated monthly invoice with ID {invoice.id}."
@@ -100,11 +140,119 @@ def update(connection: duckdb.DuckDBPyConnection, invoice: MonthlyInvoice) -> No
         raise
 
 
+def save(connection: duckdb.DuckDBPyConnection, invoice: MonthlyInvoice) -> WriteResult:
+    """
+    Saves an invoice, refusing to overwrite changes made since it was read.
+    On success the model carries its new `row_version`.
+    """
+    try:
+        result = save_row(
+            connection,
+            "monthly_invoices",
+            monthly_invoice_field_map(invoice),
+            invoice.row_version,
+        )
+        if result.applied:
+            invoice.row_version = result.row_version
+        logfire.info(
+            f"APP-LOGIC: Saved monthly invoice {invoice.id}: {result.outcome.value}"
+        )
+        return result
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to save monthly invoice {invoice.id}.", exc_info=True
+        )
+        raise
+
+
+def patch(
+    connection: duckdb.DuckDBPyConnection,
+    invoice_id: UUID,
+    changes: dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> WriteResult:
+    """
+    Updates only the given columns (as stored, `appointment_data` as JSON) of
+    an invoice, optionally only if it is still at `expected_version`.
+    """
+    check_patch(changes, _PATCHABLE_COLUMNS)
+    try:
+        result = update_row(
+            connection, "monthly_invoices", changes, invoice_id, expected_version
+        )
+        logfire.info(
+            f"APP-LOGIC: Patched monthly invoice {invoice_id}: {result.outcome.value}"
+        )
+        return result
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to patch monthly invoice {invoice_id}.", exc_info=True
+        )
+        raise
+
+
+def set_payment_status(
+    connection: duckdb.DuckDBPyConnection,
+    invoice_id: UUID,
+    payment_status: MonthlyInvoiceStatus,
+    payment_date: Optional[datetime.date] = None,
+    expected_version: Optional[int] = None,
+) -> WriteResult:
+    """Changes only the payment status (and date) of an invoice."""
+    return patch(
+        connection,
+        invoice_id,
+        {"payment_status": payment_status.value, "payment_date": payment_date},
+        expected_version,
+    )
+
+
+MONTHLY_INVOICE_COLUMNS: tuple[str, ...] = tuple(MonthlyInvoice.model_fields.keys())
+_PATCHABLE_COLUMNS: frozenset[str] = frozenset(MONTHLY_INVOICE_COLUMNS) - {
+    "id",
+    "row_version",
+}
+
+
+def _make_invoice_from_(values: tuple[Any, ...]) -> MonthlyInvoice:
+    row_dict = dict(zip(MONTHLY_INVOICE_COLUMNS, values))
+    # Parse appointment_data from JSON
+    if row_dict["appointment_data"]:
+        row_dict["appointment_data"] = AppointmentData(
+            **json.loads(row_dict["appointment_data"])
+        )
+    return MonthlyInvoice(**row_dict)
+
+
+_PAYMENT_STATUSES: dict[str, MonthlyInvoiceStatus] = {
+    s.value: s for s in MonthlyInvoiceStatus
+}
+
+
+def _construct_invoice_from_(values: tuple[Any, ...]) -> MonthlyInvoice:
+    row_dict = dict(zip(MONTHLY_INVOICE_COLUMNS, values))
+    # JSON is not checked by the table constraints, so it is validated.
+    if row_dict["appointment_data"]:
+        row_dict["appointment_data"] = AppointmentData.model_validate_json(
+            row_dict["appointment_data"]
+        )
+    row_dict["payment_status"] = _PAYMENT_STATUSES[row_dict["payment_status"]]
+    return construct_trusted(MonthlyInvoice, row_dict)
+
+
+MONTHLY_INVOICE_MAPPER: RowMapper[MonthlyInvoice] = RowMapper(
+    "monthly_invoices",
+    MONTHLY_INVOICE_COLUMNS,
+    _make_invoice_from_,
+    _construct_invoice_from_,
+)
+
+
 def _fetch_invoice_row(
     connection: duckdb.DuckDBPyConnection, invoice_id: UUID
 ) -> tuple[Any, ...] | None:
     sql = "SELECT * FROM monthly_invoices WHERE id = ?;"
-    return connection.execute(sql, (invoice_id,)).fetchone()  # type: ignore
+    return fetch_one(connection, sql, (invoice_id,))
 
 
 def get_by_id(
@@ -115,90 +263,114 @@ def get_by_id(
     Returns a Pydantic model instance.
     """
     try:
-        log.info(
+        logfire.info(
             f"APP-LOGIC: Attempting to retrieve monthly invoice with ID {invoice_id}."
         )
         row = _fetch_invoice_row(connection, invoice_id)
         if row is None:
-            log.warning(f"APP-LOGIC: No invoice found with ID {invoice_id}.")
+            logfire.warning(f"APP-LOGIC: No invoice found with ID {invoice_id}.")
             raise ValueError(f"No invoice found with ID {invoice_id}.")
 
-        # Parse the row data
-        field_names = [desc[0] for desc in connection.description]  # type: ignore
-        row_dict = dict(zip(field_names, row))
-
-        # Parse appointment_data from JSON
-        if row_dict.get("appointment_data"):
-            appointment_data_dict = json.loads(row_dict["appointment_data"])
-            appointment_data = AppointmentData(**appointment_data_dict)
-            row_dict["appointment_data"] = appointment_data
-
-        invoice = MonthlyInvoice(**row_dict)
-        log.info(
+        invoice = MONTHLY_INVOICE_MAPPER.one(connection, row)
+        logfire.info(
             f"APP-LOGIC: Successfully retrieved monthly invoice with ID {invoice.id}."
         )
         return invoice
     except Exception:
-        log.error(
+        logfire.error(
             f"APP-LOGIC: Failed to retrieve monthly invoice with ID {invoice_id}.",
             exc_info=True,
         )
         raise
 
 
+_INVOICES_IN_PERIOD_SQL: str = """
+            SELECT * FROM {source} 
+            WHERE invoice_month = ? AND invoice_year = ?
+            ORDER BY patient_id;
+        """
+
+
+def _period_source(
+    connection: duckdb.DuckDBPyConnection, table: str, month: int, year: int
+) -> str:
+    # Archived months are read through the table's unified view.
+    return archive.source_for(connection, table, datetime.date(year, month, 1))
+
+
+def is_archived(connection: duckdb.DuckDBPyConnection, month: int, year: int) -> bool:
+    """Returns whether the invoices of a month were moved to the archive."""
+    source = _period_source(connection, "monthly_invoices", month, year)
+    return source != "monthly_invoices"
+
+
 def get_existing_invoices_in_period(
-    connection: duckdb.DuckDBPyConnection, month: int, year: int
+    connection: duckdb.DuckDBPyConnection,
+    month: int,
+    year: int,
+    trusted: bool = False,
 ) -> list[MonthlyInvoice]:
     """
     Retrieves existing monthly invoices for a given month from the 'monthly_invoices' table.
     Returns a list of Pydantic model instances.
+    With `trusted`, models are built without validation (see `RowMapper`).
     """
     try:
-        log.info(
+        logfire.info(
             f"APP-LOGIC: Attempting to retrieve existing invoices for month {month} and year {year}."
         )
-        sql = """
-            SELECT * FROM monthly_invoices 
-            WHERE invoice_month = ? AND invoice_year = ?
-            ORDER BY patient_id;
-        """
-        results = connection.execute(sql, (month, year)).fetchall()  # type: ignore
+        sql = _INVOICES_IN_PERIOD_SQL.format(
+            source=_period_source(connection, "monthly_invoices", month, year)
+        )
+        results = fetch_all(connection, sql, (month, year))
 
         if not results:
-            log.warning(
+            logfire.warning(
                 f"APP-LOGIC: No existing invoices found for month {month} and year {year}."
             )
             return []
 
-        invoices: list[MonthlyInvoice] = []
-
-        for row in results:
-            # Parse the row data
-            field_names = [desc[0] for desc in connection.description]  # type: ignore
-            row_dict = dict(zip(field_names, row))
-
-            # Parse appointment_data from JSON
-            if row_dict.get("appointment_data"):
-                appointment_data_dict = json.loads(row_dict["appointment_data"])
-                appointment_data = AppointmentData(**appointment_data_dict)
-                row_dict["appointment_data"] = appointment_data
-
-            print(row_dict)
-            invoice = MonthlyInvoice(**row_dict)
-            invoices.append(invoice)
+        invoices = MONTHLY_INVOICE_MAPPER.many(connection, results, trusted)
 
-        log.info(
+        logfire.info(
             f"APP-LOGIC: Successfully retrieved {len(invoices)} existing invoices for month {month} and year {year}."
         )
         return invoices
     except Exception:
-        log.error(
+        logfire.error(
             f"APP-LOGIC: Failed to retrieve existing invoices for month {month} and year {year}.",
             exc_info=True,
         )
         raise
 
 
+def get_existing_invoices_columns(
+    connection: duckdb.DuckDBPyConnection,
+    month: int,
+    year: int,
+    columnar_format: ColumnarFormat = "numpy",
+) -> "dict[str, np.ndarray] | pa.Table":
+    """
+    Columnar variant of `get_existing_invoices_in_period`: returns the same rows
+    as NumPy columns or an Arrow table, without building a model per row.
+    `appointment_data` stays the raw JSON string.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to retrieve invoice columns for month {month} and year {year}."
+        )
+        sql = _INVOICES_IN_PERIOD_SQL.format(
+            source=_period_source(connection, "monthly_invoices", month, year)
+        )
+        return fetch_columns(connection, sql, (month, year), columnar_format)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve invoice columns for month {month} and year {year}.",
+            exc_info=True,
+        )
+        raise
+
+
 def get_all_in_period(
     connection: duckdb.DuckDBPyConnection, month: int, year: int
 ) -> list[MonthlyInvoice]:
@@ -206,84 +378,95 @@ def get_all_in_period(
     Retrieves all monthly invoices for a given month. First checks for existing invoices
     in the database, and only generates new ones from appointments if none exist or if
     appointment data has changed.
+    Reading and regenerating run in one transaction, so a failure leaves no
+    partially written invoices. Archived months are closed and returned as
+    they were archived.
     Returns a list of Pydantic model instances.
     """
     try:
-        log.info(
+        logfire.info(
             f"APP-LOGIC: Attempting to retrieve all invoices for month {month} and year {year}."
         )
 
-        # First, try to get existing invoices from the database
-        existing_invoices = get_existing_invoices_in_period(connection, month, year)
-
-        if existing_invoices:
-            log.info(
-                f"APP-LOGIC: Found {len(existing_invoices)} existing invoices for month {month} and year {year}."
+        if is_archived(connection, month, year):
+            return get_existing_invoices_in_period(
+                connection, month, year, trusted=True
             )
 
-            # Check if appointment data has changed for any invoice
-            current_appointment_data = _get_current_appointment_data(
-                connection, month, year
+        with transaction(connection):
+            # First, try to get existing invoices from the database
+            existing_invoices = get_existing_invoices_in_period(
+                connection, month, year, trusted=True
             )
-            needs_update = False
-
-            for invoice in existing_invoices:
-                current_data = current_appointment_data.get(invoice.patient_id)
-                if current_data:
-                    # The hash comparison is removed, so we just check if the data is different
-                    if current_data != invoice.appointment_data:
-                        needs_update = True
-                        break
-
-            if not needs_update:
-                log.info("APP-LOGIC: Existing invoices are up-to-date.")
-                return existing_invoices
-            else:
-                log.info(
-                    "APP-LOGIC: Appointment data has changed, regenerating invoices."
-                )
 
-        # Generate new invoices from appointments
-        log.info(
-            f"APP-LOGIC: Generating new invoices from appointments for month {month} and year {year}."
-        )
-
-        current_appointment_data = _get_current_appointment_data(
-            connection, month, year
-        )
+            if existing_invoices:
+                logfire.info(
+                    f"APP-LOGIC: Found {len(existing_invoices)} existing invoices for month {month} and year {year}."
+                )
 
-        if not current_appointment_data:
-            log.warning(
-                f"APP-LOGIC: No appointments found for month {month} and year {year}."
+                # Check if appointment data has changed for any invoice
+                current_appointment_data = _get_current_appointment_data(
+                    connection, month, year
+                )
+                needs_update = False
+
+                for invoice in existing_invoices:
+                    current_data = current_appointment_data.get(invoice.patient_id)
+                    if current_data:
+                        # The hash comparison is removed, so we just check if the data is different
+                        if current_data != invoice.appointment_data:
+                            needs_update = True
+                            break
+
+                if not needs_update:
+                    logfire.info("APP-LOGIC: Existing invoices are up-to-date.")
+                    return existing_invoices
+                else:
+                    logfire.info(
+                        "APP-LOGIC: Appointment data has changed, regenerating invoices."
+                    )
+
+            # Generate new invoices from appointments
+            logfire.info(
+                f"APP-LOGIC: Generating new invoices from appointments for month {month} and year {year}."
             )
-            return []
 
-        invoices: list[MonthlyInvoice] = []
+            current_appointment_data = _get_current_appointment_data(
+                connection, month, year
+            )
 
-        for patient_id, appointment_data in current_appointment_data.items():
-            if not appointment_data.appointment_dates:
-                log.warning(
-                    f"APP-LOGIC: No appointments found for patient ID {patient_id} in month {month} and year {year}."
+            if not current_appointment_data:
+                logfire.warning(
+                    f"APP-LOGIC: No appointments found for month {month} and year {year}."
                 )
-                continue
-
-            new_invoice = MonthlyInvoice(
-                patient_id=patient_id,
-                invoice_month=month,
-                invoice_year=year,
-                appointment_data=appointment_data,
-                partaking=0,  # Default value for partaking
-            )
+                return []
+
+            invoices: list[MonthlyInvoice] = []
+
+            for patient_id, appointment_data in current_appointment_data.items():
+                if not appointment_data.appointment_dates:
+                    logfire.warning(
+                        f"APP-LOGIC: No appointments found for patient ID {patient_id} in month {month} and year {year}."
+                    )
+                    continue
+
+                new_invoice = MonthlyInvoice(
+                    patient_id=patient_id,
+                    invoice_month=month,
+                    invoice_year=year,
+                    appointment_data=appointment_data,
+                    partaking=0,  # Default value for partaking
+                )
+                invoices.append(new_invoice)
 
-            insert(connection, new_invoice)
-            invoices.append(new_invoice)
+            insert_many(connection, invoices)
 
-        log.info(
-            f"APP-LOGIC: Successfully generated {len(invoices)} new invoices for month {month} and year {year}."
-        )
-        return invoices
+            logfire.info(
+                f"APP-LOGIC: Successfully generated {len(invoices)} new invoices for month {month} and year {year}."
+            )
+            return invoices
     except Exception:
-        log.error(
+        logfire.error(
             f"APP-LOGIC: Failed to retrieve invoices for month {month} and year {year}.",
             exc_info=True,
         )
@@ -297,7 +480,7 @@ def _get_current_appointment_data(
     month_begin: datetime.date = datetime.date(year, month, 1)
     month_end: datetime.date = get_last_day_of_month(year, month)
 
-    sql = """
+    sql = f"""
         SELECT
             patient_id,
             CAST(
@@ -312,14 +495,14 @@ def _get_current_appointment_data(
                 []
             ) AS completed_appointment_dates
         FROM
-            appointments
+            {_period_source(connection, "appointments", month, year)}
         WHERE
             appointment_date BETWEEN ? AND ?
         GROUP BY
             patient_id;
     """
 
-    results = connection.execute(sql, (month_begin, month_end)).fetchall()  # type: ignore
+    results = fetch_all(connection, sql, (month_begin, month_end))
 
     appointment_data: dict[UUID, AppointmentData] = {}
 
@@ -338,3 +521,106 @@ def _get_current_appointment_data(
         )
 
     return appointment_data
+
+
+def get_changed_since(
+    connection: duckdb.DuckDBPyConnection, version: int, trusted: bool = False
+) -> ChangeSet[MonthlyInvoice]:
+    """
+    Retrieves the monthly invoices written or deleted after row `version`, for callers
+    that keep a copy in sync without reloading everything.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to retrieve monthly invoices changed since version {version}."
+        )
+        return MONTHLY_INVOICE_MAPPER.changed_since(connection, version, trusted)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve monthly invoices changed since version {version}.",
+            exc_info=True,
+        )
+        raise
+
+
+def get_period_summary(
+    connection: duckdb.DuckDBPyConnection, month: int, year: int
+) -> InvoicePeriodSummary:
+    """
+    Retrieves the invoice count and the invoiced, paid and outstanding totals
+    of a month in a single aggregate query. Read-only, so reports can run it
+    on an analytics snapshot.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to summarize invoices for month {month} and year {year}."
+        )
+        sql = f"""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(total), 0),
+            COALESCE(SUM(total) FILTER (WHERE payment_status = 'paid'), 0),
+            COALESCE(
+                SUM(total) FILTER (WHERE payment_status IN ('pending', 'overdue')), 0
+            )
+        FROM {_period_source(connection, "monthly_invoices", month, year)}
+        WHERE invoice_month = ? AND invoice_year = ?;
+        """
+        count, invoiced, paid, outstanding = fetch_one(connection, sql, (month, year))  # type: ignore
+        return InvoicePeriodSummary(
+            invoice_month=month,
+            invoice_year=year,
+            invoice_count=count,
+            invoiced=invoiced,
+            paid=paid,
+            outstanding=outstanding,
+        )
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to summarize invoices for month {month} and year {year}.",
+            exc_info=True,
+        )
+        raise
+
+
+def get_clinic_revenue(
+    connection: duckdb.DuckDBPyConnection,
+    catalogs: dict[Optional[str], str],
+    year: int,
+) -> list[PsychologistRevenue]:
+    """
+    Retrieves the invoiced and paid totals of every psychologist per month of
+    `year`, in one query over the attached shard databases `catalogs` (see
+    `db_utils.union_across`), archived months included.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to retrieve clinic revenue of {year} across {len(catalogs)} shards."
+        )
+        sql = f"""
+        SELECT
+            user_email,
+            invoice_month,
+            SUM(total) AS invoiced,
+            COALESCE(SUM(total) FILTER (WHERE payment_status = 'paid'), 0) AS paid
+        FROM ({union_across(catalogs, archive.all_view("monthly_invoices"))})
+        WHERE invoice_year = ?
+        GROUP BY user_email, invoice_month
+        ORDER BY invoice_month, user_email NULLS FIRST;
+        """
+        return [
+            PsychologistRevenue(
+                user_email=user_email,
+                invoice_month=invoice_month,
+                invoiced=invoiced,
+                paid=paid,
+            )
+            for user_email, invoice_month, invoiced, paid in fetch_all(
+                connection, sql, (year,)
+            )
+        ]
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve clinic revenue of {year}.", exc_info=True
+        )
+        raise
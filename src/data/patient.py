@@ -1,17 +1,44 @@
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional
 from uuid import UUID
 
 import duckdb
 import logfire
+import numpy as np
 
-from data.db_utils import insert_model
+from data.db_utils import (
+    ColumnarFormat,
+    WriteResult,
+    check_patch,
+    fetch_all,
+    fetch_columns,
+    fetch_one,
+    insert_model,
+    insert_models,
+    save_row,
+    update_row,
+)
 from data.models.patient_models import (
     Child,
+    ClassTime,
     Patient,
     PatientGender,
     PatientInfo,
+    PatientPage,
     PatientStatus,
+    PatientSummaries,
+    PatientSummary,
 )
+from data.patient_search import SEARCH_INDEX_TABLE, trigrams_sql
+from data.row_mapping import ChangeSet, RowMapper, construct_trusted
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Patients listed per page of a status group.
+DEFAULT_PAGE_SIZE: int = 25
+# Share of the query's trigrams a patient must contain to be a match.
+DEFAULT_SEARCH_THRESHOLD: float = 0.4
+DEFAULT_SEARCH_LIMIT: int = 20
 
 logfire.configure()
 
@@ -70,7 +97,7 @@ def patient_field_map(model: Patient) -> dict[str, Any]:
 
 def insert(connection: duckdb.DuckDBPyConnection, patient: Patient) -> None:
     try:
-        insert_model(
+        patient.row_version = insert_model(
             connection,
             "patients",
             patient_field_map(patient),
@@ -81,11 +108,206 @@ def insert(connection: duckdb.DuckDBPyConnection, patient: Patient) -> None:
         raise
 
 
+def insert_many(connection: duckdb.DuckDBPyConnection, patients: list[Patient]) -> None:
+    try:
+        versions = insert_models(
+            connection,
+            "patients",
+            [patient_field_map(patient) for patient in patients],
+        )
+        for patient in patients:
+            patient.row_version = versions.get(patient.id)
+        logfire.info(f"Inserted {len(patients)} patients")
+    except Exception:
+        logfire.error(f"Failed to insert {len(patients)} patients", exc_info=True)
+        raise
+
+
+def save(connection: duckdb.DuckDBPyConnection, patient: Patient) -> WriteResult:
+    """
+    Saves a patient, refusing to overwrite changes made since it was read.
+    On success the model carries its new `row_version`.
+    """
+    try:
+        result = save_row(
+            connection, "patients", patient_field_map(patient), patient.row_version
+        )
+        if result.applied:
+            patient.row_version = result.row_version
+        logfire.info(f"APP-LOGIC: Saved patient {patient.id}: {result.outcome.value}")
+        return result
+    except Exception:
+        logfire.error(f"APP-LOGIC: Failed to save patient {patient.id}", exc_info=True)
+        raise
+
+
+def patch(
+    connection: duckdb.DuckDBPyConnection,
+    patient_id: UUID,
+    changes: dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> WriteResult:
+    """
+    Updates only the given columns (as stored, e.g. `{"status": "inactive"}`)
+    of a patient, optionally only if it is still at `expected_version`.
+    """
+    check_patch(changes, _PATCHABLE_COLUMNS)
+    try:
+        result = update_row(
+            connection, "patients", changes, patient_id, expected_version
+        )
+        logfire.info(f"APP-LOGIC: Patched patient {patient_id}: {result.outcome.value}")
+        return result
+    except Exception:
+        logfire.error(f"APP-LOGIC: Failed to patch patient {patient_id}", exc_info=True)
+        raise
+
+
 def _fetch_patient_row(
     connection: duckdb.DuckDBPyConnection, patient_id: UUID
 ) -> tuple[Any, ...] | None:
     sql = "SELECT * FROM patients WHERE id = ?;"
-    return connection.execute(sql, (patient_id,)).fetchone()  # type: ignore
+    return fetch_one(connection, sql, (patient_id,))
+
+
+PATIENT_FIELD_COLUMNS: tuple[str, ...] = (
+    "id",
+    "name",
+    "address",
+    "contact",
+    "birthdate",
+    "gender",
+    "cpf_cnpj",
+    "status",
+    "diagnosis",
+    "contract",
+    "school",
+    "grade",
+    "class_time",
+    "tutor_name",
+    "tutor_cpf_cnpj",
+)
+PATIENT_COLUMNS: tuple[str, ...] = (*PATIENT_FIELD_COLUMNS, "row_version")
+_PATCHABLE_COLUMNS: frozenset[str] = frozenset(PATIENT_FIELD_COLUMNS) - {"id"}
+
+
+def _make_patient_from_(values: tuple[Any, ...]) -> Patient:
+    (
+        id,
+        name,
+        address,
+        contact,
+        birthdate,
+        gender,
+        cpf_cnpj,
+        status,
+        diagnosis,
+        contract,
+        school,
+        grade,
+        class_time,
+        tutor_name,
+        tutor_cpf_cnpj,
+        row_version,
+    ) = values
+    info = PatientInfo(
+        name=name,
+        address=address,
+        contact=contact,
+        birthdate=birthdate,
+        gender=gender,
+        cpf_cnpj=cpf_cnpj,
+    )
+    child = None
+    if any(
+        field is not None
+        for field in (school, grade, class_time, tutor_name, tutor_cpf_cnpj)
+    ):
+        child = Child(
+            school=school,
+            grade=grade,
+            class_time=class_time,
+            tutor_name=tutor_name,
+            tutor_cpf_cnpj=tutor_cpf_cnpj,
+        )
+    return Patient(
+        id=id,
+        info=info,
+        status=PatientStatus(status),
+        diagnosis=diagnosis,
+        contract=contract,
+        child=child,
+        row_version=row_version,
+    )
+
+
+_GENDERS: dict[str, PatientGender] = {g.value: g for g in PatientGender}
+_CLASS_TIMES: dict[str, ClassTime] = {c.value: c for c in ClassTime}
+_STATUSES: dict[str, PatientStatus] = {s.value: s for s in PatientStatus}
+
+
+def _construct_patient_from_(values: tuple[Any, ...]) -> Patient:
+    (
+        id,
+        name,
+        address,
+        contact,
+        birthdate,
+        gender,
+        cpf_cnpj,
+        status,
+        diagnosis,
+        contract,
+        school,
+        grade,
+        class_time,
+        tutor_name,
+        tutor_cpf_cnpj,
+        row_version,
+    ) = values
+    info = construct_trusted(
+        PatientInfo,
+        {
+            "name": name,
+            "birthdate": birthdate,
+            "address": address,
+            "contact": contact,
+            "gender": _GENDERS[gender] if gender else None,
+            "cpf_cnpj": cpf_cnpj,
+        },
+    )
+    child = None
+    if any(
+        field is not None
+        for field in (school, grade, class_time, tutor_name, tutor_cpf_cnpj)
+    ):
+        child = construct_trusted(
+            Child,
+            {
+                "school": school,
+                "grade": grade,
+                "class_time": _CLASS_TIMES[class_time] if class_time else None,
+                "tutor_name": tutor_name,
+                "tutor_cpf_cnpj": tutor_cpf_cnpj,
+            },
+        )
+    return construct_trusted(
+        Patient,
+        {
+            "id": id,
+            "info": info,
+            "status": _STATUSES[status],
+            "diagnosis": diagnosis,
+            "contract": contract,
+            "child": child,
+            "row_version": row_version,
+        },
+    )
+
+
+PATIENT_MAPPER: RowMapper[Patient] = RowMapper(
+    "patients", PATIENT_COLUMNS, _make_patient_from_, _construct_patient_from_
+)
 
 
 def get_by_id(connection: duckdb.DuckDBPyConnection, patient_id: UUID) -> Patient:
@@ -99,40 +321,7 @@ def get_by_id(connection: duckdb.DuckDBPyConnection, patient_id: UUID) -> Patien
         if row is None:
             logfire.warning(f"APP-LOGIC: No patient found with ID {patient_id}.")
             raise ValueError(f"No patient found with ID {patient_id}.")
-        columns = [
-            desc[1]
-            for desc in connection.execute("PRAGMA table_info('patients')").fetchall()
-        ]
-        row_dict: dict[str, Any] = dict(zip(columns, row))  # type: ignore
-        # Reconstruct nested models
-        info = PatientInfo(
-            name=row_dict["name"],
-            address=row_dict["address"],
-            contact=row_dict["contact"],
-            birthdate=row_dict["birthdate"],
-            gender=PatientGender(row_dict["gender"]) if row_dict["gender"] else None,
-            cpf_cnpj=row_dict["cpf_cnpj"],
-        )
-        child = None
-        if any(
-            row_dict.get(f) is not None
-            for f in ["school", "grade", "class_time", "tutor_name", "tutor_cpf_cnpj"]
-        ):
-            child = Child(
-                school=row_dict["school"],
-                grade=row_dict["grade"],
-                class_time=row_dict["class_time"],
-                tutor_name=row_dict["tutor_name"],
-                tutor_cpf_cnpj=row_dict["tutor_cpf_cnpj"],
-            )
-        patient = Patient(
-            id=row_dict["id"],
-            info=info,
-            status=PatientStatus(row_dict["status"]),
-            diagnosis=row_dict["diagnosis"],
-            contract=row_dict["contract"],
-            child=child,
-        )
+        patient = PATIENT_MAPPER.one(connection, row)
         logfire.info(
             f"APP-LOGIC: Successfully retrieved patient '{patient.info.name}' with ID {patient.id}."
         )
@@ -145,79 +334,199 @@ def get_by_id(connection: duckdb.DuckDBPyConnection, patient_id: UUID) -> Patien
         raise
 
 
-def _make_patient_from_(row: tuple[Any, ...]) -> Patient:
-    # Get columns for mapping
-    columns = [
-        "id",
-        "name",
-        "address",
-        "contact",
-        "birthdate",
-        "gender",
-        "cpf_cnpj",
-        "status",
-        "diagnosis",
-        "contract",
-        "school",
-        "grade",
-        "class_time",
-        "tutor_name",
-        "tutor_cpf_cnpj",
-    ]
-    row_dict: dict[str, Any] = dict(zip(columns, row))  # type: ignore
-    info = PatientInfo(
-        name=row_dict["name"],
-        address=row_dict["address"],
-        contact=row_dict["contact"],
-        birthdate=row_dict["birthdate"],
-        gender=row_dict["gender"],
-        cpf_cnpj=row_dict["cpf_cnpj"],
-    )
-    child = None
-    if any(
-        row_dict.get(f) is not None
-        for f in ["school", "grade", "class_time", "tutor_name", "tutor_cpf_cnpj"]
-    ):
-        child = Child(
-            school=row_dict["school"],
-            grade=row_dict["grade"],
-            class_time=row_dict["class_time"],
-            tutor_name=row_dict["tutor_name"],
-            tutor_cpf_cnpj=row_dict["tutor_cpf_cnpj"],
+def _get_all_query(
+    are_active: bool, status: Optional[str]
+) -> tuple[str, tuple[Any, ...]]:
+    if are_active:
+        return (
+            "SELECT * FROM patients WHERE status != 'inactive' ORDER BY name, status DESC;",
+            (),
         )
-    return Patient(
-        id=row_dict["id"],
-        info=info,
-        status=PatientStatus(row_dict["status"]),
-        diagnosis=row_dict["diagnosis"],
-        contract=row_dict["contract"],
-        child=child,
-    )
+    if status:
+        return (
+            "SELECT * FROM patients WHERE status = ? ORDER BY name, status DESC;",
+            (status,),
+        )
+    return "SELECT * FROM patients ORDER BY name, status DESC;", ()
 
 
 def get_all(
     connection: duckdb.DuckDBPyConnection,
     are_active: bool = False,
     status: Optional[str] = None,
+    trusted: bool = False,
 ) -> list[Patient]:
     """
     Retrieves all patients from the 'patients' table.
     Returns a list of Pydantic model instances, reconstructing nested fields.
+    With `trusted`, models are built without validation (see `RowMapper`).
     """
     try:
         logfire.info("APP-LOGIC: Attempting to retrieve all patients.")
-        sql = "SELECT * FROM patients ORDER BY name, status DESC;"
-        if status:
-            sql = f"SELECT * FROM patients WHERE status = '{status}' ORDER BY name, status DESC;"
-        if are_active:
-            sql = "SELECT * FROM patients WHERE status != 'inactive' ORDER BY name, status DESC;"
-        results = connection.execute(sql).fetchall()  # type: ignore
+        sql, parameters = _get_all_query(are_active, status)
+        results = fetch_all(connection, sql, parameters)
         if not results:
             logfire.warning("APP-LOGIC: No patients found in the database.")
             return []
-        patients: list[Patient] = [_make_patient_from_(row) for row in results]
+        patients: list[Patient] = PATIENT_MAPPER.many(connection, results, trusted)
         logfire.info(f"APP-LOGIC: Successfully retrieved {len(patients)} patients.")
         return patients
     except Exception:
         logfire.error("APP-LOGIC: Failed to retrieve all patients.", exc_info=True)
         raise
+
+
+def get_summaries(
+    connection: duckdb.DuckDBPyConnection, are_active: bool = False
+) -> PatientSummaries:
+    """
+    Retrieves the id, name and status of the patients in name order, e.g. for
+    a selectbox, without building full `Patient` models.
+    """
+    try:
+        logfire.info("APP-LOGIC: Attempting to retrieve patient summaries.")
+        sql = "SELECT id, name, status FROM patients"
+        if are_active:
+            sql += " WHERE status != 'inactive'"
+        results = fetch_all(connection, f"{sql} ORDER BY name, id;")
+        return PatientSummaries.of(
+            [
+                construct_trusted(
+                    PatientSummary,
+                    {"id": id_, "name": name, "status": PatientStatus(status)},
+                )
+                for id_, name, status in results
+            ]
+        )
+    except Exception:
+        logfire.error("APP-LOGIC: Failed to retrieve patient summaries.", exc_info=True)
+        raise
+
+
+def count_by_status(connection: duckdb.DuckDBPyConnection) -> dict[PatientStatus, int]:
+    """Counts the patients of every status in one aggregate query."""
+    try:
+        logfire.info("APP-LOGIC: Attempting to count patients by status.")
+        counts = dict.fromkeys(PatientStatus, 0)
+        for status, count in fetch_all(
+            connection, "SELECT status, COUNT(*) FROM patients GROUP BY status;"
+        ):
+            counts[PatientStatus(status)] = count
+        return counts
+    except Exception:
+        logfire.error("APP-LOGIC: Failed to count patients by status.", exc_info=True)
+        raise
+
+
+def get_page(
+    connection: duckdb.DuckDBPyConnection,
+    status: PatientStatus,
+    after: Optional[tuple[str, UUID]] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    trusted: bool = False,
+) -> PatientPage:
+    """
+    Retrieves the patients of `status` ordered by name, `limit` at a time.
+    Pages are keyset-paginated: pass the previous page's `next_key` as
+    `after`, so later pages cost the same as the first one.
+    """
+    try:
+        logfire.info(f"APP-LOGIC: Attempting to retrieve a page of {status} patients.")
+        sql = "SELECT * FROM patients WHERE status = ?"
+        parameters: list[Any] = [status]
+        if after is not None:
+            sql += " AND (name > ? OR (name = ? AND id > ?))"
+            parameters += [after[0], after[0], after[1]]
+        # One extra row tells whether another page follows.
+        sql += " ORDER BY name, id LIMIT ?;"
+        results = fetch_all(connection, sql, [*parameters, limit + 1])
+        patients = PATIENT_MAPPER.many(connection, results[:limit], trusted)
+        next_key = (
+            (patients[-1].info.name, patients[-1].id) if len(results) > limit else None
+        )
+        return PatientPage(patients=patients, next_key=next_key)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve a page of {status} patients.", exc_info=True
+        )
+        raise
+
+
+def get_all_columns(
+    connection: duckdb.DuckDBPyConnection,
+    are_active: bool = False,
+    status: Optional[str] = None,
+    columnar_format: ColumnarFormat = "numpy",
+) -> "dict[str, np.ndarray] | pa.Table":
+    """
+    Columnar variant of `get_all`: returns the same rows as NumPy columns or an
+    Arrow table, without building a model per row.
+    """
+    try:
+        logfire.info("APP-LOGIC: Attempting to retrieve patient columns.")
+        sql, parameters = _get_all_query(are_active, status)
+        return fetch_columns(connection, sql, parameters, columnar_format)
+    except Exception:
+        logfire.error("APP-LOGIC: Failed to retrieve patient columns.", exc_info=True)
+        raise
+
+
+def get_changed_since(
+    connection: duckdb.DuckDBPyConnection, version: int, trusted: bool = False
+) -> ChangeSet[Patient]:
+    """
+    Retrieves the patients written or deleted after row `version`, for callers
+    that keep a copy in sync without reloading everything.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to retrieve patients changed since version {version}."
+        )
+        return PATIENT_MAPPER.changed_since(connection, version, trusted)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve patients changed since version {version}.",
+            exc_info=True,
+        )
+        raise
+
+
+def search(
+    connection: duckdb.DuckDBPyConnection,
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    threshold: float = DEFAULT_SEARCH_THRESHOLD,
+    trusted: bool = False,
+) -> list[Patient]:
+    """
+    Finds patients by name, tutor name, school or CPF/CNPJ digits, ignoring
+    case, accents and typos, best matches first.
+
+    A patient matches when its indexed words contain at least `threshold` of
+    the query's trigrams; the share found is the ranking score, ties going to
+    the shortest name.
+    """
+    try:
+        logfire.info(f"APP-LOGIC: Attempting to search patients for '{query}'.")
+        sql = f"""
+        WITH query AS ({trigrams_sql("SELECT NULL::UUID, ?")}),
+        hits AS (
+            SELECT s.patient_id, COUNT(*) / (SELECT COUNT(*) FROM query) AS score
+            FROM {SEARCH_INDEX_TABLE} AS s JOIN query USING (trigram)
+            GROUP BY s.patient_id
+        )
+        SELECT p.*
+        FROM hits JOIN patients AS p ON p.id = hits.patient_id
+        WHERE hits.score >= ?
+        ORDER BY hits.score DESC, length(p.name), p.name
+        LIMIT ?;
+        """
+        results = fetch_all(connection, sql, (query, threshold, limit))
+        patients = PATIENT_MAPPER.many(connection, results, trusted)
+        logfire.info(f"APP-LOGIC: Found {len(patients)} patients for '{query}'.")
+        return patients
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to search patients for '{query}'.", exc_info=True
+        )
+        raise
@@ -0,0 +1,93 @@
+from typing import Any
+
+import duckdb
+import logfire
+
+from data.change_feed import ChangeKind
+from data.db_utils import execute, on_write, transaction
+
+# Trigrams of the words of every searchable patient field (see
+# `patient.search`), kept in step with `patients` by a write hook.
+SEARCH_INDEX_TABLE: str = "patient_trigrams"
+
+logfire.configure()
+
+
+# Lowercase and accent-folded, with CPF/CNPJ punctuation dropped so the
+# digits form one word, and anything else splitting words.
+_NORMALIZED_SQL: str = (
+    "trim(regexp_replace(strip_accents(lower(regexp_replace({text}, '[./-]', '', 'g'))), "
+    "'[^a-z0-9]+', ' ', 'g'))"
+)
+_SEARCHED_TEXTS_SQL: str = (
+    "SELECT id, unnest([name, tutor_name, school, cpf_cnpj, tutor_cpf_cnpj]) "
+    "FROM patients"
+)
+
+
+def trigrams_sql(texts: str) -> str:
+    """
+    Turns `texts`, a query of (patient_id, text) rows, into the distinct
+    (trigram, patient_id) pairs of their words, each padded like pg_trgm
+    does so word beginnings weigh more than their ends.
+    """
+    normalized = _NORMALIZED_SQL.format(text="text")
+    return f"""
+    SELECT DISTINCT substr(w.padded, i.i, 3) AS trigram, w.patient_id
+    FROM (
+        SELECT patient_id, '  ' || word || ' ' AS padded
+        FROM (
+            SELECT patient_id, unnest(string_split({normalized}, ' ')) AS word
+            FROM ({texts}) AS texts(patient_id, text)
+        )
+        WHERE word <> ''
+    ) AS w, range(1, length(w.padded) - 1) AS i(i)
+    """
+
+
+def search_index_statements() -> tuple[str, ...]:
+    """DDL of the search index, filled from the existing patients."""
+    return (
+        f"""
+        CREATE TABLE IF NOT EXISTS {SEARCH_INDEX_TABLE} (
+            trigram VARCHAR NOT NULL,
+            patient_id UUID NOT NULL
+        );
+        """,
+        f"INSERT INTO {SEARCH_INDEX_TABLE} {trigrams_sql(_SEARCHED_TEXTS_SQL)};",
+    )
+
+
+def rebuild_search_index(connection: duckdb.DuckDBPyConnection) -> None:
+    """Rebuilds the search index from scratch, e.g. after a restore."""
+    try:
+        logfire.info("APP-LOGIC: Attempting to rebuild the patient search index.")
+        with transaction(connection):
+            execute(connection, f"DELETE FROM {SEARCH_INDEX_TABLE};")
+            execute(connection, search_index_statements()[1])
+    except Exception:
+        logfire.error(
+            "APP-LOGIC: Failed to rebuild the patient search index.", exc_info=True
+        )
+        raise
+
+
+def _reindex(
+    connection: duckdb.DuckDBPyConnection, keys: list[Any], kind: ChangeKind
+) -> None:
+    execute(
+        connection,
+        f"DELETE FROM {SEARCH_INDEX_TABLE} WHERE list_contains(?, patient_id);",
+        (keys,),
+    )
+    if kind != ChangeKind.DELETE:
+        texts = f"{_SEARCHED_TEXTS_SQL} WHERE list_contains(?, id)"
+        execute(
+            connection,
+            f"INSERT INTO {SEARCH_INDEX_TABLE} {trigrams_sql(texts)};",
+            (keys,),
+        )
+
+
+# Every write path ends in `record_changes`, which keeps the index in step.
+on_write("patients", _reindex)
@@ -3,8 +3,9 @@ from typing import Any
 import duckdb
 import logfire
 
-from data.db_utils import insert_model
+from data.db_utils import fetch_one, insert_model
 from data.models.psychologist_settings_models import PsychologistSettings
+from data.row_mapping import ChangeSet, RowMapper
 
 logfire.configure()
 
@@ -45,6 +46,7 @@ def insert(
             connection,
             "psychologist_settings",
             psychologist_settings.model_dump(),
+            key="user_email",
         )
         logfire.info(
             f"Inserted psychologist settings for {psychologist_settings.user_email}"
@@ -57,11 +59,29 @@ def insert(
         raise
 
 
+PSYCHOLOGIST_SETTINGS_COLUMNS: tuple[str, ...] = tuple(
+    PsychologistSettings.model_fields.keys()
+)
+
+
+def _make_settings_from_(values: tuple[Any, ...]) -> PsychologistSettings:
+    return PsychologistSettings(**dict(zip(PSYCHOLOGIST_SETTINGS_COLUMNS, values)))
+
+
+PSYCHOLOGIST_SETTINGS_MAPPER: RowMapper[PsychologistSettings] = RowMapper(
+    "psychologist_settings",
+    PSYCHOLOGIST_SETTINGS_COLUMNS,
+    _make_settings_from_,
+    key="user_email",
+    parse_key=str,
+)
+
+
 def _fetch_psychologist_settings_row(
     connection: duckdb.DuckDBPyConnection, email: str
 ) -> tuple[Any, ...] | None:
     sql = "SELECT * FROM psychologist_settings WHERE user_email = ?;"
-    return connection.execute(sql, (email,)).fetchone()  # type: ignore
+    return fetch_one(connection, sql, (email,))
 
 
 def get_by_email(
@@ -77,9 +97,7 @@ def get_by_email(
                 f"APP-LOGIC: No psychologist settings found for email {email}."
             )
             raise ValueError(f"No psychologist settings found for email {email}.")
-        psychologist_settings = PsychologistSettings(
-            **{k: v for k, v in zip(PsychologistSettings.model_fields.keys(), row)}  # type: ignore
-        )
+        psychologist_settings = PSYCHOLOGIST_SETTINGS_MAPPER.one(connection, row)
         logfire.info(
             f"APP-LOGIC: Successfully retrieved psychologist settings for email {email}."
         )
@@ -90,3 +108,23 @@ def get_by_email(
             exc_info=True,
         )
         raise
+
+
+def get_changed_since(
+    connection: duckdb.DuckDBPyConnection, version: int, trusted: bool = False
+) -> ChangeSet[PsychologistSettings]:
+    """
+    Retrieves the psychologist settings written or deleted after row `version`, for callers
+    that keep a copy in sync without reloading everything.
+    """
+    try:
+        logfire.info(
+            f"APP-LOGIC: Attempting to retrieve psychologist settings changed since version {version}."
+        )
+        return PSYCHOLOGIST_SETTINGS_MAPPER.changed_since(connection, version, trusted)
+    except Exception:
+        logfire.error(
+            f"APP-LOGIC: Failed to retrieve psychologist settings changed since version {version}.",
+            exc_info=True,
+        )
+        raise
@@ -0,0 +1,154 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import logfire
+
+logfire.configure()
+
+# Upper bounds (in milliseconds) of the latency histogram buckets; the last
+# bucket collects everything slower than the final bound.
+LATENCY_BUCKETS_MS: tuple[float, ...] = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+SLOW_QUERY_LOG_SIZE: int = 200
+
+_slow_query_threshold_ms: float = 250.0
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_REPEATED_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \1)+")
+
+
+@dataclass
+class LatencyHistogram:
+    """Latency distribution of a single normalized statement."""
+
+    counts: list[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    )
+    calls: int = 0
+    rows: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def observe(self, duration_ms: float, rows: int | None) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.calls += 1
+        self.rows += rows or 0
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+@dataclass(frozen=True)
+class SlowQuery:
+    """A statement that took longer than the slow-query threshold."""
+
+    statement: str
+    duration_ms: float
+    rows: int | None
+    executed_at: datetime
+
+
+_histograms: dict[str, LatencyHistogram] = {}
+_slow_queries: deque[SlowQuery] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_lock = threading.Lock()
+
+
+def normalize_statement(sql: str) -> str:
+    """
+    Reduces a SQL statement to its shape so that calls differing only in
+    literals or batch size share one histogram.
+    """
+    normalized = _STRING_LITERAL.sub("?", sql)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    return _REPEATED_ROWS.sub(r"\1, ...", normalized)
+
+
+def set_slow_query_threshold(threshold_ms: float) -> None:
+    """Sets the duration above which statements are written to the slow-query log."""
+    global _slow_query_threshold_ms
+    if threshold_ms < 0:
+        raise ValueError("The slow-query threshold must not be negative.")
+    _slow_query_threshold_ms = threshold_ms
+
+
+def get_slow_query_threshold() -> float:
+    return _slow_query_threshold_ms
+
+
+def record(statement: str, duration_ms: float, rows: int | None) -> None:
+    """Adds one execution of a normalized statement to the metrics."""
+    with _lock:
+        histogram = _histograms.setdefault(statement, LatencyHistogram())
+        histogram.observe(duration_ms, rows)
+        is_slow = duration_ms >= _slow_query_threshold_ms
+        if is_slow:
+            _slow_queries.append(
+                SlowQuery(statement, duration_ms, rows, datetime.now())
+            )
+    if is_slow:
+        logfire.warning(
+            "SLOW-QUERY: {statement} took {duration_ms:.1f} ms",
+            statement=statement,
+            duration_ms=duration_ms,
+            rows=rows,
+        )
+
+
+def get_histograms() -> dict[str, LatencyHistogram]:
+    """Returns a copy of the per-statement latency histograms."""
+    with _lock:
+        return {
+            statement: LatencyHistogram(
+                counts=list(h.counts),
+                calls=h.calls,
+                rows=h.rows,
+                total_ms=h.total_ms,
+                max_ms=h.max_ms,
+            )
+            for statement, h in _histograms.items()
+        }
+
+
+def get_slow_queries() -> list[SlowQuery]:
+    """Returns the slow-query log, oldest first."""
+    with _lock:
+        return list(_slow_queries)
+
+
+def reset() -> None:
+    """Clears every histogram and the slow-query log."""
+    with _lock:
+        _histograms.clear()
+        _slow_queries.clear()
+
+
+class QueryTimer:
+    """Times one statement, wrapping it in a logfire span."""
+
+    def __init__(self, sql: str) -> None:
+        self.statement = normalize_statement(sql)
+        self.rows: int | None = None
+
+    def __enter__(self) -> "QueryTimer":
+        self._span = logfire.span("SQL {statement}", statement=self.statement)
+        self._span.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        self._span.set_attribute("duration_ms", duration_ms)
+        if self.rows is not None:
+            self._span.set_attribute("rows", self.rows)
+        self._span.__exit__(*exc_info)  # type: ignore
+        record(self.statement, duration_ms, self.rows)
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, Iterable, Optional, TypeVar
+
+import logfire
+
+from data import change_feed
+from data.change_feed import ChangeEvent
+from data.entity_cache import CacheStats
+
+logfire.configure()
+
+V = TypeVar("V")
+
+DEFAULT_MAX_ENTRIES: int = 64
+
+
+@dataclass
+class RangeCacheStats(CacheStats):
+    """Snapshot of the range cache counters."""
+
+    prefetches: int = 0
+
+
+class RangeCache(Generic[V]):
+    """
+    A bounded LRU cache of query results over a date range, e.g. the events
+    of the week a calendar shows, with background prefetching of the ranges
+    next to it.
+
+    Any committed change of `tables` drops every entry: a single write can
+    move a row between ranges or, like renaming a patient, change rows of
+    many ranges. Values are shared between callers, who must not mutate
+    them.
+
+    Args:
+        tables (Iterable[str]): Tables whose changes invalidate the cache.
+        max_entries (int): Number of ranges kept before the least recently
+            used one is evicted.
+    """
+
+    def __init__(
+        self, tables: Iterable[str], max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("The range cache must hold at least one entry.")
+        self._entries: OrderedDict[Hashable, V] = OrderedDict()
+        self._loading: set[Hashable] = set()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load racing with a write does not
+        # put the pre-write result back into the cache.
+        self._generation = 0
+        self._stats = RangeCacheStats(size=0, max_entries=max_entries)
+        self._prefetcher = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="range-prefetch"
+        )
+        self._token = change_feed.subscribe(self._invalidate_committed, tables)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Returns the cached value, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return self._entries[key]
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], V]) -> V:
+        """Returns the cached value or loads, caches and returns it."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        return self._load(key, loader)
+
+    def prefetch(self, key: Hashable, loader: Callable[[], V]) -> Optional[Future]:
+        """
+        Loads `key` on the background thread unless it is cached or already
+        loading. `loader` runs outside the script run, so it must not depend
+        on Streamlit state such as the logged-in user.
+        """
+        with self._lock:
+            if key in self._entries or key in self._loading:
+                return None
+            self._loading.add(key)
+            self._stats.prefetches += 1
+        return self._prefetcher.submit(self._prefetch, key, loader)
+
+    def invalidate(self) -> None:
+        """Drops every entry."""
+        with self._lock:
+            self._generation += 1
+            self._stats.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> RangeCacheStats:
+        with self._lock:
+            return RangeCacheStats(
+                size=len(self._entries),
+                max_entries=self._stats.max_entries,
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                invalidations=self._stats.invalidations,
+                prefetches=self._stats.prefetches,
+            )
+
+    def close(self) -> None:
+        """Stops listening for changes and waits for running prefetches."""
+        change_feed.unsubscribe(self._token)
+        self._prefetcher.shutdown(wait=True, cancel_futures=True)
+
+    def _load(self, key: Hashable, loader: Callable[[], V]) -> V:
+        with self._lock:
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._stats.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats.evictions += 1
+        return value
+
+    def _prefetch(self, key: Hashable, loader: Callable[[], V]) -> None:
+        try:
+            self._load(key, loader)
+        except Exception:
+            logfire.error(f"APP-LOGIC: Failed to prefetch range {key}.", exc_info=True)
+        finally:
+            with self._lock:
+                self._loading.discard(key)
+
+    def _invalidate_committed(self, events: list[ChangeEvent]) -> None:
+        self.invalidate()
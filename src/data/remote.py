@@ -0,0 +1,462 @@
+import pickle
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from enum import Enum
+from itertools import groupby
+from multiprocessing.connection import Client, Connection, Listener
+from types import ModuleType
+from typing import Any, Callable, Optional, Union
+
+import logfire
+
+from data import (
+    appointment,
+    archive,
+    backup,
+    change_feed,
+    documents,
+    monthly_invoice,
+    patient,
+    psychologist_settings,
+)
+from data.change_feed import ChangeEvent
+from data.db_utils import transaction
+from data.shard_router import ShardRouter
+
+# The data modules whose public functions the server executes; anything else
+# (including the table DDL) is refused.
+DATA_MODULES: dict[str, ModuleType] = {
+    module.__name__: module
+    for module in (
+        appointment,
+        documents,
+        monthly_invoice,
+        patient,
+        psychologist_settings,
+    )
+}
+# Single functions of modules that also manage files. Only those whose files
+# stay next to the shard's own database are listed: clients must not be able
+# to restore over, write to or delete arbitrary paths on the server.
+DATA_FUNCTIONS: dict[tuple[str, str], Callable[..., Any]] = {
+    (function.__module__, function.__name__): function
+    for function in (archive.archive_closed_periods, backup.backup_shard)
+}
+DEFAULT_MAX_BATCH_SIZE: int = 64
+DEFAULT_SYNC_INTERVAL_SECONDS: float = 1.0
+DEFAULT_CONNECTIONS: int = 2
+DEFAULT_REPORT_CONNECTIONS: int = 1
+DEFAULT_TIMEOUT_SECONDS: float = 60.0
+
+Address = Union[str, tuple[str, int]]
+
+logfire.configure()
+
+
+class RemoteDatabaseError(RuntimeError):
+    """Raised when the database server cannot be reached or fails a request."""
+
+
+class CallTarget(str, Enum):
+    # The user's shard, read-write.
+    SHARD = "shard"
+    # The read-only analytics snapshot of the user's shard.
+    ANALYTICS = "analytics"
+    # Every shard attached at once; the function receives the catalogs map.
+    CLINIC = "clinic"
+
+
+@dataclass(frozen=True)
+class RemoteCall:
+    """A data-layer function call, minus its leading connection argument."""
+
+    module: str
+    function: str
+    args: tuple[Any, ...] = ()
+    kwargs: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def of(
+        cls, function: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> "RemoteCall":
+        return cls(function.__module__, function.__name__, args, kwargs)
+
+
+@dataclass(frozen=True)
+class RemoteUnit:
+    """Calls run together on one target; atomic units share a transaction."""
+
+    user_email: Optional[str]
+    calls: tuple[RemoteCall, ...]
+    target: CallTarget = CallTarget.SHARD
+    atomic: bool = False
+
+
+@dataclass(frozen=True)
+class RemoteRequest:
+    units: tuple[RemoteUnit, ...]
+    # Last server change-feed position the client has seen; None on the
+    # first request of a connection.
+    since: Optional[int]
+
+
+@dataclass(frozen=True)
+class RemoteResponse:
+    # Per unit, either the list of call results or the exception raised.
+    outcomes: tuple[Union[list[Any], BaseException], ...]
+    # Server changes after the request's `since`; None if out of history.
+    events: Optional[list[ChangeEvent]]
+    sequence: int
+
+
+def parse_address(address: str) -> Address:
+    """Turns `host:port` into a TCP address; anything else is a socket path."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def resolve(call: RemoteCall) -> Callable[..., Any]:
+    allowed = DATA_FUNCTIONS.get((call.module, call.function))
+    if allowed is not None:
+        return allowed
+    module = DATA_MODULES.get(call.module)
+    function = getattr(module, call.function, None) if module else None
+    if (
+        function is None
+        or not callable(function)
+        or call.function.startswith(("_", "create_"))
+        or getattr(function, "__module__", None) != call.module
+    ):
+        raise RemoteDatabaseError(
+            f"{call.module}.{call.function} is not callable remotely."
+        )
+    return function
+
+
+class DatabaseServer:
+    """
+    Owns the database files of this machine and runs data-layer calls for
+    any number of app processes (e.g. several Streamlit servers behind a load
+    balancer), since DuckDB allows a single read-write process per file.
+
+    Clients send batches of `RemoteUnit`s over `multiprocessing.connection`;
+    each client connection is served by its own thread, on cursors from the
+    routed shard's pool. Every response carries the change-feed events the
+    client has not seen, so the clients' caches stay coherent.
+
+    Args:
+        router (ShardRouter): Routes each unit to the user's shard.
+        address (Address): Socket path or `(host, port)` to listen on.
+        authkey (bytes): Shared secret clients must present.
+    """
+
+    def __init__(self, router: ShardRouter, address: Address, authkey: bytes) -> None:
+        self._router = router
+        self._listener = Listener(address, authkey=authkey)
+        self._closed = threading.Event()
+
+    @property
+    def address(self) -> Address:
+        return self._listener.address
+
+    def serve_forever(self) -> None:
+        logfire.info(f"APP-LOGIC: Database server listening on {self.address}.")
+        while not self._closed.is_set():
+            try:
+                client = self._listener.accept()
+            except (OSError, EOFError):
+                if self._closed.is_set():
+                    break
+                logfire.warning("APP-LOGIC: Rejected a database client.", exc_info=True)
+                continue
+            threading.Thread(
+                target=self._serve_client, args=(client,), daemon=True
+            ).start()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._listener.close()
+
+    def handle(self, request: RemoteRequest) -> RemoteResponse:
+        outcomes = tuple(self._run_unit(unit) for unit in request.units)
+        sequence = change_feed.current_sequence()
+        if request.since is None or request.since == sequence:
+            events: Optional[list[ChangeEvent]] = []
+        elif request.since > sequence:
+            # The server restarted since the client last heard from it.
+            events = None
+        else:
+            events = change_feed.changes_since(request.since)
+        return RemoteResponse(outcomes, events, sequence)
+
+    def _serve_client(self, client: Connection) -> None:
+        with client:
+            while True:
+                try:
+                    request = client.recv()
+                except (EOFError, OSError):
+                    return
+                response = self.handle(request)
+                try:
+                    client.send(response)
+                except OSError:
+                    # The client gave up waiting and dropped the connection.
+                    return
+
+    def _run_unit(self, unit: RemoteUnit) -> Union[list[Any], BaseException]:
+        try:
+            functions = [resolve(call) for call in unit.calls]
+            if unit.target == CallTarget.CLINIC:
+                with self._router.attach_all() as (cursor, catalogs):
+                    return [
+                        function(cursor, catalogs, *call.args, **call.kwargs)
+                        for function, call in zip(functions, unit.calls)
+                    ]
+            with self._router.lease(unit.user_email) as shard:
+                cursors = (
+                    shard.analytics.cursor()
+                    if unit.target == CallTarget.ANALYTICS
+                    else shard.pool.cursor()
+                )
+                with cursors as cursor:
+                    if not unit.atomic:
+                        return self._run_calls(cursor, functions, unit.calls)
+                    with transaction(cursor):
+                        return self._run_calls(cursor, functions, unit.calls)
+        except Exception as error:
+            logfire.error(
+                f"APP-LOGIC: Remote call failed for {unit.user_email}.", exc_info=True
+            )
+            return _portable(error)
+
+    @staticmethod
+    def _run_calls(
+        cursor: Any, functions: list[Callable[..., Any]], calls: tuple[RemoteCall, ...]
+    ) -> list[Any]:
+        return [
+            function(cursor, *call.args, **call.kwargs)
+            for function, call in zip(functions, calls)
+        ]
+
+
+@dataclass
+class _Lane:
+    """A dispatcher thread with its own server connection."""
+
+    queue: list[tuple[RemoteUnit, "Future[list[Any]]"]]
+    # Whether the lane asks for news while idle.
+    polls: bool
+    connection: Optional[Connection] = None
+    thread: Optional[threading.Thread] = None
+
+
+class RemoteDatabase:
+    """
+    Client side of `DatabaseServer`, shared by all sessions of a process.
+
+    Callers on any thread enqueue their unit and wait, for at most `timeout`
+    seconds. Dispatcher threads, each on a server connection of its own,
+    send everything queued since their last round trip as one request (up to
+    `max_batch_size` units), so concurrent sessions share round trips. The
+    server runs the units of a request one after the other, so reports
+    (`CallTarget.ANALYTICS` and `CLINIC`) are queued apart from shard calls
+    and dispatched on their own connections: a slow report never holds up a
+    save. When idle, one dispatcher still asks for news every
+    `sync_interval` seconds. Server change events are republished on the
+    local change feed; when some may have been missed, e.g. after losing the
+    server, a reset is published instead (see `change_feed.publish_reset`).
+
+    Args:
+        address (Address): The server's socket path or `(host, port)`.
+        authkey (bytes): The server's shared secret.
+        max_batch_size (int): Upper bound of units sent in one request.
+        sync_interval (float): Seconds between change polls while idle.
+        connections (int): Dispatchers, and connections, for shard calls.
+        report_connections (int): Dispatchers, and connections, for reports.
+        timeout (float): Seconds a call waits for its result; a connection
+            whose answer takes longer is dropped.
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        authkey: bytes,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        sync_interval: float = DEFAULT_SYNC_INTERVAL_SECONDS,
+        connections: int = DEFAULT_CONNECTIONS,
+        report_connections: int = DEFAULT_REPORT_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("The remote batch size must be at least 1.")
+        if connections < 1 or report_connections < 1:
+            raise ValueError(
+                "The remote client needs at least one connection of each kind."
+            )
+        self._address = address
+        self._authkey = authkey
+        self._max_batch_size = max_batch_size
+        self._sync_interval = sync_interval
+        self._timeout = timeout
+        self._shard_queue: list[tuple[RemoteUnit, Future[list[Any]]]] = []
+        self._report_queue: list[tuple[RemoteUnit, Future[list[Any]]]] = []
+        self._lanes = [
+            _Lane(self._shard_queue, polls=index == 0) for index in range(connections)
+        ] + [_Lane(self._report_queue, polls=False) for _ in range(report_connections)]
+        for lane in self._lanes:
+            lane.connection = self._connect()
+        self._condition = threading.Condition()
+        # Serializes applying responses, so `_since` only moves forward.
+        self._events_lock = threading.Lock()
+        self._closed = False
+        self._since: Optional[int] = None
+        self._round_trips = 0
+        for lane in self._lanes:
+            lane.thread = threading.Thread(
+                target=self._dispatch, args=(lane,), name="remote-database", daemon=True
+            )
+            lane.thread.start()
+
+    def call(
+        self,
+        user_email: Optional[str],
+        function: Callable[..., Any],
+        *args: Any,
+        target: CallTarget = CallTarget.SHARD,
+        **kwargs: Any,
+    ) -> Any:
+        """Runs `function(connection, *args, **kwargs)` on the server."""
+        unit = RemoteUnit(
+            user_email, (RemoteCall.of(function, *args, **kwargs),), target
+        )
+        return self.submit(unit)[0]
+
+    def submit(self, unit: RemoteUnit) -> list[Any]:
+        """
+        Runs a unit on the server and returns the results of its calls.
+
+        Raises:
+            RemoteDatabaseError: If the server is unavailable or does not
+                answer within the timeout; a write may still have been applied.
+        """
+        future: Future[list[Any]] = Future()
+        reports = unit.target in (CallTarget.ANALYTICS, CallTarget.CLINIC)
+        with self._condition:
+            if self._closed:
+                raise RemoteDatabaseError("The remote database client is closed.")
+            (self._report_queue if reports else self._shard_queue).append(
+                (unit, future)
+            )
+            self._condition.notify_all()
+        try:
+            return future.result(self._timeout)
+        except TimeoutError as error:
+            raise RemoteDatabaseError(
+                f"The database server did not answer within {self._timeout}s."
+            ) from error
+
+    @property
+    def round_trips(self) -> int:
+        with self._condition:
+            return self._round_trips
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        for lane in self._lanes:
+            lane.thread.join()  # type: ignore
+            if lane.connection is not None:
+                lane.connection.close()
+
+    def _dispatch(self, lane: _Lane) -> None:
+        queue = lane.queue
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: queue or self._closed,
+                    self._sync_interval if lane.polls else None,
+                )
+                if self._closed and not queue:
+                    return
+                batch = queue[: self._max_batch_size]
+                del queue[: self._max_batch_size]
+            with self._events_lock:
+                since = self._since
+            request = RemoteRequest(tuple(unit for unit, _ in batch), since)
+            try:
+                if lane.connection is None:
+                    lane.connection = self._connect()
+                lane.connection.send(request)
+                if not lane.connection.poll(self._timeout):
+                    raise RemoteDatabaseError(
+                        f"The database server did not answer within {self._timeout}s."
+                    )
+                response: RemoteResponse = lane.connection.recv()
+            except Exception as error:
+                if lane.connection is not None:
+                    logfire.error("APP-LOGIC: Lost the database server.", exc_info=True)
+                    # Its answer may still arrive; the connection cannot be reused.
+                    lane.connection.close()
+                    lane.connection = None
+                    self._reset()
+                failure = RemoteDatabaseError("Database server unavailable.")
+                failure.__cause__ = error
+                for _, future in batch:
+                    future.set_exception(failure)
+                continue
+            with self._condition:
+                self._round_trips += 1
+            # Publish first so a caller never reads a cache the write made stale.
+            self._apply_events(response)
+            for (_, future), outcome in zip(batch, response.outcomes):
+                if isinstance(outcome, BaseException):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def _connect(self) -> Connection:
+        try:
+            return Client(self._address, authkey=self._authkey)
+        except Exception as error:
+            logfire.error(
+                f"APP-LOGIC: Failed to reach the database server at {self._address}.",
+                exc_info=True,
+            )
+            raise RemoteDatabaseError("Database server unavailable.") from error
+
+    def _reset(self) -> None:
+        with self._events_lock:
+            # A new server knows nothing of our position in its feed.
+            self._since = None
+            change_feed.publish_reset()
+
+    def _apply_events(self, response: RemoteResponse) -> None:
+        with self._events_lock:
+            if response.events is None:
+                logfire.warning("APP-LOGIC: Missed server changes; resetting caches.")
+                self._since = response.sequence
+                change_feed.publish_reset()
+                return
+            # Another connection may have delivered some of them already.
+            since = self._since or 0
+            self._since = max(since, response.sequence)
+            events = [event for event in response.events if event.sequence > since]
+            for (table, kind), grouped in groupby(
+                events, key=lambda event: (event.table, event.kind)
+            ):
+                change_feed.publish(table, [event.key for event in grouped], kind)
+
+
+def _portable(error: Exception) -> BaseException:
+    """Returns `error` if it survives pickling, else a plain description of it."""
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RemoteDatabaseError(f"{type(error).__name__}: {error}")
@@ -0,0 +1,216 @@
+import threading
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Any, Callable, Generic, Iterable, TypeVar
+from uuid import UUID
+
+import duckdb
+from pydantic import BaseModel
+
+from data.db_utils import (
+    execute,
+    fetch_all,
+    in_transaction,
+    transaction,
+    version_watermark,
+)
+
+T = TypeVar("T")
+M = TypeVar("M", bound=BaseModel)
+
+# `cursor.description`: one (name, type, ...) tuple per result column.
+Description = list[tuple[Any, ...]]
+
+_new = object.__new__
+_set = object.__setattr__
+
+
+def construct_trusted(model: type[M], fields: dict[str, Any]) -> M:
+    """
+    Builds a model from already valid values without running validation.
+
+    Cheaper than `model_construct` because it skips default handling: `fields`
+    must contain every model field, already converted to its Python type
+    (enums, nested models, dates).
+    """
+    instance = _new(model)
+    _set(instance, "__dict__", fields)
+    _set(instance, "__pydantic_fields_set__", set(fields))
+    _set(instance, "__pydantic_extra__", None)
+    _set(instance, "__pydantic_private__", None)
+    return instance
+
+
+@dataclass
+class ChangeSet(Generic[T]):
+    """
+    Rows of one table changed after a given row version.
+
+    Apply `changed` and `deleted`, then ask again with `version` next time.
+    """
+
+    version: int
+    changed: list[T] = field(default_factory=list)
+    deleted: list[Any] = field(default_factory=list)
+
+
+class RowMapper(Generic[T]):
+    """
+    Turns `SELECT * FROM <table>` rows into models on a single decode path.
+
+    The position of every column the builder needs is looked up once per
+    column layout and compiled into an `itemgetter`, so decoding a row is one
+    tuple lookup plus the builder call, whatever the physical column order.
+    The layout is the `description` of the result the rows came from, which
+    defaults to the connection's last result: decode rows right after the
+    query that fetched them, or pass its `description`. Shards on another
+    schema version, snapshots and restored files thus never share positions
+    computed for a different layout.
+
+    Rows were validated on the way in and are guarded by the table constraints,
+    so callers may opt into `trusted` decoding, which uses `trusted_build`
+    (see `construct_trusted`) and skips pydantic validation of plain columns.
+    JSON columns are not covered by the constraints and are still validated.
+
+    Args:
+        table (str): The table whose `SELECT *` rows are decoded.
+        columns (tuple[str, ...]): The columns passed to `build`, in order.
+        build (Callable[[tuple[Any, ...]], T]): Builds a model from the values
+            of `columns`, in the same order.
+        trusted_build (Callable[[tuple[Any, ...]], T] | None): Same contract as
+            `build`, without validation. Defaults to `build`.
+        key (str): The primary key column.
+        parse_key (Callable[[str], Any]): Turns a tombstone key back into the
+            type of `key`.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        columns: tuple[str, ...],
+        build: Callable[[tuple[Any, ...]], T],
+        trusted_build: Callable[[tuple[Any, ...]], T] | None = None,
+        key: str = "id",
+        parse_key: Callable[[str], Any] = UUID,
+    ) -> None:
+        self.table = table
+        self.columns = columns
+        self.build = build
+        self.trusted_build = trusted_build or build
+        self.key = key
+        self.parse_key = parse_key
+        self._getters: dict[
+            tuple[str, ...], Callable[[tuple[Any, ...]], tuple[Any, ...]]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def _getter(
+        self,
+        connection: duckdb.DuckDBPyConnection,
+        description: Description | None = None,
+    ) -> Callable[[tuple[Any, ...]], tuple[Any, ...]]:
+        description = description or connection.description
+        if description is None:
+            description = execute(
+                connection, f"SELECT * FROM {self.table} LIMIT 0;"
+            ).description
+        layout = tuple(column[0] for column in description)
+        getter = self._getters.get(layout)
+        if getter is not None:
+            return getter
+        with self._lock:
+            positions = {column: index for index, column in enumerate(layout)}
+            missing = [column for column in self.columns if column not in positions]
+            if missing:
+                raise ValueError(
+                    f"The result decoded as {self.table} lacks columns {missing}."
+                )
+            indexes = [positions[column] for column in self.columns]
+            # itemgetter with a single index returns a bare value, not a tuple
+            getter = (
+                itemgetter(*indexes)
+                if len(indexes) > 1
+                else lambda row: (row[indexes[0]],)
+            )
+            self._getters[layout] = getter
+            return getter
+
+    def one(
+        self,
+        connection: duckdb.DuckDBPyConnection,
+        row: tuple[Any, ...],
+        trusted: bool = False,
+        description: Description | None = None,
+    ) -> T:
+        """Decodes a single row."""
+        build = self.trusted_build if trusted else self.build
+        return build(self._getter(connection, description)(row))
+
+    def many(
+        self,
+        connection: duckdb.DuckDBPyConnection,
+        rows: Iterable[tuple[Any, ...]],
+        trusted: bool = False,
+        description: Description | None = None,
+    ) -> list[T]:
+        """Decodes every row, resolving the column positions only once."""
+        getter = self._getter(connection, description)
+        build = self.trusted_build if trusted else self.build
+        return [build(getter(row)) for row in rows]
+
+    def changed_since(
+        self,
+        connection: duckdb.DuckDBPyConnection,
+        version: int,
+        trusted: bool = False,
+    ) -> ChangeSet[T]:
+        """
+        Returns the rows written and the keys deleted after row `version`.
+
+        A key deleted and written again afterwards is only reported as changed.
+        Both queries read one snapshot. The returned `version` does not pass
+        a version that an uncommitted writer may still commit (see
+        `version_watermark`), so rows above it can be reported again by the
+        next call; applying a `ChangeSet` twice is harmless.
+        """
+        if in_transaction(connection):
+            raise RuntimeError(
+                "changed_since needs its own transaction to take a consistent snapshot."
+            )
+        # Read before the snapshot starts: whatever is settled by now is in it.
+        watermark = version_watermark(connection)
+        with transaction(connection):
+            # The trailing copy of `row_version` leaves the `SELECT *`
+            # positions used by the decoder untouched.
+            rows = fetch_all(
+                connection,
+                f"SELECT *, row_version FROM {self.table} WHERE row_version > ? ORDER BY row_version;",
+                (version,),
+            )
+            description = connection.description
+            tombstones = fetch_all(
+                connection,
+                f"""
+                SELECT t.row_key, t.row_version FROM row_tombstones t
+                LEFT JOIN {self.table} live ON CAST(live.{self.key} AS VARCHAR) = t.row_key
+                WHERE t.table_name = ? AND t.row_version > ?
+                AND (live.row_version IS NULL OR live.row_version < t.row_version)
+                ORDER BY t.row_version;
+                """,
+                (self.table, version),
+            )
+        latest = max(
+            [version]
+            + ([rows[-1][-1]] if rows else [])
+            + ([tombstones[-1][1]] if tombstones else [])
+        )
+        return ChangeSet(
+            version=max(version, min(latest, watermark)),
+            changed=self.many(connection, rows, trusted, description),
+            deleted=[self.parse_key(row_key) for row_key, _ in tombstones],
+        )
+
+    def reset(self) -> None:
+        """Forgets the cached column positions, e.g. after an out-of-band schema change."""
+        with self._lock:
+            self._getters.clear()
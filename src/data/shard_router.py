@@ -0,0 +1,306 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from urllib.parse import quote, unquote
+
+import duckdb
+import logfire
+
+from data import database
+from data.connection_pool import CursorPool
+from data.maintenance import MaintenanceWorker
+from data.snapshot import AnalyticsSnapshot
+from data.write_behind import WriteBehindQueue
+
+SHARD_SUFFIX: str = ".db"
+DEFAULT_MAX_OPEN_SHARDS: int = 8
+
+logfire.configure()
+
+
+@dataclass
+class ShardStats:
+    """Snapshot of the shard router counters."""
+
+    open_shards: int
+    max_open_shards: int
+    opens: int = 0
+    hits: int = 0
+    evictions: int = 0
+
+
+class Shard:
+    """
+    One psychologist's database file, attached to the router's hub connection
+    under its own catalog name.
+
+    Every cursor handed out (pooled, write-behind or from `cursor()`) starts
+    with `USE <catalog>`, so the data layer keeps using unqualified table
+    names and only ever sees this shard. Reports read from `analytics`, a
+    read-only copy of the shard on a connection of its own. With maintenance
+    enabled a `MaintenanceWorker` checkpoints the shard's WAL in the background.
+    """
+
+    def __init__(
+        self,
+        hub: duckdb.DuckDBPyConnection,
+        user_email: Optional[str],
+        path: str,
+        catalog: str,
+        pool_size: int,
+        checkout_timeout: float,
+        write_behind: bool,
+        snapshot_directory: str,
+        maintenance: bool = False,
+    ) -> None:
+        self.user_email = user_email
+        self.path = path
+        self.catalog = catalog
+        self._hub = hub
+        self._leases = 0
+        self.pool = CursorPool(
+            hub,
+            size=pool_size,
+            checkout_timeout=checkout_timeout,
+            cursor_factory=self.cursor,
+        )
+        self.write_behind: Optional[WriteBehindQueue] = (
+            WriteBehindQueue(hub, cursor_factory=self.cursor) if write_behind else None
+        )
+        self.analytics = AnalyticsSnapshot(
+            self.cursor,
+            snapshot_directory,
+            os.path.splitext(os.path.basename(path))[0],
+        )
+        self.maintenance: Optional[MaintenanceWorker] = (
+            MaintenanceWorker(self.cursor, path, busy=self._has_queued_writes)
+            if maintenance
+            else None
+        )
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Opens a new cursor on this shard; the caller closes it."""
+        cursor = self._hub.cursor()
+        cursor.execute(f'USE "{self.catalog}";')
+        return cursor
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Drains the queued writes and closes the pooled cursors and snapshot."""
+        if self.maintenance is not None:
+            self.maintenance.close()
+        if self.write_behind is not None:
+            self.write_behind.close(timeout)
+        self.pool.close()
+        self.analytics.close()
+
+    def _has_queued_writes(self) -> bool:
+        return self.write_behind is not None and self.write_behind.stats().pending > 0
+
+
+class ShardRouter:
+    """
+    Routes each psychologist to their own DuckDB file in `directory`.
+
+    Shards are opened lazily: the first request for a user attaches their file
+    to an in-memory hub connection and bootstraps its schema. At most
+    `max_open_shards` stay attached; the least recently used one without
+    active leases is drained and detached when another has to be opened.
+    Because all shards live in one DuckDB instance, admin reports can query
+    several of them at once (`attach_all`), while each file keeps its own WAL
+    and checkpoints and a busy practice never blocks another one's commits.
+
+    Args:
+        directory (str): Where the per-user files live; created on demand.
+        default_path (Optional[str]): Database used when no user is logged in.
+        max_open_shards (int): Shards kept attached when idle.
+        pool_size (int): Cursors pooled per shard.
+        checkout_timeout (float): Seconds to wait for a pooled cursor.
+        write_behind (bool): Whether every shard gets a write-behind queue.
+        snapshot_directory (Optional[str]): Where analytics snapshots are
+            written; defaults to a `snapshots` folder in `directory`.
+        maintenance (bool): Whether every shard gets a checkpoint worker.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        default_path: Optional[str] = None,
+        max_open_shards: int = DEFAULT_MAX_OPEN_SHARDS,
+        pool_size: int = 4,
+        checkout_timeout: float = 5.0,
+        write_behind: bool = False,
+        snapshot_directory: Optional[str] = None,
+        maintenance: bool = False,
+    ) -> None:
+        if max_open_shards < 1:
+            raise ValueError("The router must keep at least one shard open.")
+        self._directory = directory
+        self._default_path = default_path
+        self._pool_size = pool_size
+        self._checkout_timeout = checkout_timeout
+        self._write_behind = write_behind
+        self._maintenance = maintenance
+        self._snapshot_directory = snapshot_directory or os.path.join(
+            directory, "snapshots"
+        )
+        self._hub = database.connect(":memory:")
+        self._shards: OrderedDict[Optional[str], Shard] = OrderedDict()
+        self._catalog_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._stats = ShardStats(open_shards=0, max_open_shards=max_open_shards)
+
+    def shard_path(self, user_email: Optional[str]) -> str:
+        """Returns the database file of `user_email` (None for the default one)."""
+        if user_email is None:
+            if self._default_path is None:
+                raise ValueError("No user given and the router has no default shard.")
+            return self._default_path
+        file_name = quote(_normalize(user_email), safe="") + SHARD_SUFFIX
+        return os.path.join(self._directory, file_name)
+
+    def known_users(self) -> list[str]:
+        """Returns the users that have a shard file, open or not."""
+        if not os.path.isdir(self._directory):
+            return []
+        return sorted(
+            unquote(file_name.removesuffix(SHARD_SUFFIX))
+            for file_name in os.listdir(self._directory)
+            if file_name.endswith(SHARD_SUFFIX)
+        )
+
+    def shard(self, user_email: Optional[str]) -> Shard:
+        """
+        Returns the shard of `user_email`, opening it if needed. Without a
+        lease it may be detached later; use `lease` around database work.
+        """
+        with self.lease(user_email) as shard:
+            return shard
+
+    @contextmanager
+    def lease(self, user_email: Optional[str]) -> Iterator[Shard]:
+        """Keeps the user's shard attached for the duration of the block."""
+        key = _normalize(user_email) if user_email is not None else None
+        with self._lock:
+            shard = self._open(key)
+            shard._leases += 1
+            self._evict()
+        try:
+            yield shard
+        finally:
+            with self._lock:
+                shard._leases -= 1
+                self._evict()
+
+    @contextmanager
+    def attach_all(
+        self,
+    ) -> Iterator[tuple[duckdb.DuckDBPyConnection, dict[Optional[str], str]]]:
+        """
+        Attaches every known shard (and the default one, if any) for a
+        cross-shard query and keeps them attached until the block ends.
+
+        Yields:
+            A cursor on the hub and a map of shard owner to catalog name, to be
+            combined with `db_utils.union_across`.
+        """
+        users: list[Optional[str]] = list(self.known_users())
+        if self._default_path is not None:
+            users.insert(0, None)
+        shards: list[Shard] = []
+        with self._lock:
+            for user in users:
+                shards.append(self._open(user))
+                shards[-1]._leases += 1
+            self._evict()
+        cursor = self._hub.cursor()
+        try:
+            yield cursor, {shard.user_email: shard.catalog for shard in shards}
+        finally:
+            cursor.close()
+            with self._lock:
+                for shard in shards:
+                    shard._leases -= 1
+                self._evict()
+
+    def stats(self) -> ShardStats:
+        with self._lock:
+            return ShardStats(
+                open_shards=len(self._shards),
+                max_open_shards=self._stats.max_open_shards,
+                opens=self._stats.opens,
+                hits=self._stats.hits,
+                evictions=self._stats.evictions,
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Drains and detaches every shard and closes the hub connection."""
+        with self._lock:
+            while self._shards:
+                self._detach(self._shards.popitem(last=False)[1], timeout)
+            self._hub.close()
+
+    def _open(self, user_email: Optional[str]) -> Shard:
+        shard = self._shards.get(user_email)
+        if shard is not None:
+            self._shards.move_to_end(user_email)
+            self._stats.hits += 1
+            return shard
+
+        path = self.shard_path(user_email)
+        catalog = f"shard_{next(self._catalog_ids)}"
+        try:
+            logfire.info(f"APP-LOGIC: Attaching shard '{path}' as {catalog}.")
+            if user_email is not None:
+                os.makedirs(self._directory, exist_ok=True)
+            self._hub.execute(f"ATTACH '{_escape(path)}' AS \"{catalog}\";")
+            shard = Shard(
+                self._hub,
+                user_email,
+                path,
+                catalog,
+                self._pool_size,
+                self._checkout_timeout,
+                self._write_behind,
+                self._snapshot_directory,
+                self._maintenance,
+            )
+            with shard.pool.cursor() as cursor:
+                database.ensure_schema(cursor, path)
+        except Exception:
+            logfire.error(f"APP-LOGIC: Failed to open shard '{path}'.", exc_info=True)
+            raise
+        self._shards[user_email] = shard
+        self._stats.opens += 1
+        return shard
+
+    def _evict(self) -> None:
+        while len(self._shards) > self._stats.max_open_shards:
+            idle = next(
+                (key for key, shard in self._shards.items() if not shard._leases),
+                _NO_IDLE_SHARD,
+            )
+            if idle is _NO_IDLE_SHARD:
+                # Every shard is in use; the extra ones go once released.
+                return
+            self._detach(self._shards.pop(idle))  # type: ignore
+            self._stats.evictions += 1
+
+    def _detach(self, shard: Shard, timeout: Optional[float] = None) -> None:
+        logfire.info(f"APP-LOGIC: Detaching shard '{shard.path}'.")
+        shard.close(timeout)
+        self._hub.execute(f'DETACH "{shard.catalog}";')
+
+
+_NO_IDLE_SHARD = object()
+
+
+def _normalize(user_email: str) -> str:
+    return user_email.strip().lower()
+
+
+def _escape(path: str) -> str:
+    return path.replace("'", "''")
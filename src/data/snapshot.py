@@ -0,0 +1,223 @@
+import glob
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import duckdb
+import logfire
+
+from data import change_feed, database
+
+DEFAULT_MAX_STALENESS_SECONDS: float = 30.0
+
+logfire.configure()
+
+
+@dataclass
+class SnapshotStats:
+    """Snapshot refresh counters."""
+
+    refreshes: int = 0
+    reads: int = 0
+    last_refresh_seconds: float = 0.0
+    age_seconds: float = 0.0
+
+
+class _Generation:
+    """One read-only copy; closed and deleted once retired and unread."""
+
+    def __init__(self, path: str, sequence: int) -> None:
+        self.path = path
+        self.sequence = sequence
+        self.taken_at = time.monotonic()
+        self.connection = database.connect(path, read_only=True)
+        self.readers = 0
+        self.retired = False
+
+    def release(self) -> None:
+        self.connection.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            logfire.warning(f"APP-LOGIC: Could not remove snapshot '{self.path}'.")
+
+
+class AnalyticsSnapshot:
+    """
+    A read-only copy of a database for reports and dashboards.
+
+    Aggregate queries run on their own DuckDB connection opened with
+    `read_only=True` on a copy made by `database.copy_database`, so they never
+    hold cursors or compete for the live database while appointments are
+    saved. The first copy is taken lazily. Once data changed (according to
+    the change feed) and the copy is older than `max_staleness` seconds, a
+    new one is taken in the background while readers keep using the previous
+    copy, so a refresh never stalls a report; readers of the previous copy
+    finish on it before it is deleted.
+
+    Args:
+        cursor_factory (Callable[[], duckdb.DuckDBPyConnection]): Opens a
+            cursor on the live database to copy from.
+        directory (str): Where the snapshot files are written.
+        name (str): File name prefix, unique per source database.
+        max_staleness (float): Seconds a changed database may be reported on
+            from an older copy.
+    """
+
+    def __init__(
+        self,
+        cursor_factory: Callable[[], duckdb.DuckDBPyConnection],
+        directory: str,
+        name: str,
+        max_staleness: float = DEFAULT_MAX_STALENESS_SECONDS,
+    ) -> None:
+        self._cursor_factory = cursor_factory
+        self._directory = directory
+        self._name = name
+        self._max_staleness = max_staleness
+        self._current: Optional[_Generation] = None
+        self._generation_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stats = SnapshotStats()
+        # Copies left behind by a previous process are never read again.
+        for leftover in glob.glob(os.path.join(directory, f"{name}.*.db*")):
+            os.remove(leftover)
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Yields a read-only cursor on a recent enough copy of the database."""
+        generation = self._acquire()
+        cursor = generation.connection.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            with self._lock:
+                generation.readers -= 1
+                done = generation.retired and not generation.readers
+            if done:
+                generation.release()
+
+    def refresh(self) -> None:
+        """Takes a new copy now and retires the previous one."""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        sequence = change_feed.current_sequence()
+        path = os.path.join(
+            self._directory, f"{self._name}.{next(self._generation_ids)}.db"
+        )
+        started = time.perf_counter()
+        os.makedirs(self._directory, exist_ok=True)
+        cursor = self._cursor_factory()
+        try:
+            database.copy_database(cursor, path)
+        except Exception:
+            for partial in glob.glob(f"{path}*"):
+                os.remove(partial)
+            raise
+        finally:
+            cursor.close()
+        generation = _Generation(path, sequence)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            previous, self._current = self._current, generation
+            self._stats.refreshes += 1
+            self._stats.last_refresh_seconds = elapsed
+            retire = previous is not None and not previous.readers
+            if previous is not None:
+                previous.retired = True
+        if retire:
+            previous.release()  # type: ignore
+        logfire.info(
+            f"APP-LOGIC: Refreshed analytics snapshot '{path}' in {elapsed:.3f}s."
+        )
+
+    def stats(self) -> SnapshotStats:
+        with self._lock:
+            current = self._current
+            return SnapshotStats(
+                refreshes=self._stats.refreshes,
+                reads=self._stats.reads,
+                last_refresh_seconds=self._stats.last_refresh_seconds,
+                age_seconds=time.monotonic() - current.taken_at if current else 0.0,
+            )
+
+    def wait_for_refresh(self, timeout: Optional[float] = None) -> None:
+        """Waits for the background refresh, if one is running."""
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join(timeout)
+
+    def close(self) -> None:
+        """Closes the current copy once its readers are done."""
+        self.wait_for_refresh()
+        with self._lock:
+            current, self._current = self._current, None
+            if current is None:
+                return
+            current.retired = True
+            release = not current.readers
+        if release:
+            current.release()
+
+    def _acquire(self) -> _Generation:
+        with self._lock:
+            missing = self._current is None
+        if missing:
+            with self._refresh_lock:
+                # Another reader may have taken the first copy while this one waited.
+                with self._lock:
+                    missing = self._current is None
+                if missing:
+                    self._refresh()
+        elif self._is_stale():
+            self._refresh_in_background()
+        with self._lock:
+            generation = self._current
+            if generation is None:
+                raise RuntimeError("The analytics snapshot was closed meanwhile.")
+            generation.readers += 1
+            self._stats.reads += 1
+            return generation
+
+    def _refresh_in_background(self) -> None:
+        # A refresh already running will serve the newer data.
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refresher = threading.Thread(
+                target=self._run_refresh, name="snapshot-refresh", daemon=True
+            )
+            self._refresher.start()
+        except Exception:
+            self._refresh_lock.release()
+            raise
+
+    def _run_refresh(self) -> None:
+        try:
+            self._refresh()
+        except Exception:
+            logfire.error(
+                "APP-LOGIC: Background refresh of the analytics snapshot failed.",
+                exc_info=True,
+            )
+        finally:
+            self._refresh_lock.release()
+
+    def _is_stale(self) -> bool:
+        with self._lock:
+            current = self._current
+            if current is None:
+                return True
+            return (
+                current.sequence != change_feed.current_sequence()
+                and time.monotonic() - current.taken_at >= self._max_staleness
+            )
@@ -5,9 +5,9 @@ from uuid import uuid4
 import duckdb
 import pytest
 
-from data import appointment
+from data import appointment, patient
 from data.models.appointment_models import Appointment
-from data.models.patient_models import Patient
+from data.models.patient_models import Patient, PatientInfo
 
 
 @pytest.fixture
@@ -96,3 +96,89 @@ def test_add_duplicate_appointment_id(
         appointment.insert(db_connection, duplicate_appointment)
 
     logger.info("SUCCESS: Duplicate appointment ID handled correctly")
+
+
+def test_calendar_events_join_patient_names(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that calendar events carry patient names and computed end times."""
+    logger.info("TEST-RUN: test_calendar_events_join_patient_names")
+    p = Patient(info=PatientInfo(name="Ana"))
+    patient.insert(db_connection, p)
+    with_notes = Appointment(
+        patient_id=p.id,
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14, 30),
+        notes="online",
+    )
+    orphan = Appointment(
+        patient_id=uuid4(),
+        appointment_date=date(2025, 6, 13),
+        appointment_time=time(23, 30),
+        duration=60,
+    )
+    appointment.insert_many(db_connection, [orphan, with_notes])
+
+    events = appointment.get_calendar_events(
+        db_connection, [date(2025, 6, 1), date(2025, 6, 30)]
+    )
+
+    assert events == [
+        {
+            "id": str(with_notes.id),
+            "title": "Ana (online)",
+            "start": "2025-06-12T14:30:00",
+            "end": "2025-06-12T15:15:00",
+            "allDay": False,
+            "editable": True,
+        },
+        {
+            "id": str(orphan.id),
+            "title": appointment.UNKNOWN_PATIENT_NAME,
+            "start": "2025-06-13T23:30:00",
+            "end": "2025-06-14T00:30:00",
+            "allDay": False,
+            "editable": True,
+        },
+    ]
+    logger.info("SUCCESS: Calendar events were built in one query")
+
+
+def test_resaving_appointment_updates_indexed_columns(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that re-saving an appointment rewrites its indexed columns."""
+    logger.info("TEST-RUN: test_resaving_appointment_updates_indexed_columns")
+    appt = Appointment(
+        patient_id=uuid4(),
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14, 30),
+    )
+    appointment.insert(db_connection, appt)
+    created_at = db_connection.execute(
+        "SELECT created_at FROM appointments WHERE id = ?;", (appt.id,)
+    ).fetchone()
+
+    appt.appointment_date = date(2025, 6, 19)
+    appt.patient_id = uuid4()
+    appt.notes = "remarcada"
+    appointment.insert(db_connection, appt)
+    stored = appointment.get_by_id(db_connection, appt.id)
+    assert (stored.appointment_date, stored.patient_id, stored.notes) == (
+        date(2025, 6, 19),
+        appt.patient_id,
+        "remarcada",
+    )
+
+    appt.appointment_date = date(2025, 6, 26)
+    appointment.insert_many(db_connection, [appt])
+    assert appointment.get_by_id(db_connection, appt.id).appointment_date == date(
+        2025, 6, 26
+    )
+    assert (
+        db_connection.execute(
+            "SELECT created_at FROM appointments WHERE id = ?;", (appt.id,)
+        ).fetchone()
+        == created_at
+    )
+    logger.info("SUCCESS: Re-saved appointment kept its new date and patient")
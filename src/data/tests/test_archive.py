@@ -0,0 +1,102 @@
+import logging
+import os
+from datetime import date, time
+from uuid import UUID, uuid4
+
+import duckdb
+import pytest
+
+from data import appointment, archive, monthly_invoice
+from data.models.appointment_models import Appointment
+from data.models.invoice_models import MonthlyInvoice, MonthlyInvoiceStatus
+
+
+def test_archive_moves_closed_periods_behind_unified_views(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that closed months move to Parquet and are still read transparently."""
+    logger.info("TEST-RUN: test_archive_moves_closed_periods_behind_unified_views")
+    patient_id = uuid4()
+    for month in (1, 2, 3):
+        appointment.insert(
+            db_connection,
+            Appointment(
+                patient_id=patient_id,
+                appointment_date=date(2024, month, 10),
+                appointment_time=time(14, 30),
+            ),
+        )
+    closed = MonthlyInvoice(
+        patient_id=patient_id,
+        invoice_month=1,
+        invoice_year=2024,
+        payment_status=MonthlyInvoiceStatus.PAID,
+        total=1000,
+    )
+    monthly_invoice.insert(db_connection, closed)
+    monthly_invoice.insert(
+        db_connection,
+        MonthlyInvoice(
+            patient_id=patient_id,
+            invoice_month=2,
+            invoice_year=2024,
+            payment_status=MonthlyInvoiceStatus.PENDING,
+            total=1000,
+        ),
+    )
+
+    result = archive.archive_closed_periods(db_connection, date(2025, 1, 1))
+
+    # February still has a pending invoice, so only January is closed.
+    assert result.archived_before == date(2024, 2, 1)
+    assert result.rows == {"appointments": 1, "monthly_invoices": 1}
+    live = db_connection.execute("SELECT COUNT(*) FROM appointments;").fetchone()
+    assert live == (2,)
+    directory = archive.archive_directory(db_connection)
+    assert os.listdir(os.path.join(directory, "appointments", "year=2024")) == [
+        "month=1"
+    ]
+
+    year = appointment.get_all(
+        db_connection, period=[date(2024, 1, 1), date(2024, 12, 31)]
+    )
+    assert len(year) == 3
+    invoices = monthly_invoice.get_all_in_period(db_connection, 1, 2024)
+    assert [invoice.id for invoice in invoices] == [closed.id]
+    assert monthly_invoice.is_archived(db_connection, 1, 2024)
+    assert monthly_invoice.get_period_summary(db_connection, 1, 2024).paid == 1000
+    assert archive.archive_closed_periods(db_connection, date(2025, 1, 1)).rows == {}
+
+    archive.drop_archive(db_connection)
+    assert not os.path.exists(directory)
+    logger.info("SUCCESS: Closed periods were archived and still readable")
+
+
+def test_archived_calendar_events_open_read_only(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that events of an archived month can be opened but not saved."""
+    logger.info("TEST-RUN: test_archived_calendar_events_open_read_only")
+    archived = Appointment(
+        patient_id=uuid4(),
+        appointment_date=date(2024, 1, 10),
+        appointment_time=time(14, 30),
+    )
+    appointment.insert(db_connection, archived)
+    archive.archive_closed_periods(db_connection, date(2025, 1, 1))
+
+    (event,) = appointment.get_calendar_events(
+        db_connection, [date(2024, 1, 1), date(2024, 1, 31)]
+    )
+    opened = appointment.get_by_id(db_connection, UUID(event["id"]))
+
+    assert not event["editable"]
+    assert opened.id == archived.id
+    assert appointment.is_archived(db_connection, opened.appointment_date)
+    opened.notes = "edited"
+    with pytest.raises(ValueError):
+        appointment.save(db_connection, opened)
+    live = db_connection.execute("SELECT COUNT(*) FROM appointments;").fetchone()
+    assert live == (0,)
+    archive.drop_archive(db_connection)
+    logger.info("SUCCESS: The archived event opened read-only")
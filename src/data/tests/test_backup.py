@@ -0,0 +1,128 @@
+import logging
+from datetime import date, time
+from pathlib import Path
+from uuid import uuid4
+
+import duckdb
+import pytest
+
+from data import appointment, archive, backup, database, monthly_invoice, patient
+from data.models.appointment_models import Appointment
+from data.models.patient_models import Patient, PatientInfo
+
+
+def test_incremental_backup_restores_writes_and_deletes(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    tmp_path: Path,
+) -> None:
+    """Tests that a full plus incremental chain restores the latest state."""
+    logger.info("TEST-RUN: test_incremental_backup_restores_writes_and_deletes")
+    ana = Patient(info=PatientInfo(name="Ana"))
+    patient.insert(db_connection, ana)
+    kept, removed = (
+        Appointment(
+            patient_id=ana.id,
+            appointment_date=date(2025, 6, day),
+            appointment_time=time(14),
+        )
+        for day in (12, 19)
+    )
+    appointment.insert(db_connection, kept)
+    appointment.insert(db_connection, removed)
+    full = backup.backup_database(db_connection, str(tmp_path))
+
+    patient.insert(db_connection, Patient(info=PatientInfo(name="Caio")))
+    appointment.remove(db_connection, removed.id)
+    incremental = backup.backup_database(db_connection, str(tmp_path))
+
+    assert not full.incremental and full.tables["appointments"].rows == 2
+    assert incremental.parent == full.name
+    assert incremental.tables["patients"].rows == 1
+    assert incremental.tables["appointments"].rows == 0
+    assert incremental.tables["row_tombstones"].rows == 1
+    assert incremental.bytes_per_second > 0
+
+    target = tmp_path / "restored.db"
+    backup.restore_database(incremental.path, str(target))
+    connection = database.connect(str(target))
+    assert sorted(p.info.name for p in patient.get_all(connection)) == ["Ana", "Caio"]
+    assert connection.execute("SELECT id FROM appointments;").fetchall() == [(kept.id,)]
+    dora = Patient(info=PatientInfo(name="Dora"))
+    patient.insert(connection, dora)
+    assert dora.row_version > incremental.tables["patients"].high_water_mark  # type: ignore
+    connection.close()
+
+    (Path(full.path) / "patients.parquet").write_bytes(b"corrupted")
+    with pytest.raises(backup.BackupError):
+        backup.restore_database(incremental.path, str(tmp_path / "other.db"))
+    assert not (tmp_path / "other.db").exists()
+    logger.info("SUCCESS: Backup chain restored and corruption was detected")
+
+
+def test_restore_applies_changes_to_indexed_columns(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    tmp_path: Path,
+) -> None:
+    """Tests that an incremental bundle that reschedules an appointment restores it."""
+    logger.info("TEST-RUN: test_restore_applies_changes_to_indexed_columns")
+    appt = Appointment(
+        patient_id=uuid4(),
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14),
+    )
+    appointment.insert(db_connection, appt)
+    backup.backup_database(db_connection, str(tmp_path))
+
+    appt.appointment_date = date(2025, 6, 19)
+    appt.patient_id = uuid4()
+    appt.notes = "remarcada"
+    appointment.insert(db_connection, appt)
+    incremental = backup.backup_database(db_connection, str(tmp_path))
+
+    target = tmp_path / "restored.db"
+    backup.restore_database(incremental.path, str(target))
+    connection = database.connect(str(target))
+    restored = appointment.get_by_id(connection, appt.id)
+    assert (restored.appointment_date, restored.patient_id, restored.notes) == (
+        date(2025, 6, 19),
+        appt.patient_id,
+        "remarcada",
+    )
+    connection.close()
+    logger.info("SUCCESS: The restored appointment has its new date")
+
+
+def test_restore_brings_archived_months_back_live(
+    tmp_path: Path, logger: logging.Logger
+) -> None:
+    """Tests that archived rows are backed up and restored into the live tables."""
+    logger.info("TEST-RUN: test_restore_brings_archived_months_back_live")
+    connection = database.connect(str(tmp_path / "live.db"))
+    database.initialize(connection)
+    january, june = (
+        Appointment(
+            patient_id=uuid4(),
+            appointment_date=date(2024, month, 10),
+            appointment_time=time(14),
+        )
+        for month in (1, 6)
+    )
+    appointment.insert(connection, january)
+    backup.backup_database(connection, str(tmp_path / "backups"))
+    archive.archive_closed_periods(connection, date(2024, 3, 1))
+    appointment.insert(connection, june)
+    incremental = backup.backup_database(connection, str(tmp_path / "backups"))
+    connection.close()
+
+    target = tmp_path / "restored.db"
+    backup.restore_database(incremental.path, str(target))
+    restored = database.connect(str(target))
+    assert restored.execute(
+        "SELECT id FROM appointments ORDER BY appointment_date;"
+    ).fetchall() == [(january.id,), (june.id,)]
+    assert archive.archived_before(restored, "appointments") is None
+    assert not monthly_invoice.is_archived(restored, 1, 2024)
+    restored.close()
+    logger.info("SUCCESS: Archived months were restored as live rows")
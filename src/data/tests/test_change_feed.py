@@ -0,0 +1,58 @@
+import logging
+from datetime import date, time
+
+import duckdb
+import pytest
+
+from data import appointment, change_feed, patient
+from data.change_feed import ChangeEvent, ChangeKind
+from data.db_utils import transaction
+from data.models.appointment_models import Appointment
+from data.models.patient_models import Patient, PatientInfo
+
+
+def test_change_feed_publishes_committed_writes(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that writes are published with table, id and kind once committed."""
+    logger.info("TEST-RUN: test_change_feed_publishes_committed_writes")
+    received: list[ChangeEvent] = []
+    token = change_feed.subscribe(received.extend, tables=("patients", "appointments"))
+    start = change_feed.current_sequence()
+
+    p = Patient(info=PatientInfo(name="Published"))
+    appt = Appointment(
+        patient_id=p.id,
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14, 30),
+    )
+    with transaction(db_connection):
+        patient.insert(db_connection, p)
+        appointment.insert(db_connection, appt)
+        assert received == []
+    appointment.remove(db_connection, appt.id)
+    change_feed.unsubscribe(token)
+
+    assert [(e.table, e.key, e.kind) for e in received] == [
+        ("patients", p.id, ChangeKind.UPSERT),
+        ("appointments", appt.id, ChangeKind.UPSERT),
+        ("appointments", appt.id, ChangeKind.DELETE),
+    ]
+    assert change_feed.changes_since(start, ("patients",)) == received[:1]
+    logger.info("SUCCESS: Committed writes were published in order")
+
+
+def test_change_feed_skips_rolled_back_writes(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a rolled back transaction publishes nothing."""
+    logger.info("TEST-RUN: test_change_feed_skips_rolled_back_writes")
+    start = change_feed.current_sequence()
+
+    with pytest.raises(RuntimeError):
+        with transaction(db_connection):
+            patient.insert(db_connection, Patient(info=PatientInfo(name="Rolled")))
+            raise RuntimeError("abort")
+
+    assert change_feed.changes_since(start) == []
+    logger.info("SUCCESS: Rolled back writes were not published")
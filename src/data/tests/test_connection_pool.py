@@ -0,0 +1,104 @@
+import logging
+import threading
+
+import duckdb
+import pytest
+
+from data.connection_pool import CursorPool, PoolTimeoutError
+
+
+def test_cursor_pool_reuses_cursors(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that released cursors are handed out again instead of reopened."""
+    logger.info("TEST-RUN: test_cursor_pool_reuses_cursors")
+    pool = CursorPool(db_connection, size=2)
+
+    with pool.cursor() as first:
+        assert first.execute("SELECT 1;").fetchone() == (1,)
+    with pool.cursor() as second:
+        assert second is first
+
+    stats = pool.stats()
+    assert stats.checkouts == 2
+    assert stats.open_cursors == 1
+    pool.close()
+    logger.info("SUCCESS: Cursor pool reused its cursor")
+
+
+def test_cursor_pool_times_out_when_exhausted(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a checkout fails with PoolTimeoutError when every cursor is busy."""
+    logger.info("TEST-RUN: test_cursor_pool_times_out_when_exhausted")
+    pool = CursorPool(db_connection, size=1, checkout_timeout=0.05)
+
+    with pool.cursor():
+        with pytest.raises(PoolTimeoutError):
+            with pool.cursor():
+                pass
+
+    assert pool.stats().timeouts == 1
+    pool.close()
+    logger.info("SUCCESS: Exhausted pool timed out correctly")
+
+
+def test_cursor_pool_serves_concurrent_threads(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that several threads can read through the pool at the same time."""
+    logger.info("TEST-RUN: test_cursor_pool_serves_concurrent_threads")
+    pool = CursorPool(db_connection, size=3)
+    results: list[int] = []
+    lock = threading.Lock()
+
+    def read() -> None:
+        with pool.cursor() as cursor:
+            (count,) = cursor.execute("SELECT COUNT(*) FROM patients;").fetchone()  # type: ignore
+        with lock:
+            results.append(count)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [0] * 8
+    assert pool.stats().open_cursors <= 3
+    pool.close()
+    logger.info("SUCCESS: Concurrent reads were served by the pool")
+
+
+def test_cursor_pool_resets_failed_cursors_and_closes_late_returns(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a failed block's transaction is rolled back before reuse."""
+    logger.info(
+        "TEST-RUN: test_cursor_pool_resets_failed_cursors_and_closes_late_returns"
+    )
+    pool = CursorPool(db_connection, size=2)
+
+    with pytest.raises(RuntimeError):
+        with pool.cursor() as cursor:
+            cursor.execute("BEGIN TRANSACTION;")
+            cursor.execute("CREATE TABLE leaked (id INTEGER);")
+            raise RuntimeError("boom")
+    with pool.cursor() as cursor:
+        # Would fail inside the transaction left open by the failed block.
+        cursor.execute("BEGIN TRANSACTION;")
+        cursor.execute("ROLLBACK;")
+        tables = cursor.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'leaked';"
+        ).fetchone()
+        assert tables == (0,)
+
+    with pool.cursor() as held:
+        with pool.cursor():
+            pass
+        pool.close()
+        assert pool.stats().open_cursors == 1
+    assert pool.stats().open_cursors == 0
+    with pytest.raises(duckdb.ConnectionException):
+        held.execute("SELECT 1;")
+    logger.info("SUCCESS: Failed cursors were reset and late returns closed")
@@ -124,3 +124,29 @@ def test_initialize_is_idempotent(logger: logging.Logger) -> None:
             connection.close()  # type: ignore
         if os.path.exists(db_file):
             os.remove(db_file)
+
+
+def test_ensure_schema_runs_ddl_once(logger: logging.Logger) -> None:
+    """Test that repeated bootstrap calls only run the DDL the first time."""
+    db_file = "test_bootstrap.db"
+    logger.info("TEST-RUN: test_ensure_schema_runs_ddl_once")
+
+    try:
+        connection = database.connect(db_file)
+        before = database.get_bootstrap_stats()
+
+        assert database.ensure_schema(connection, db_file) is True
+        for _ in range(5):
+            assert database.ensure_schema(connection, db_file) is False
+
+        after = database.get_bootstrap_stats()
+        assert after.calls - before.calls == 6
+        assert after.version_checks - before.version_checks == 1
+        assert after.ddl_runs - before.ddl_runs == 1
+
+        logger.info("SUCCESS: Schema bootstrap ran its DDL only once")
+    finally:
+        if "connection" in locals():
+            connection.close()  # type: ignore
+        if os.path.exists(db_file):
+            os.remove(db_file)
@@ -0,0 +1,140 @@
+import logging
+from datetime import date, time
+
+import duckdb
+import pytest
+
+from data import appointment, patient
+from data.db_utils import TransactionAbortedError, insert_models, transaction
+from data.models.appointment_models import Appointment
+from data.models.patient_models import Patient, PatientInfo, PatientStatus
+
+
+@pytest.fixture
+def patients_batch() -> list[Patient]:
+    """Fixture to provide a batch of valid patient models for tests."""
+    return [
+        Patient(info=PatientInfo(name=f"Patient {i:03d}"), status=PatientStatus.ACTIVE)
+        for i in range(25)
+    ]
+
+
+def test_insert_many_patients(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    patients_batch: list[Patient],
+) -> None:
+    """Tests that a batch of patients is written in one call and can be read back."""
+    logger.info("TEST-RUN: test_insert_many_patients")
+
+    patient.insert_many(db_connection, patients_batch)
+
+    retrieved = patient.get_all(db_connection)
+    assert [p.id for p in retrieved] == [p.id for p in patients_batch]
+    logger.info("SUCCESS: Patient batch inserted successfully")
+
+
+def test_insert_models_replaces_and_deduplicates(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    patients_batch: list[Patient],
+) -> None:
+    """Tests that a batch replaces existing rows and the last duplicate wins."""
+    logger.info("TEST-RUN: test_insert_models_replaces_and_deduplicates")
+
+    appt = Appointment(
+        patient_id=patients_batch[0].id,
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14, 30),
+    )
+    appointment.insert(db_connection, appt)
+
+    first = appointment.appointment_field_map(appt) | {"notes": "first"}
+    last = appointment.appointment_field_map(appt) | {"notes": "last"}
+    insert_models(db_connection, "appointments", [first, last])
+
+    assert appointment.get_by_id(db_connection, appt.id).notes == "last"
+    logger.info("SUCCESS: Batch replaced and deduplicated rows correctly")
+
+
+def test_insert_models_rolls_back_on_failure(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    patients_batch: list[Patient],
+) -> None:
+    """Tests that a failing batch leaves no partially written rows behind."""
+    logger.info("TEST-RUN: test_insert_models_rolls_back_on_failure")
+
+    rows = [patient.patient_field_map(p) for p in patients_batch]
+    rows[-1]["status"] = "invalid status"
+
+    with pytest.raises(Exception):
+        insert_models(db_connection, "patients", rows)
+
+    assert patient.get_all(db_connection) == []
+    logger.info("SUCCESS: Failed batch was rolled back")
+
+
+def test_get_all_columns_matches_model_reads(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    patients_batch: list[Patient],
+) -> None:
+    """Tests that the NumPy and Arrow reads return the same rows as `get_all`."""
+    logger.info("TEST-RUN: test_get_all_columns_matches_model_reads")
+
+    patient.insert_many(db_connection, patients_batch)
+
+    columns = patient.get_all_columns(db_connection)
+    table = patient.get_all_columns(db_connection, columnar_format="arrow")
+    names = [p.info.name for p in patient.get_all(db_connection)]
+
+    assert list(columns["name"]) == names
+    assert table.column("name").to_pylist() == names
+    assert patient.get_all_columns(db_connection, status="inactive")["name"].size == 0
+    logger.info("SUCCESS: Columnar reads match model reads")
+
+
+def test_transaction_commits_nested_blocks_once(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    patients_batch: list[Patient],
+) -> None:
+    """Tests that nested blocks and batch inserts join the outer transaction."""
+    logger.info("TEST-RUN: test_transaction_commits_nested_blocks_once")
+
+    with pytest.raises(RuntimeError):
+        with transaction(db_connection):
+            patient.insert_many(db_connection, patients_batch[:5])
+            with transaction(db_connection):
+                patient.insert(db_connection, patients_batch[5])
+            raise RuntimeError("fail after the nested block")
+    assert patient.get_all(db_connection) == []
+
+    with transaction(db_connection):
+        patient.insert_many(db_connection, patients_batch[:5])
+        with transaction(db_connection):
+            patient.insert(db_connection, patients_batch[5])
+    assert len(patient.get_all(db_connection)) == 6
+    logger.info("SUCCESS: Nested blocks committed and rolled back as one")
+
+
+def test_transaction_aborts_after_failed_nested_block(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    patients_batch: list[Patient],
+) -> None:
+    """Tests that a handled failure in a nested block still rolls back the outer one."""
+    logger.info("TEST-RUN: test_transaction_aborts_after_failed_nested_block")
+
+    with pytest.raises(TransactionAbortedError):
+        with transaction(db_connection):
+            patient.insert(db_connection, patients_batch[0])
+            try:
+                with transaction(db_connection):
+                    raise ValueError("nested failure")
+            except ValueError:
+                pass
+
+    assert patient.get_all(db_connection) == []
+    logger.info("SUCCESS: Failed nested block rolled back the transaction")
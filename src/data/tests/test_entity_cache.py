@@ -0,0 +1,54 @@
+import logging
+
+import duckdb
+
+from data import patient
+from data.db_utils import transaction
+from data.entity_cache import EntityCache, entity_cache
+from data.models.patient_models import Patient, PatientInfo
+
+
+def test_entity_cache_evicts_least_recently_used(logger: logging.Logger) -> None:
+    """Tests that the cache stays bounded and counts hits, misses and evictions."""
+    logger.info("TEST-RUN: test_entity_cache_evicts_least_recently_used")
+    cache = EntityCache(max_entries=2)
+    first, second, third = (
+        Patient.model_validate({"info": {"name": n}}) for n in "abc"
+    )
+
+    cache.put("patients", first.id, first)
+    cache.put("patients", second.id, second)
+    assert cache.get("patients", first.id) == first
+    cache.put("patients", third.id, third)
+
+    assert cache.get("patients", second.id) is None
+    stats = cache.stats()
+    assert (stats.size, stats.hits, stats.misses, stats.evictions) == (2, 1, 1, 1)
+    logger.info("SUCCESS: Cache evicted the least recently used entry")
+
+
+def test_entity_cache_invalidated_by_writes(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+) -> None:
+    """Tests that data-layer writes drop the cached copy of the written row."""
+    logger.info("TEST-RUN: test_entity_cache_invalidated_by_writes")
+    entity_cache.clear()
+    cached_patient = Patient(info=PatientInfo(name="Cached"))
+    patient.insert(db_connection, cached_patient)
+
+    def load() -> Patient:
+        return patient.get_by_id(db_connection, cached_patient.id)
+
+    cached = entity_cache.get_or_load("patients", cached_patient.id, load)
+    cached.info.name = "Mutated copy"
+    assert entity_cache.get("patients", cached_patient.id) == cached_patient
+
+    updated = cached_patient.model_copy(deep=True)
+    updated.info.name = "Renamed"
+    with transaction(db_connection):
+        patient.insert_many(db_connection, [updated])
+
+    assert entity_cache.get("patients", updated.id) is None
+    assert entity_cache.get_or_load("patients", updated.id, load).info.name == "Renamed"
+    logger.info("SUCCESS: Writes invalidated the cached entity")
@@ -0,0 +1,74 @@
+import logging
+from pathlib import Path
+
+import duckdb
+
+from data import change_feed, database, patient
+from data.maintenance import MaintenanceWorker
+from data.models.patient_models import Patient, PatientInfo
+
+
+def test_maintenance_checkpoints_wal_when_writes_settle(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a due checkpoint runs, but not while writes are in flight."""
+    logger.info("TEST-RUN: test_maintenance_checkpoints_wal_when_writes_settle")
+    worker = MaintenanceWorker(
+        db_connection.cursor,
+        "psychologist_app_test.db",
+        max_interval=0,
+        poll_interval=3600,
+        quiet_period=3600,
+    )
+    patient.insert_many(
+        db_connection,
+        [Patient(info=PatientInfo(name=f"Patient {i}")) for i in range(200)],
+    )
+    assert worker.stats().wal_bytes > 0
+
+    # A commit just happened, so the due checkpoint waits.
+    assert not worker.run_once()
+    writer = db_connection.cursor()
+    writer.execute("BEGIN TRANSACTION;")
+    writer.execute("DELETE FROM patients;")
+    # DuckDB refuses to checkpoint under an open write transaction.
+    assert not worker.checkpoint()
+    writer.execute("ROLLBACK;")
+    assert worker.checkpoint()
+
+    stats = worker.stats()
+    assert (stats.checkpoints, stats.deferred) == (1, 2)
+    assert stats.wal_bytes < stats.peak_wal_bytes
+    worker.close()
+    logger.info("SUCCESS: WAL was checkpointed once writes settled")
+
+
+def test_maintenance_ignores_writes_to_other_shards(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    tmp_path: Path,
+) -> None:
+    """Tests that commits to another database file do not defer a checkpoint."""
+    logger.info("TEST-RUN: test_maintenance_ignores_writes_to_other_shards")
+    patient.insert_many(
+        db_connection,
+        [Patient(info=PatientInfo(name=f"Patient {i}")) for i in range(200)],
+    )
+    worker = MaintenanceWorker(
+        db_connection.cursor,
+        "psychologist_app_test.db",
+        max_interval=0,
+        poll_interval=3600,
+        quiet_period=3600,
+    )
+    other = database.connect(str(tmp_path / "other.db"))
+    database.initialize(other)
+    # Publishes on the process-wide change feed, like any shard's commit.
+    patient.insert(other, Patient(info=PatientInfo(name="Elsewhere")))
+    other.close()
+    assert change_feed.current_sequence() > 0
+
+    assert worker.run_once()
+    assert worker.stats().deferred == 0
+    worker.close()
+    logger.info("SUCCESS: Another shard's commit did not hold back the checkpoint")
@@ -0,0 +1,44 @@
+import logging
+
+import duckdb
+
+from data import migrations
+
+
+def _index_names(connection: duckdb.DuckDBPyConnection) -> set[str]:
+    rows = connection.execute("SELECT index_name FROM duckdb_indexes();").fetchall()
+    return {row[0] for row in rows}
+
+
+def test_initialize_applies_all_migrations(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a fresh database ends at the latest version with its indexes."""
+    logger.info("TEST-RUN: test_initialize_applies_all_migrations")
+
+    assert migrations.get_current_version(db_connection) == migrations.LATEST_VERSION
+    assert {
+        "idx_appointments_date",
+        "idx_appointments_patient",
+        "idx_monthly_invoices_period",
+        "idx_documents_patient_category",
+    }.issubset(_index_names(db_connection))
+    assert migrations.migrate(db_connection) == []
+    logger.info("SUCCESS: All migrations applied once")
+
+
+def test_dry_run_does_not_change_schema(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a dry run reports pending migrations without applying them."""
+    logger.info("TEST-RUN: test_dry_run_does_not_change_schema")
+
+    db_connection.execute("DROP INDEX idx_appointments_date;")
+    db_connection.execute("DELETE FROM schema_version;")
+
+    pending = migrations.migrate(db_connection, dry_run=True)
+
+    assert [m.version for m in pending] == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.get_current_version(db_connection) == 0
+    assert "idx_appointments_date" not in _index_names(db_connection)
+    logger.info("SUCCESS: Dry run left the schema untouched")
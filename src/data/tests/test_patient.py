@@ -5,7 +5,8 @@ import duckdb
 import pytest
 
 from data import patient
-from data.models.patient_models import Patient
+from data.db_utils import WriteOutcome
+from data.models.patient_models import Child, Patient, PatientInfo, PatientStatus
 
 
 def test_add_and_get_patient_with_pydantic(
@@ -88,3 +89,115 @@ def test_add_duplicate_patient_id(
         patient.insert(db_connection, duplicate_patient)
 
     logger.info("SUCCESS: Duplicate patient ID handled correctly")
+
+
+def test_save_patient_refuses_stale_version(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that saving a copy read before another save reports a conflict."""
+    logger.info("TEST-RUN: test_save_patient_refuses_stale_version")
+    p = Patient(info=PatientInfo(name="Versioned"))
+    patient.insert(db_connection, p)
+    first, second = p.model_copy(deep=True), p.model_copy(deep=True)
+
+    first.info.name = "First edit"
+    assert patient.save(db_connection, first).applied
+    second.info.name = "Second edit"
+    result = patient.save(db_connection, second)
+
+    assert result.outcome is WriteOutcome.CONFLICT
+    assert result.row_version == first.row_version
+    assert patient.get_by_id(db_connection, p.id).info.name == "First edit"
+    logger.info("SUCCESS: Stale save was refused")
+
+
+def test_patch_patient_writes_only_given_columns(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a patch leaves the other columns alone and rejects unknown ones."""
+    logger.info("TEST-RUN: test_patch_patient_writes_only_given_columns")
+    p = Patient(info=PatientInfo(name="Patched"), diagnosis="Before")
+    patient.insert(db_connection, p)
+
+    result = patient.patch(
+        db_connection, p.id, {"diagnosis": "After"}, expected_version=p.row_version
+    )
+
+    stored = patient.get_by_id(db_connection, p.id)
+    assert result.applied and stored.row_version == result.row_version
+    assert (stored.info.name, stored.diagnosis) == ("Patched", "After")
+    assert (
+        patient.patch(db_connection, uuid4(), {"diagnosis": "x"}).outcome
+        is WriteOutcome.NOT_FOUND
+    )
+    with pytest.raises(ValueError):
+        patient.patch(db_connection, p.id, {"row_version": 1})
+    logger.info("SUCCESS: Patch only wrote the given column")
+
+
+def test_patient_pages_by_status(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that statuses are counted and listed in keyset pages by name."""
+    logger.info("TEST-RUN: test_patient_pages_by_status")
+    patient.insert_many(
+        db_connection,
+        [Patient(info=PatientInfo(name=f"Active {i:02d}")) for i in range(5)]
+        + [Patient(info=PatientInfo(name="Lead"), status=PatientStatus.LEAD)],
+    )
+
+    counts = patient.count_by_status(db_connection)
+    assert counts[PatientStatus.ACTIVE] == 5 and counts[PatientStatus.LEAD] == 1
+    assert counts[PatientStatus.INACTIVE] == 0
+
+    first = patient.get_page(db_connection, PatientStatus.ACTIVE, limit=2)
+    second = patient.get_page(db_connection, PatientStatus.ACTIVE, first.next_key, 2)
+    last = patient.get_page(db_connection, PatientStatus.ACTIVE, second.next_key, 2)
+    names = [p.info.name for page in (first, second, last) for p in page.patients]
+    assert names == [f"Active {i:02d}" for i in range(5)]
+    assert last.next_key is None
+    logger.info("SUCCESS: Patients were counted and paginated by status")
+
+
+def test_search_patients_ignores_accents_and_punctuation(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that search matches folded names, CPF digits, tutors and schools."""
+    logger.info("TEST-RUN: test_search_patients_ignores_accents_and_punctuation")
+    joao = Patient(info=PatientInfo(name="João Gonçalves", cpf_cnpj="123.456.789-00"))
+    bia = Patient(
+        info=PatientInfo(name="Beatriz Souza"),
+        child=Child(school="Escola São José", tutor_name="Márcia Souza"),
+    )
+    patient.insert_many(db_connection, [joao, bia])
+
+    assert [p.id for p in patient.search(db_connection, "joao goncalves")] == [joao.id]
+    assert [p.id for p in patient.search(db_connection, "Gonsalves")] == [joao.id]
+    assert [p.id for p in patient.search(db_connection, "12345678900")] == [joao.id]
+    assert [p.id for p in patient.search(db_connection, "sao jose")] == [bia.id]
+    assert [p.id for p in patient.search(db_connection, "marcia")] == [bia.id]
+
+    joao.info.name = "João Pereira"
+    patient.insert(db_connection, joao)
+    assert patient.search(db_connection, "goncalves") == []
+    logger.info("SUCCESS: Search found patients through every indexed field")
+
+
+def test_patient_summaries_index_positions(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that summaries are listed by name with their positions indexed by id."""
+    logger.info("TEST-RUN: test_patient_summaries_index_positions")
+    bruno = Patient(info=PatientInfo(name="Bruno"))
+    ana = Patient(info=PatientInfo(name="Ana"))
+    gone = Patient(info=PatientInfo(name="Carla"), status=PatientStatus.INACTIVE)
+    patient.insert_many(db_connection, [bruno, ana, gone])
+
+    summaries = patient.get_summaries(db_connection, are_active=True)
+
+    assert [s.name for s in summaries.items] == ["Ana", "Bruno"]
+    assert summaries.index_of(bruno.id) == 1
+    assert summaries.items[1].status == PatientStatus.ACTIVE
+    assert summaries.index_of(gone.id) is None
+    assert len(patient.get_summaries(db_connection).items) == 3
+    logger.info("SUCCESS: Summaries were listed and indexed")
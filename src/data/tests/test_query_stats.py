@@ -0,0 +1,48 @@
+import logging
+
+import duckdb
+
+from data import patient, query_stats
+from data.models.patient_models import Patient, PatientInfo
+
+
+def test_normalize_statement_collapses_literals_and_batches(
+    logger: logging.Logger,
+) -> None:
+    """Tests that statements differing only in literals share one shape."""
+    logger.info("TEST-RUN: test_normalize_statement_collapses_literals_and_batches")
+
+    assert (
+        query_stats.normalize_statement(
+            "SELECT *   FROM patients\n WHERE status = 'lead' LIMIT 10"
+        )
+        == "SELECT * FROM patients WHERE status = ? LIMIT ?"
+    )
+    assert (
+        query_stats.normalize_statement("INSERT INTO t (a, b) VALUES (?, ?), (?, ?)")
+        == "INSERT INTO t (a, b) VALUES (?, ?), ..."
+    )
+    logger.info("SUCCESS: Statements were normalized")
+
+
+def test_queries_are_timed_and_slow_ones_logged(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that data-layer queries feed the histograms and the slow-query log."""
+    logger.info("TEST-RUN: test_queries_are_timed_and_slow_ones_logged")
+    query_stats.reset()
+    threshold = query_stats.get_slow_query_threshold()
+    query_stats.set_slow_query_threshold(0)
+
+    try:
+        patient.insert(db_connection, Patient(info=PatientInfo(name="Timed")))
+        patient.get_all(db_connection)
+    finally:
+        query_stats.set_slow_query_threshold(threshold)
+
+    histograms = query_stats.get_histograms()
+    select = "SELECT * FROM patients ORDER BY name, status DESC;"
+    assert histograms[select].calls == 1
+    assert histograms[select].rows == 1
+    assert any(q.statement == select for q in query_stats.get_slow_queries())
+    logger.info("SUCCESS: Queries were timed and logged")
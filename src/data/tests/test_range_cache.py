@@ -0,0 +1,56 @@
+import logging
+from datetime import date, time
+from typing import Any
+
+import duckdb
+
+from data import appointment, patient
+from data.models.appointment_models import Appointment
+from data.models.patient_models import Patient, PatientInfo
+from data.range_cache import RangeCache
+
+
+def test_range_cache_prefetches_and_is_invalidated_by_writes(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that prefetched ranges are served from the cache until a write."""
+    logger.info("TEST-RUN: test_range_cache_prefetches_and_is_invalidated_by_writes")
+    cache: RangeCache[list[dict[str, Any]]] = RangeCache(("appointments", "patients"))
+    p = Patient(info=PatientInfo(name="Ana"))
+    patient.insert(db_connection, p)
+    appointment.insert(
+        db_connection,
+        Appointment(
+            patient_id=p.id,
+            appointment_date=date(2025, 6, 17),
+            appointment_time=time(9, 0),
+        ),
+    )
+    week = [date(2025, 6, 16), date(2025, 6, 22)]
+    loads: list[list[date]] = []
+
+    def load(period: list[date]) -> list[dict[str, Any]]:
+        loads.append(period)
+        return appointment.get_calendar_events(db_connection, period)
+
+    try:
+        future = cache.prefetch(tuple(week), lambda: load(week))
+        assert future is not None
+        future.result()
+        assert cache.prefetch(tuple(week), lambda: load(week)) is None
+
+        events = cache.get_or_load(tuple(week), lambda: load(week))
+        assert [event["title"] for event in events] == ["Ana"]
+        assert len(loads) == 1
+
+        p.info.name = "Ana Souza"
+        patient.insert(db_connection, p)
+        assert cache.get(tuple(week)) is None
+        events = cache.get_or_load(tuple(week), lambda: load(week))
+        assert [event["title"] for event in events] == ["Ana Souza"]
+
+        stats = cache.stats()
+        assert (stats.prefetches, stats.hits, stats.invalidations) == (1, 1, 1)
+    finally:
+        cache.close()
+    logger.info("SUCCESS: Ranges were prefetched and invalidated by writes")
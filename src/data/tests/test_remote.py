@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator
+from uuid import uuid4
+
+import pytest
+
+from data import archive, backup, change_feed, database, patient
+from data import remote as remote_module
+from data.models.patient_models import Patient, PatientInfo
+from data.range_cache import RangeCache
+from data.remote import (
+    CallTarget,
+    DatabaseServer,
+    RemoteCall,
+    RemoteDatabase,
+    RemoteDatabaseError,
+    RemoteUnit,
+)
+from data.shard_router import ShardRouter
+
+
+@pytest.fixture
+def server(tmp_path: Path) -> Iterator[DatabaseServer]:
+    """Fixture to run a database server in a thread."""
+    router = ShardRouter(
+        str(tmp_path / "shards"), default_path=str(tmp_path / "default.db")
+    )
+    server = DatabaseServer(router, str(tmp_path / "db.sock"), b"test")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.close()
+    router.close()
+
+
+@pytest.fixture
+def remote(server: DatabaseServer) -> Iterator[RemoteDatabase]:
+    """Fixture to connect a client to the test database server."""
+    client = RemoteDatabase(server.address, b"test", sync_interval=0.05)
+    yield client
+    client.close()
+
+
+def sleep_on_server(connection: Any, seconds: float) -> float:
+    """A stand-in for a slow report, registered with the server by the tests."""
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.fixture
+def slow_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Fixture to let the test database server run `sleep_on_server`."""
+    monkeypatch.setitem(
+        remote_module.DATA_FUNCTIONS,
+        (sleep_on_server.__module__, sleep_on_server.__name__),
+        sleep_on_server,
+    )
+
+
+def test_remote_database_runs_data_calls(
+    remote: RemoteDatabase, logger: logging.Logger
+) -> None:
+    """Tests that data-layer calls run on the server's shard and return models."""
+    logger.info("TEST-RUN: test_remote_database_runs_data_calls")
+    p = Patient(info=PatientInfo(name="Remote"))
+
+    remote.call("ana@clinic.com", patient.insert, p)
+    stored = remote.call("ana@clinic.com", patient.get_by_id, p.id)
+
+    assert stored.info.name == "Remote" and stored.row_version is not None
+    assert remote.call("bruno@clinic.com", patient.get_all) == []
+    with pytest.raises(ValueError):
+        remote.call("bruno@clinic.com", patient.get_by_id, p.id)
+    logger.info("SUCCESS: Remote calls were routed to the user's shard")
+
+
+def test_remote_database_batches_concurrent_calls(
+    remote: RemoteDatabase, logger: logging.Logger
+) -> None:
+    """Tests that concurrent callers share round trips and atomic units roll back."""
+    logger.info("TEST-RUN: test_remote_database_batches_concurrent_calls")
+    patients = [Patient(info=PatientInfo(name=f"Patient {i}")) for i in range(20)]
+    start = remote.round_trips
+    threads = [
+        threading.Thread(target=remote.call, args=(None, patient.insert, p))
+        for p in patients
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(remote.call(None, patient.get_all)) == 20
+    assert remote.round_trips - start < 21
+
+    failing = RemoteUnit(
+        None,
+        (
+            RemoteCall.of(patient.insert, Patient(info=PatientInfo(name="Rolled"))),
+            RemoteCall.of(patient.get_by_id, uuid4()),
+        ),
+        atomic=True,
+    )
+    with pytest.raises(ValueError):
+        remote.submit(failing)
+    assert len(remote.call(None, patient.get_all)) == 20
+    logger.info("SUCCESS: Concurrent calls were batched")
+
+
+def test_remote_database_refuses_non_data_calls(
+    remote: RemoteDatabase, logger: logging.Logger
+) -> None:
+    """Tests that only public data-layer functions can be called remotely."""
+    logger.info("TEST-RUN: test_remote_database_refuses_non_data_calls")
+    with pytest.raises(RemoteDatabaseError):
+        remote.call(None, database.initialize)
+    with pytest.raises(RemoteDatabaseError):
+        remote.call(None, patient.create_patients_table)
+    # File-managing functions that take arbitrary paths stay server-side.
+    with pytest.raises(RemoteDatabaseError):
+        remote.call(None, backup.restore_database, "bundle", "target.db")
+    with pytest.raises(RemoteDatabaseError):
+        remote.call(None, backup.backup_database, "/tmp")
+    with pytest.raises(RemoteDatabaseError):
+        remote.call(None, archive.drop_archive)
+    logger.info("SUCCESS: Non data-layer calls were refused")
+
+
+def test_remote_database_runs_reports_beside_saves(
+    remote: RemoteDatabase, slow_calls: None, logger: logging.Logger
+) -> None:
+    """Tests that a slow report does not hold up the shard calls of other sessions."""
+    logger.info("TEST-RUN: test_remote_database_runs_reports_beside_saves")
+    report = threading.Thread(
+        target=remote.call,
+        args=(None, sleep_on_server, 1.0),
+        kwargs={"target": CallTarget.ANALYTICS},
+    )
+    report.start()
+    time.sleep(0.1)
+
+    started = time.perf_counter()
+    remote.call(None, patient.insert, Patient(info=PatientInfo(name="Quick")))
+    elapsed = time.perf_counter() - started
+    report.join()
+
+    assert elapsed < 0.5
+    logger.info("SUCCESS: The save did not wait for the report")
+
+
+def test_remote_database_times_out_and_resets_caches(
+    server: DatabaseServer, slow_calls: None, logger: logging.Logger
+) -> None:
+    """Tests that an unanswered call fails in time and resets the local caches."""
+    logger.info("TEST-RUN: test_remote_database_times_out_and_resets_caches")
+    client = RemoteDatabase(server.address, b"test", timeout=0.3)
+    cache: RangeCache[str] = RangeCache(["appointments"])
+    cache.get_or_load("week", lambda: "cached")
+    events: list[change_feed.ChangeEvent] = []
+    token = change_feed.subscribe(events.extend)
+    try:
+        with pytest.raises(RemoteDatabaseError):
+            client.call(None, sleep_on_server, 1.0)
+        # The dispatcher gives up on the connection right after the caller.
+        deadline = time.monotonic() + 5
+        while not events and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert any(event.kind == change_feed.ChangeKind.RESET for event in events)
+        assert cache.get("week") is None
+        # The next call goes over a new connection.
+        assert client.call(None, patient.get_all) == []
+    finally:
+        change_feed.unsubscribe(token)
+        cache.close()
+        client.close()
+    logger.info("SUCCESS: The call timed out and the caches were reset")
@@ -0,0 +1,231 @@
+import logging
+from datetime import date, time
+from uuid import uuid4
+
+import duckdb
+
+from data import appointment, documents, monthly_invoice, patient
+from data.db_utils import transaction
+from data.models.appointment_models import Appointment
+from data.models.document_models import (
+    Document,
+    DocumentCategory,
+    PsychologicalReportContent,
+)
+from data.models.invoice_models import AppointmentData, MonthlyInvoice
+from data.models.patient_models import Child, Patient, PatientInfo, PatientStatus
+
+
+def test_mappers_round_trip_nested_models(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that every mapped model reads back equal to what was written."""
+    logger.info("TEST-RUN: test_mappers_round_trip_nested_models")
+
+    patient_ = Patient(
+        info=PatientInfo(name="Mapped Child", birthdate=date(2015, 3, 2)),
+        status=PatientStatus.IN_TESTING,
+        child=Child(school="Escola", tutor_name="Tutor"),
+    )
+    appt = Appointment(
+        patient_id=patient_.id,
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14, 30),
+    )
+    invoice = MonthlyInvoice(
+        patient_id=patient_.id,
+        invoice_month=6,
+        invoice_year=2025,
+        appointment_data=AppointmentData(
+            sessions_completed=1, appointment_dates=[date(2025, 6, 12)]
+        ),
+    )
+    document = Document(
+        patient_id=patient_.id,
+        category=DocumentCategory.PSYCHOLOGICAL_REPORT,
+        content=PsychologicalReportContent(identification="id"),
+    )
+
+    patient.insert(db_connection, patient_)
+    appointment.insert(db_connection, appt)
+    monthly_invoice.insert(db_connection, invoice)
+    documents.insert(db_connection, document)
+
+    assert patient.get_by_id(db_connection, patient_.id) == patient_
+    assert appointment.get_by_id(db_connection, appt.id) == appt
+    assert monthly_invoice.get_by_id(db_connection, invoice.id) == invoice
+    assert documents.get_all_for_patient_id(db_connection, patient_.id) == [document]
+    logger.info("SUCCESS: All mapped models round-tripped")
+
+
+def test_trusted_reads_match_validated_reads(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that trusted decoding builds the same models as validated decoding."""
+    logger.info("TEST-RUN: test_trusted_reads_match_validated_reads")
+
+    patient_ = Patient(info=PatientInfo(name="Trusted"), child=Child(school="Escola"))
+    appt = Appointment(
+        patient_id=patient_.id,
+        appointment_date=date.today(),
+        appointment_time=time(9, 0),
+    )
+    invoice = MonthlyInvoice(
+        patient_id=patient_.id,
+        invoice_month=6,
+        invoice_year=2025,
+        appointment_data=AppointmentData(appointment_dates=[date(2025, 6, 2)]),
+    )
+    document = Document(patient_id=patient_.id)
+    patient.insert(db_connection, patient_)
+    appointment.insert(db_connection, appt)
+    monthly_invoice.insert(db_connection, invoice)
+    documents.insert(db_connection, document)
+
+    assert patient.get_all(db_connection, trusted=True) == patient.get_all(
+        db_connection
+    )
+    assert appointment.get_all(db_connection, trusted=True) == [appt]
+    assert monthly_invoice.get_existing_invoices_in_period(
+        db_connection, 6, 2025, trusted=True
+    ) == [invoice]
+    assert documents.get_all_for_patient_id(
+        db_connection, patient_.id, trusted=True
+    ) == [document]
+    logger.info("SUCCESS: Trusted reads matched validated reads")
+
+
+def test_trusted_reads_validate_stored_json(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that trusted reads fill defaults and drop extras of JSON columns."""
+    logger.info("TEST-RUN: test_trusted_reads_validate_stored_json")
+
+    document = Document(
+        patient_id=uuid4(),
+        category=DocumentCategory.PSYCHOLOGICAL_REPORT,
+        content=PsychologicalReportContent(identification="Ana"),
+    )
+    invoice = MonthlyInvoice(patient_id=uuid4(), invoice_month=6, invoice_year=2025)
+    documents.insert(db_connection, document)
+    monthly_invoice.insert(db_connection, invoice)
+    # Written by an older version: a field with a default missing, a stray key.
+    db_connection.execute(
+        """UPDATE documents SET content = '{"identification": "Ana", "old": 1}';"""
+    )
+    db_connection.execute(
+        """UPDATE monthly_invoices SET appointment_data = '{"free_sessions": 1}';"""
+    )
+
+    (read,) = documents.get_all_for_patient_id(
+        db_connection, document.patient_id, trusted=True
+    )
+    assert read == document
+    assert "old" not in read.content.__dict__
+    (read_invoice,) = monthly_invoice.get_existing_invoices_in_period(
+        db_connection, 6, 2025, trusted=True
+    )
+    assert read_invoice.appointment_data == AppointmentData(free_sessions=1)
+    logger.info("SUCCESS: Trusted reads validated the stored JSON")
+
+
+def test_get_changed_since_returns_delta(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that only rows written or deleted after a version are returned."""
+    logger.info("TEST-RUN: test_get_changed_since_returns_delta")
+    first = Patient(info=PatientInfo(name="First"))
+    second = Patient(info=PatientInfo(name="Second"))
+    patient.insert_many(db_connection, [first, second])
+    baseline = patient.get_changed_since(db_connection, 0)
+    assert {p.id for p in baseline.changed} == {first.id, second.id}
+    timestamps_sql = "SELECT created_at, updated_at FROM patients WHERE id = ?;"
+    (inserted_at, _) = db_connection.execute(timestamps_sql, (first.id,)).fetchone()  # type: ignore
+
+    first.info.name = "First renamed"
+    patient.insert(db_connection, first)
+    appt = Appointment(
+        patient_id=second.id,
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14, 30),
+    )
+    appointment.insert(db_connection, appt)
+    appointment_version = appointment.get_changed_since(db_connection, 0).version
+    appointment.remove(db_connection, appt.id)
+
+    delta = patient.get_changed_since(db_connection, baseline.version)
+    assert [p.info.name for p in delta.changed] == ["First renamed"]
+    assert delta.deleted == []
+    assert delta.version > baseline.version
+    removed = appointment.get_changed_since(db_connection, appointment_version)
+    assert (removed.changed, removed.deleted) == ([], [appt.id])
+    assert patient.get_changed_since(db_connection, delta.version).changed == []
+
+    created_at, updated_at = db_connection.execute(
+        timestamps_sql, (first.id,)
+    ).fetchone()  # type: ignore
+    assert created_at == inserted_at
+    assert updated_at >= created_at
+    logger.info("SUCCESS: Changed-since returned only the delta")
+
+
+def test_changed_since_holds_back_uncommitted_versions(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a version committed after a later one is not skipped."""
+    logger.info("TEST-RUN: test_changed_since_holds_back_uncommitted_versions")
+    slow, fast = db_connection.cursor(), db_connection.cursor()
+    first, second = (
+        Appointment(
+            patient_id=uuid4(),
+            appointment_date=date(2025, 6, day),
+            appointment_time=time(9, 0),
+        )
+        for day in (2, 3)
+    )
+
+    with transaction(slow):
+        appointment.insert(slow, first)
+        appointment.insert(fast, second)
+        assert first.row_version < second.row_version  # type: ignore
+        delta = appointment.get_changed_since(db_connection, 0)
+        assert [a.id for a in delta.changed] == [second.id]
+        assert delta.version < first.row_version  # type: ignore
+
+    # The held-back version brings the late commit, and the later row again.
+    delta = appointment.get_changed_since(db_connection, delta.version)
+    assert [a.id for a in delta.changed] == [first.id, second.id]
+    assert delta.version == second.row_version
+    slow.close()
+    fast.close()
+    logger.info("SUCCESS: The late commit was reported after the earlier read")
+
+
+def test_mapper_follows_the_column_layout_of_each_connection(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that one mapper decodes databases whose columns are in another order."""
+    logger.info("TEST-RUN: test_mapper_follows_the_column_layout_of_each_connection")
+    appt = Appointment(
+        patient_id=uuid4(),
+        appointment_date=date(2025, 6, 12),
+        appointment_time=time(14, 30),
+        notes="online",
+    )
+    appointment.insert(db_connection, appt)
+    assert appointment.get_by_id(db_connection, appt.id) == appt
+
+    # Same table with the columns reordered, e.g. a file on another schema.
+    other = duckdb.connect()
+    other.register(
+        "source", db_connection.execute("SELECT * FROM appointments;").arrow()
+    )
+    other.execute(
+        "CREATE TABLE appointments AS SELECT notes, status, duration, "
+        "appointment_time, appointment_date, is_free_of_charge, patient_id, "
+        "row_version, id FROM source;"
+    )
+    rows = other.execute("SELECT * FROM appointments;").fetchall()
+    assert appointment.APPOINTMENT_MAPPER.many(other, rows) == [appt]
+    other.close()
+    logger.info("SUCCESS: Rows were decoded by their own column layout")
@@ -0,0 +1,68 @@
+import logging
+from pathlib import Path
+
+from data import monthly_invoice, patient
+from data.models.invoice_models import MonthlyInvoice, MonthlyInvoiceStatus
+from data.models.patient_models import Patient, PatientInfo
+from data.shard_router import ShardRouter
+
+
+def test_shard_router_isolates_users_and_evicts_idle_shards(
+    tmp_path: Path, logger: logging.Logger
+) -> None:
+    """Tests that each user gets their own file and idle shards are detached."""
+    logger.info("TEST-RUN: test_shard_router_isolates_users_and_evicts_idle_shards")
+    router = ShardRouter(str(tmp_path / "shards"), max_open_shards=1)
+
+    for email in ("Ana@clinic.com", "bruno@clinic.com"):
+        with router.lease(email) as shard, shard.pool.cursor() as cursor:
+            patient.insert(cursor, Patient(info=PatientInfo(name=email)))
+
+    assert router.known_users() == ["ana@clinic.com", "bruno@clinic.com"]
+    assert router.stats().open_shards == 1
+    with router.lease("ana@clinic.com") as shard, shard.pool.cursor() as cursor:
+        assert [p.info.name for p in patient.get_all(cursor)] == ["Ana@clinic.com"]
+
+    stats = router.stats()
+    assert (stats.opens, stats.evictions) == (3, 2)
+    router.close()
+    logger.info("SUCCESS: Users were routed to separate shards")
+
+
+def test_shard_router_aggregates_revenue_across_shards(
+    tmp_path: Path, logger: logging.Logger
+) -> None:
+    """Tests that a clinic-wide revenue query sees every shard at once."""
+    logger.info("TEST-RUN: test_shard_router_aggregates_revenue_across_shards")
+    router = ShardRouter(
+        str(tmp_path / "shards"),
+        default_path=str(tmp_path / "default.db"),
+        max_open_shards=2,
+    )
+    for email, status in (
+        ("ana@clinic.com", MonthlyInvoiceStatus.PAID),
+        ("bruno@clinic.com", MonthlyInvoiceStatus.PENDING),
+    ):
+        with router.lease(email) as shard, shard.pool.cursor() as cursor:
+            monthly_invoice.insert(
+                cursor,
+                MonthlyInvoice(
+                    patient_id=Patient(info=PatientInfo(name=email)).id,
+                    invoice_month=3,
+                    invoice_year=2025,
+                    payment_status=status,
+                    total=46000,
+                ),
+            )
+
+    with router.attach_all() as (connection, catalogs):
+        assert set(catalogs) == {None, "ana@clinic.com", "bruno@clinic.com"}
+        revenue = monthly_invoice.get_clinic_revenue(connection, catalogs, 2025)
+
+    assert [(r.user_email, r.invoiced, r.paid) for r in revenue] == [
+        ("ana@clinic.com", 46000, 46000),
+        ("bruno@clinic.com", 46000, 0),
+    ]
+    assert router.stats().open_shards == 2
+    router.close()
+    logger.info("SUCCESS: Revenue was aggregated across shards")
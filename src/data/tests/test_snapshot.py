@@ -0,0 +1,81 @@
+import logging
+from pathlib import Path
+from uuid import uuid4
+
+import duckdb
+import pytest
+
+from data import monthly_invoice
+from data.models.invoice_models import MonthlyInvoice, MonthlyInvoiceStatus
+from data.snapshot import AnalyticsSnapshot
+
+
+def _invoice(status: MonthlyInvoiceStatus, total: int) -> MonthlyInvoice:
+    return MonthlyInvoice(
+        patient_id=uuid4(),
+        invoice_month=4,
+        invoice_year=2025,
+        payment_status=status,
+        total=total,
+    )
+
+
+def test_snapshot_serves_read_only_summaries(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    tmp_path: Path,
+) -> None:
+    """Tests that reports read a read-only copy that only changes on refresh."""
+    logger.info("TEST-RUN: test_snapshot_serves_read_only_summaries")
+    monthly_invoice.insert(db_connection, _invoice(MonthlyInvoiceStatus.PAID, 1000))
+    monthly_invoice.insert(db_connection, _invoice(MonthlyInvoiceStatus.OVERDUE, 500))
+    snapshot = AnalyticsSnapshot(
+        db_connection.cursor, str(tmp_path), "test", max_staleness=3600
+    )
+
+    with snapshot.cursor() as cursor:
+        summary = monthly_invoice.get_period_summary(cursor, 4, 2025)
+        with pytest.raises(duckdb.Error):
+            cursor.execute("DELETE FROM monthly_invoices;")
+    assert (summary.invoice_count, summary.invoiced, summary.paid) == (2, 1500, 1000)
+    assert summary.outstanding == 500
+
+    monthly_invoice.insert(db_connection, _invoice(MonthlyInvoiceStatus.PAID, 200))
+    with snapshot.cursor() as cursor:
+        assert monthly_invoice.get_period_summary(cursor, 4, 2025).invoice_count == 2
+    snapshot.refresh()
+    with snapshot.cursor() as cursor:
+        assert monthly_invoice.get_period_summary(cursor, 4, 2025).paid == 1200
+
+    assert snapshot.stats().refreshes == 2
+    snapshot.close()
+    assert list(tmp_path.iterdir()) == []
+    logger.info("SUCCESS: Snapshot served stable read-only summaries")
+
+
+def test_snapshot_refreshes_in_the_background(
+    db_connection: duckdb.DuckDBPyConnection,
+    logger: logging.Logger,
+    tmp_path: Path,
+) -> None:
+    """Tests that a stale copy keeps serving reports while a new one is taken."""
+    logger.info("TEST-RUN: test_snapshot_refreshes_in_the_background")
+    monthly_invoice.insert(db_connection, _invoice(MonthlyInvoiceStatus.PAID, 1000))
+    snapshot = AnalyticsSnapshot(
+        db_connection.cursor, str(tmp_path), "test", max_staleness=0
+    )
+    with snapshot.cursor() as cursor:
+        assert monthly_invoice.get_period_summary(cursor, 4, 2025).paid == 1000
+
+    monthly_invoice.insert(db_connection, _invoice(MonthlyInvoiceStatus.PAID, 200))
+    with snapshot.cursor() as cursor:
+        # Served from the previous copy; the refresh runs on another thread.
+        assert monthly_invoice.get_period_summary(cursor, 4, 2025).paid == 1000
+    snapshot.wait_for_refresh()
+    with snapshot.cursor() as cursor:
+        assert monthly_invoice.get_period_summary(cursor, 4, 2025).paid == 1200
+
+    assert snapshot.stats().refreshes == 2
+    snapshot.close()
+    assert list(tmp_path.iterdir()) == []
+    logger.info("SUCCESS: Snapshot was refreshed without blocking readers")
@@ -0,0 +1,136 @@
+import logging
+
+import duckdb
+import pytest
+
+from data import patient
+from data.models.patient_models import Patient, PatientInfo, PatientStatus
+from data.write_behind import WriteBehindClosedError, WriteBehindQueue
+
+
+def _patient(name: str) -> Patient:
+    return Patient(info=PatientInfo(name=name), status=PatientStatus.ACTIVE)
+
+
+def test_write_behind_group_commits_and_flushes(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that queued writes are committed together and visible after a flush."""
+    logger.info("TEST-RUN: test_write_behind_group_commits_and_flushes")
+    queue = WriteBehindQueue(db_connection, max_delay=0.2)
+    patients = [_patient(f"Patient {i}") for i in range(10)]
+
+    for p in patients:
+        queue.submit("patients", patient.patient_field_map(p), p, session_id="a")
+
+    assert queue.flush(timeout=5)
+    assert {p.id for p in patient.get_all(db_connection)} == {p.id for p in patients}
+    stats = queue.stats()
+    assert stats.committed == 10
+    assert stats.batches < 10
+    assert stats.pending == 0
+    queue.close()
+    logger.info("SUCCESS: Writes were group-committed")
+
+
+def test_write_behind_read_your_writes(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that only the issuing session sees its uncommitted writes."""
+    logger.info("TEST-RUN: test_write_behind_read_your_writes")
+    queue = WriteBehindQueue(db_connection, max_delay=5)
+    existing = _patient("Existing")
+    patient.insert(db_connection, existing)
+    renamed = existing.model_copy(deep=True)
+    renamed.info.name = "Renamed"
+
+    queue.submit("patients", patient.patient_field_map(renamed), renamed, "a")
+
+    committed = patient.get_all(db_connection)
+    assert [p.info.name for p in committed] == ["Existing"]
+    assert [p.info.name for p in queue.overlay("patients", "a", committed)] == [
+        "Renamed"
+    ]
+    assert queue.overlay("patients", "b", committed) == committed
+    queue.close()
+    logger.info("SUCCESS: Pending writes were only visible to their session")
+
+
+def test_write_behind_drains_on_close(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that closing the queue commits pending writes and rejects new ones."""
+    logger.info("TEST-RUN: test_write_behind_drains_on_close")
+    queue = WriteBehindQueue(db_connection, max_delay=5)
+    p = _patient("Pending")
+    queue.submit("patients", patient.patient_field_map(p), p)
+
+    queue.close()
+
+    assert patient.get_by_id(db_connection, p.id).info.name == "Pending"
+    with pytest.raises(WriteBehindClosedError):
+        queue.submit("patients", patient.patient_field_map(p), p)
+    logger.info("SUCCESS: Pending writes survived shutdown")
+
+
+def test_write_behind_reports_conflicts(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that a queued save of a stale copy is refused and reported."""
+    logger.info("TEST-RUN: test_write_behind_reports_conflicts")
+    queue = WriteBehindQueue(db_connection, max_delay=0.01)
+    p = _patient("Shared")
+    patient.insert(db_connection, p)
+    stale = p.model_copy(deep=True)
+    p.info.name = "Saved elsewhere"
+    assert patient.save(db_connection, p).applied
+
+    stale.info.name = "Stale"
+    queue.submit(
+        "patients",
+        patient.patient_field_map(stale),
+        stale,
+        "a",
+        expected_version=stale.row_version,
+    )
+    assert queue.flush(timeout=5)
+
+    conflicts = queue.take_conflicts("a")
+    assert [(c.key, c.current_version) for c in conflicts] == [(p.id, p.row_version)]
+    assert queue.take_conflicts("a") == []
+    assert patient.get_by_id(db_connection, p.id).info.name == "Saved elsewhere"
+    assert queue.stats().conflicts == 1
+    queue.close()
+    logger.info("SUCCESS: Conflicting queued write was reported")
+
+
+def test_write_behind_drops_failing_write_and_keeps_going(
+    db_connection: duckdb.DuckDBPyConnection, logger: logging.Logger
+) -> None:
+    """Tests that an invalid queued write is reported while its batch commits."""
+    logger.info("TEST-RUN: test_write_behind_drops_failing_write_and_keeps_going")
+    queue = WriteBehindQueue(db_connection, max_delay=0.2)
+    good, bad = _patient("Good"), _patient("Bad")
+    invalid = {**patient.patient_field_map(bad), "status": "unknown"}
+
+    queue.submit("patients", patient.patient_field_map(good), good, "a")
+    queue.submit("patients", invalid, bad, "a")
+
+    assert queue.flush(timeout=5)
+    assert [p.id for p in patient.get_all(db_connection)] == [good.id]
+    stats = queue.stats()
+    assert (stats.committed, stats.failed, stats.pending) == (1, 1, 0)
+    (failure,) = queue.take_failures("a")
+    assert (failure.table, failure.key, failure.model) == ("patients", bad.id, bad)
+    assert queue.take_failures("a") == []
+    # The writer reports new versions instead of touching the session's model.
+    committed_version = patient.get_by_id(db_connection, good.id).row_version
+    assert queue.written_version("patients", good.id, "a") == committed_version
+    assert good.row_version != committed_version
+
+    later = _patient("Later")
+    queue.submit("patients", patient.patient_field_map(later), later, "a")
+    assert queue.flush(timeout=5)
+    assert patient.get_by_id(db_connection, later.id).info.name == "Later"
+    queue.close()
+    logger.info("SUCCESS: The failing write was dropped and the queue kept running")
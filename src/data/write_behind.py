@@ -0,0 +1,421 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import duckdb
+import logfire
+from pydantic import BaseModel
+
+from data.db_utils import WriteOutcome, transaction, update_row, upsert_rows
+
+logfire.configure()
+
+# Per (table, key, session), the last version each session wrote is kept so
+# that its follow-up edits are checked against it rather than against the
+# version it originally read.
+WRITTEN_VERSIONS_SIZE: int = 1024
+
+
+class WriteBehindClosedError(RuntimeError):
+    """Raised when a write is submitted after the queue has been closed."""
+
+
+@dataclass(frozen=True)
+class PendingWrite:
+    """A model write waiting for the writer thread."""
+
+    sequence: int
+    table: str
+    key: Any
+    field_map: dict[str, Any]
+    model: BaseModel
+    session_id: Optional[str]
+    # When set, the write only applies if the row is still at this version.
+    expected_version: Optional[int] = None
+    # A patch only writes the columns in `field_map`.
+    patch: bool = False
+
+    @property
+    def checked(self) -> bool:
+        return self.expected_version is not None or self.patch
+
+
+@dataclass(frozen=True)
+class WriteConflict:
+    """A queued write that was refused because the row changed meanwhile."""
+
+    table: str
+    key: Any
+    model: BaseModel
+    expected_version: Optional[int]
+    current_version: Optional[int]
+
+
+@dataclass(frozen=True)
+class WriteFailure:
+    """A queued write that could not be committed, e.g. one the table refused."""
+
+    table: str
+    key: Any
+    model: BaseModel
+    error: str
+
+
+# (table, key, session) of a written row.
+VersionSlot = tuple[str, Any, Optional[str]]
+
+
+@dataclass
+class WriteBehindStats:
+    """Snapshot of the write-behind queue counters."""
+
+    submitted: int = 0
+    committed: int = 0
+    conflicts: int = 0
+    failed: int = 0
+    batches: int = 0
+    pending: int = 0
+    max_batch_size: int = 0
+
+
+class WriteBehindQueue:
+    """
+    Defers model upserts to a background writer thread.
+
+    `submit` only appends to an in-memory queue and returns; the writer drains
+    whatever has accumulated and group-commits it in one transaction through
+    `upsert_rows`, so a burst of saves pays a single commit. Until a write is
+    committed, the session that issued it can read it back with `pending` and
+    `overlay`, and anyone can wait for it with `flush` (a barrier on every
+    write submitted so far) or `wait_for_session`.
+
+    Writes submitted with an `expected_version` (or as patches) are applied
+    with `update_row`; those refused because the row changed meanwhile are
+    kept for the session to collect with `take_conflicts`, and writes that
+    fail are kept for `take_failures`. Submitted models belong to the session
+    and are never modified by the writer: the new `row_version` of a row is
+    available from `written_version`, and the session's follow-up edits are
+    checked against it.
+
+    Writes are only durable once committed: `close` drains the queue before
+    stopping the writer, so a clean shutdown does not lose acknowledged saves.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): The parent connection; the
+            writer works on its own cursor.
+        max_batch_size (int): Upper bound of writes committed together.
+        max_delay (float): Seconds the writer waits for more writes to join a
+            batch once the first one has arrived.
+        cursor_factory (Optional[Callable[[], duckdb.DuckDBPyConnection]]):
+            Opens the writer's cursor; defaults to `connection.cursor`.
+    """
+
+    def __init__(
+        self,
+        connection: duckdb.DuckDBPyConnection,
+        max_batch_size: int = 500,
+        max_delay: float = 0.01,
+        cursor_factory: Optional[Callable[[], duckdb.DuckDBPyConnection]] = None,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("The write-behind batch size must be at least 1.")
+        self._cursor = (cursor_factory or connection.cursor)()
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._queue: list[PendingWrite] = []
+        self._in_flight: list[PendingWrite] = []
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._done_sequence = 0
+        self._closed = False
+        self._stats = WriteBehindStats()
+        self._conflicts: dict[Optional[str], list[WriteConflict]] = {}
+        self._failures: dict[Optional[str], list[WriteFailure]] = {}
+        self._written_versions: OrderedDict[VersionSlot, int] = OrderedDict()
+        self._writer = threading.Thread(
+            target=self._run, name="write-behind", daemon=True
+        )
+        self._writer.start()
+
+    def submit(
+        self,
+        table: str,
+        field_map: dict[str, Any],
+        model: BaseModel,
+        session_id: Optional[str] = None,
+        key: str = "id",
+        expected_version: Optional[int] = None,
+        patch: bool = False,
+    ) -> int:
+        """
+        Queues an upsert of `field_map` into `table`; with `expected_version`
+        or `patch`, a version-checked update of the `field_map` columns instead.
+
+        Returns:
+            int: The sequence number of the write, usable with `flush`.
+        """
+        with self._condition:
+            if self._closed:
+                raise WriteBehindClosedError("The write-behind queue is closed.")
+            self._sequence += 1
+            self._queue.append(
+                PendingWrite(
+                    self._sequence,
+                    table,
+                    field_map[key],
+                    field_map,
+                    model,
+                    session_id,
+                    expected_version,
+                    patch,
+                )
+            )
+            self._stats.submitted += 1
+            self._condition.notify_all()
+            return self._sequence
+
+    def pending(self, table: str, session_id: Optional[str]) -> dict[Any, BaseModel]:
+        """Returns the session's uncommitted models for `table`, newest per key."""
+        with self._condition:
+            return {
+                write.key: write.model
+                for write in (*self._in_flight, *self._queue)
+                if write.table == table and write.session_id == session_id
+            }
+
+    def overlay(
+        self,
+        table: str,
+        session_id: Optional[str],
+        models: list[Any],
+        where: Optional[Callable[[Any], bool]] = None,
+    ) -> list[Any]:
+        """
+        Applies the session's uncommitted writes on top of rows read from the
+        database: pending models replace their committed version and new ones
+        are appended. `where` re-applies the read's filter to pending models.
+        """
+        pending = self.pending(table, session_id)
+        if not pending:
+            return models
+        merged = [pending.pop(model.id, model) for model in models]
+        merged += pending.values()
+        return [model for model in merged if where(model)] if where else merged
+
+    def take_conflicts(self, session_id: Optional[str]) -> list[WriteConflict]:
+        """Returns and forgets the session's refused writes."""
+        with self._condition:
+            return self._conflicts.pop(session_id, [])
+
+    def take_failures(self, session_id: Optional[str]) -> list[WriteFailure]:
+        """Returns and forgets the session's writes that could not be committed."""
+        with self._condition:
+            return self._failures.pop(session_id, [])
+
+    def written_version(
+        self, table: str, key: Any, session_id: Optional[str]
+    ) -> Optional[int]:
+        """Returns the `row_version` of the session's last committed write of a row."""
+        with self._condition:
+            return self._written_versions.get((table, key, session_id))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every write submitted before the call has been processed.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        with self._condition:
+            return self._wait_until(self._sequence, timeout)
+
+    def wait_for_session(
+        self, session_id: Optional[str], timeout: Optional[float] = None
+    ) -> bool:
+        """Like `flush`, but only waits when the session has pending writes."""
+        with self._condition:
+            own = [
+                write.sequence
+                for write in (*self._in_flight, *self._queue)
+                if write.session_id == session_id
+            ]
+            return self._wait_until(max(own), timeout) if own else True
+
+    def _wait_until(self, sequence: int, timeout: Optional[float]) -> bool:
+        return self._condition.wait_for(
+            lambda: self._done_sequence >= sequence, timeout
+        )
+
+    def stats(self) -> WriteBehindStats:
+        with self._condition:
+            return WriteBehindStats(
+                submitted=self._stats.submitted,
+                committed=self._stats.committed,
+                conflicts=self._stats.conflicts,
+                failed=self._stats.failed,
+                batches=self._stats.batches,
+                pending=len(self._queue) + len(self._in_flight),
+                max_batch_size=self._stats.max_batch_size,
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stops accepting writes, commits everything queued and stops the writer."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logfire.error(
+                "APP-LOGIC: Write-behind writer did not drain before the timeout."
+            )
+            return
+        self._cursor.close()
+
+    def _take_batch(self) -> list[PendingWrite]:
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or self._closed)
+            if not self._queue:
+                return []
+            if not self._closed and len(self._queue) < self._max_batch_size:
+                # Give concurrent saves a moment to join the same commit.
+                deadline = time.monotonic() + self._max_delay
+                while len(self._queue) < self._max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        break
+            batch = self._queue[: self._max_batch_size]
+            del self._queue[: self._max_batch_size]
+            self._in_flight = batch
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                committed, conflicts, failures = self._commit(batch)
+            except Exception as error:
+                # The writer must outlive any batch, or flushes hang forever.
+                logfire.error(
+                    f"APP-LOGIC: Dropping a write-behind batch of {len(batch)} writes.",
+                    exc_info=True,
+                )
+                committed, conflicts = 0, []
+                failures = [_failure(write, error) for write in batch]
+            with self._condition:
+                self._in_flight = []
+                self._done_sequence = batch[-1].sequence
+                self._stats.committed += committed
+                self._stats.conflicts += len(conflicts)
+                self._stats.failed += len(failures)
+                for conflict, session_id in conflicts:
+                    self._conflicts.setdefault(session_id, []).append(conflict)
+                for failure, session_id in failures:
+                    self._failures.setdefault(session_id, []).append(failure)
+                self._stats.batches += 1
+                self._stats.max_batch_size = max(self._stats.max_batch_size, len(batch))
+                self._condition.notify_all()
+
+    def _commit(
+        self, batch: list[PendingWrite]
+    ) -> tuple[
+        int,
+        list[tuple[WriteConflict, Optional[str]]],
+        list[tuple[WriteFailure, Optional[str]]],
+    ]:
+        try:
+            conflicts = self._write(batch)
+            return len(batch) - len(conflicts), conflicts, []
+        except Exception:
+            logfire.warning(
+                f"APP-LOGIC: Group commit of {len(batch)} writes failed; retrying one by one.",
+                exc_info=True,
+            )
+        committed = 0
+        conflicts = []
+        failures = []
+        for write in batch:
+            try:
+                refused = self._write([write])
+                conflicts += refused
+                committed += not refused
+            except Exception as error:
+                failures.append(_failure(write, error))
+                logfire.error(
+                    f"APP-LOGIC: Failed write-behind write to {write.table} (key {write.key}).",
+                    exc_info=True,
+                )
+        return committed, conflicts, failures
+
+    def _expected_version(
+        self, write: PendingWrite, written: dict[VersionSlot, int]
+    ) -> Optional[int]:
+        if write.expected_version is None:
+            return None
+        slot = (write.table, write.key, write.session_id)
+        latest = written.get(slot) or self.written_version(*slot)
+        return max(write.expected_version, latest or 0)
+
+    def _write(
+        self, batch: list[PendingWrite]
+    ) -> list[tuple[WriteConflict, Optional[str]]]:
+        by_table: dict[str, list[PendingWrite]] = {}
+        for write in batch:
+            if not write.checked:
+                by_table.setdefault(write.table, []).append(write)
+
+        written: dict[VersionSlot, int] = {}
+        conflicts: list[tuple[WriteConflict, Optional[str]]] = []
+        with transaction(self._cursor):
+            for table, writes in by_table.items():
+                table_versions = upsert_rows(
+                    self._cursor, table, [write.field_map for write in writes]
+                )
+                for write in writes:
+                    if write.key in table_versions:
+                        slot = (write.table, write.key, write.session_id)
+                        written[slot] = table_versions[write.key]
+            for write in batch:
+                if not write.checked:
+                    continue
+                expected = self._expected_version(write, written)
+                changes = {k: v for k, v in write.field_map.items() if k != "id"}
+                result = update_row(
+                    self._cursor, write.table, changes, write.key, expected
+                )
+                if result.outcome == WriteOutcome.APPLIED:
+                    written[(write.table, write.key, write.session_id)] = (
+                        result.row_version  # type: ignore
+                    )
+                else:
+                    conflict = WriteConflict(
+                        write.table,
+                        write.key,
+                        write.model,
+                        expected,
+                        result.row_version,
+                    )
+                    conflicts.append((conflict, write.session_id))
+
+        # Only committed versions are recorded, so a retried write is checked
+        # against what is actually in the database.
+        with self._condition:
+            for slot, version in written.items():
+                self._written_versions[slot] = version
+                self._written_versions.move_to_end(slot)
+            while len(self._written_versions) > WRITTEN_VERSIONS_SIZE:
+                self._written_versions.popitem(last=False)
+        logfire.info(f"APP-LOGIC: Group-committed {len(batch)} write-behind writes.")
+        return conflicts
+
+
+def _failure(
+    write: PendingWrite, error: Exception
+) -> tuple[WriteFailure, Optional[str]]:
+    failure = WriteFailure(write.table, write.key, write.model, str(error))
+    return failure, write.session_id
@@ -0,0 +1,44 @@
+import logfire
+
+from data import database
+from data.remote import DatabaseServer, parse_address
+from data.shard_router import ShardRouter
+from service.database_manager import (
+    DATABASE_SERVER_ADDRESS,
+    MAX_OPEN_SHARDS,
+    POOL_CHECKOUT_TIMEOUT_SECONDS,
+    POOL_SIZE,
+    SHARDS_DIRECTORY,
+    server_authkey,
+)
+
+logfire.configure()
+
+
+def main():
+    """
+    Runs the database server that app processes started with
+    PSICOLOGIA_DB_BACKEND=remote connect to.
+    """
+    logfire.info("APP-STARTUP: Starting the database server")
+    authkey = server_authkey()
+    router = ShardRouter(
+        SHARDS_DIRECTORY,
+        default_path=database.DB_PATH,
+        max_open_shards=MAX_OPEN_SHARDS,
+        pool_size=POOL_SIZE,
+        checkout_timeout=POOL_CHECKOUT_TIMEOUT_SECONDS,
+        maintenance=True,
+    )
+    server = DatabaseServer(router, parse_address(DATABASE_SERVER_ADDRESS), authkey)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logfire.info("APP-STARTUP: Stopping the database server")
+    finally:
+        server.close()
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
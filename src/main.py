@@ -25,12 +25,12 @@ def main():
     #         st.login("google")
 
     # else:
+    logfire.info("APP-STARTUP: Initializing database")
+    initialize_database()
+
     logfire.info("APP-STARTUP: Rendering navbar and homepage")
     navbar.render()
     homepage.render()
-
-    logfire.info("APP-STARTUP: Initializing database")
-    initialize_database()
     logfire.info("APP-STARTUP: Application initialization complete")
 
     # mock.insert_patients()
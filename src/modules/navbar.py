@@ -1,5 +1,13 @@
 import streamlit as st
 
+from service.database_manager import take_write_conflicts, take_write_failures
+
+CONFLICT_TABLES_PT: dict[str, str] = {
+    "patients": "do paciente",
+    "appointments": "da sessão",
+    "monthly_invoices": "da fatura",
+}
+
 
 def render() -> None:
     st.logo(
@@ -35,5 +43,21 @@ def render() -> None:
         #     "pages/settings_page.py", label="Configurações", icon=":material/settings:"
         # )
 
+    # Queued saves are checked after the page moved on; report the refused and
+    # failed ones.
+    for conflict in take_write_conflicts():
+        st.warning(
+            f"As alterações {CONFLICT_TABLES_PT.get(conflict.table, '')} não foram "
+            "salvas porque o registro foi modificado em outra sessão. "
+            "Recarregue e tente novamente.",
+            icon=":material/sync_problem:",
+        )
+    for failure in take_write_failures():
+        st.error(
+            f"As alterações {CONFLICT_TABLES_PT.get(failure.table, '')} não foram "
+            "salvas devido a um erro. Tente novamente.",
+            icon=":material/error:",
+        )
+
 
 # !FIXME when documents are open, the patients page in the sidebar does not clean the URL
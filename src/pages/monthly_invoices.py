@@ -5,6 +5,7 @@ import logfire
 import numpy as np
 import streamlit as st
 
+from data.db_utils import WriteOutcome
 from data.models.invoice_models import (
     MONTHLY_INVOICE_STATUS_PT,
     MonthlyInvoice,
@@ -16,7 +17,12 @@ from data.models.patient_models import (
     PatientStatus,
 )
 from modules import navbar
-from service.monthly_invoice_manager import get_monthly_invoices, update_invoice_on_db
+from service.monthly_invoice_manager import (
+    get_invoice_period_summary,
+    get_monthly_invoices,
+    is_period_archived,
+    update_invoice_on_db,
+)
 from service.patient_manager import get_patient_by_id
 from utils.monthly_invoice_computations import (
     get_formatted_price,
@@ -32,6 +38,7 @@ def _invoice_modal(patient_: Patient, month_invoice: MonthlyInvoice) -> None:
     logfire.info(
         f"USER-ACTION: Opening invoice edit modal for patient {patient_.info.name} (ID: {patient_.id})"
     )
+    original = month_invoice.model_copy(deep=True)
     with st.form("invoice_form", border=False):
         st.markdown(f"**{patient_.info.name}**")
 
@@ -124,13 +131,22 @@ def _invoice_modal(patient_: Patient, month_invoice: MonthlyInvoice) -> None:
             )
         submitted = st.form_submit_button("Salvar", icon=":material/save:")
         if submitted:
-            update_invoice_on_db(month_invoice)
-            st.rerun()
+            if (
+                update_invoice_on_db(month_invoice, original).outcome
+                is WriteOutcome.CONFLICT
+            ):
+                st.error(
+                    "Este registro foi modificado em outra sessão. "
+                    "Recarregue a página e tente novamente."
+                )
+            else:
+                st.rerun()
 
 
 def _display_invoice_metrics(
     month_invoice: MonthlyInvoice,
     patient_: Patient,
+    read_only: bool = False,
 ) -> None:
     month_invoice.total = get_total(
         month_invoice.sessions_completed,
@@ -244,10 +260,26 @@ def _display_invoice_metrics(
                 )
                 st.markdown(f"**nº recibo**: {month_invoice.nf_number}")
     with col_edit:
-        if st.button("", key=f"edit_{patient_.id}", icon=":material/edit:"):
+        if st.button(
+            "",
+            key=f"edit_{patient_.id}",
+            icon=":material/edit:",
+            disabled=read_only,
+        ):
             _invoice_modal(patient_, month_invoice)
 
 
+def _display_period_summary(month: int, year: int) -> None:
+    summary = get_invoice_period_summary(month, year)
+    cols = st.columns(4)
+    cols[0].metric("Faturas", summary.invoice_count)
+    cols[1].metric("Faturado", get_formatted_price(summary.invoiced))
+    cols[2].metric("Recebido", get_formatted_price(summary.paid))
+    cols[3].metric("Em aberto", get_formatted_price(summary.outstanding))
+    st.caption("Totais de relatório, atualizados a cada poucos segundos.")
+    st.divider()
+
+
 def render() -> None:
     logfire.info("PAGE-RENDER: Rendering monthly invoices page")
     st.set_page_config(
@@ -315,6 +347,7 @@ def render() -> None:
         monthly_invoices: list[MonthlyInvoice] = get_monthly_invoices(
             chosen_month, chosen_year
         )
+        archived = is_period_archived(chosen_month, chosen_year)
         if not monthly_invoices:
             logfire.info(
                 f"DATA-FETCH: No invoices found for {chosen_month}/{chosen_year}"
@@ -324,6 +357,9 @@ def render() -> None:
             logfire.info(
                 f"DATA-FETCH: Found {len(monthly_invoices)} invoices for {chosen_month}/{chosen_year}"
             )
+            _display_period_summary(chosen_month, chosen_year)
+            if archived:
+                st.caption("Mês arquivado: as faturas não podem mais ser editadas.")
             # Sort monthly invoices by patient name in alphabetical order
             monthly_invoices.sort(
                 key=lambda invoice: get_patient_by_id(invoice.patient_id).info.name
@@ -331,7 +367,7 @@ def render() -> None:
 
         for month_invoice in monthly_invoices:
             patient_: Patient = get_patient_by_id(month_invoice.patient_id)
-            _display_invoice_metrics(month_invoice, patient_)
+            _display_invoice_metrics(month_invoice, patient_, read_only=archived)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ from typing import Optional
 import logfire
 import streamlit as st
 
+from data.db_utils import WriteOutcome
 from data.models.patient_models import (
     PATIENT_STATUS_PT,
     PATIENT_STATUS_PT_SINGULAR,
@@ -12,9 +13,17 @@ from data.models.patient_models import (
     Patient,
     PatientGender,
     PatientInfo,
+    PatientPage,
     PatientStatus,
 )
-from service.patient_manager import get_all_patients, update_patient_on_db
+from service.patient_manager import (
+    get_patient_counts,
+    get_patients_page,
+    get_patients_sequence,
+    patients_changed_since,
+    search_patients,
+    update_patient_on_db,
+)
 
 logfire.configure()
 
@@ -100,9 +109,9 @@ def _patient_modal(patient_: Optional[Patient] = None) -> None:
                 patient_.child.class_time = st.pills(
                     "Turno",
                     options=list(ClassTime),
-                    format_func=lambda x: "Manhã"
-                    if x == ClassTime.MORNING
-                    else "Tarde",
+                    format_func=lambda x: (
+                        "Manhã" if x == ClassTime.MORNING else "Tarde"
+                    ),
                     default=patient_.child.class_time
                     if patient_.child.class_time
                     else ClassTime.MORNING,
@@ -137,8 +146,13 @@ def _patient_modal(patient_: Optional[Patient] = None) -> None:
 
         submitted = st.form_submit_button("Salvar alterações")
         if submitted:
-            update_patient_on_db(patient_)
-            st.session_state["all_patients"] = get_all_patients()
+            if update_patient_on_db(patient_).outcome is WriteOutcome.CONFLICT:
+                st.error(
+                    "Este registro foi modificado em outra sessão. "
+                    "Recarregue a página e tente novamente."
+                )
+                return
+            st.session_state.pop("patient_pages_sequence", None)
             st.rerun()
 
 
@@ -183,6 +197,11 @@ def _display_patient_info(patient_: Patient):
                 _patient_modal(patient_)
 
 
+def _load_more(status: PatientStatus) -> None:
+    pages: list[PatientPage] = st.session_state["patient_pages"].setdefault(status, [])
+    pages.append(get_patients_page(status, pages[-1].next_key if pages else None))
+
+
 def _display_patients():
     expanded_status: dict[PatientStatus, bool] = {
         PatientStatus.ACTIVE: True,
@@ -191,22 +210,34 @@ def _display_patients():
         PatientStatus.INACTIVE: False,
     }
 
-    all_patients = st.session_state["all_patients"]
-
-    def group_patients_by_status(status: str) -> list[Patient]:
-        return [patient for patient in all_patients if patient.status == status]
+    counts = st.session_state["patient_counts"]
+    loaded = st.session_state["patient_pages"]
 
     for status in PatientStatus:
-        patients: list[Patient] = group_patients_by_status(status)
-        with st.expander(
-            f"**Pacientes {PATIENT_STATUS_PT[status]}** ({len(patients)})",
-            expanded=expanded_status[status],
-        ):
-            if not patients:
+        # A toggle instead of an expander: only open groups fetch their rows.
+        shown = st.toggle(
+            f"**Pacientes {PATIENT_STATUS_PT[status]}** ({counts[status]})",
+            value=expanded_status[status],
+            key=f"show_patients_{status.value}",
+        )
+        if not shown:
+            continue
+        with st.container(border=True):
+            if not counts[status]:
                 st.info("Nenhum paciente encontrado com este status.")
-            else:
-                for patient_ in patients:
+                continue
+            if status not in loaded:
+                _load_more(status)
+            for page in loaded[status]:
+                for patient_ in page.patients:
                     _display_patient_info(patient_)
+            if loaded[status][-1].next_key is not None:
+                st.button(
+                    "Carregar mais",
+                    key=f"more_patients_{status.value}",
+                    on_click=_load_more,
+                    args=(status,),
+                )
 
 
 def render() -> None:
@@ -229,15 +260,30 @@ def render() -> None:
 
     st.divider()
 
-    if "all_patients" not in st.session_state:
-        logfire.info("DATA-FETCH: Loading all patients from database")
-        st.session_state["all_patients"] = get_all_patients()
-        logfire.info(
-            f"DATA-FETCH: Loaded {len(st.session_state['all_patients'])} patients"
-        )
+    sequence = st.session_state.get("patient_pages_sequence")
+    if sequence is None or patients_changed_since(sequence):
+        logfire.info("DATA-FETCH: Loading patient counts by status")
+        st.session_state["patient_pages_sequence"] = get_patients_sequence()
+        st.session_state["patient_counts"] = get_patient_counts()
+        # Pages of the open groups are fetched again when displayed.
+        st.session_state["patient_pages"] = {}
+    elif "patient_pages" not in st.session_state:
+        st.session_state["patient_pages"] = {}
 
     if st.button("Adicionar paciente", icon=":material/person_add:"):
         logfire.info("USER-ACTION: User clicked to add new patient")
         _patient_modal()
 
+    query = st.text_input(
+        "Buscar paciente",
+        placeholder="Nome, CPF/CNPJ, responsável ou escola",
+    )
+    if query.strip():
+        results = search_patients(query)
+        if not results:
+            st.info("Nenhum paciente encontrado para esta busca.")
+        for patient_ in results:
+            _display_patient_info(patient_)
+        return
+
     _display_patients()
@@ -1,19 +1,23 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import Any, Optional
 
 import logfire
 import streamlit as st
 from streamlit_calendar import calendar  # type: ignore
 
+from data.db_utils import WriteOutcome
 from data.models.appointment_models import Appointment
-from data.models.patient_models import Patient
+from data.models.patient_models import PatientSummary
 from modules import navbar
-from service.patient_manager import get_patient_by_id
 from service.schedule import (
+    CalendarView,
     get_appointment_from,
     get_calendar_events,
     get_patients,
+    is_appointment_archived,
+    shift_anchor,
     update_appointment,
+    visible_period,
 )
 
 logfire.configure()
@@ -37,17 +41,21 @@ def schedule_appointment(
         raise ValueError("selected_datetime and selected_event must be provided")
 
     patients = get_patients()
-    if not patients:
+    if not patients.items:
         st.warning("Nenhum paciente cadastrado. Cadastre um paciente primeiro.")
         return
 
-    index: int = 0  # type: ignore
-    appt = Appointment(patient_id=patients[0].id)
+    index: Optional[int] = 0
+    read_only: bool = False
+    appt = Appointment(patient_id=patients.items[0].id)
 
     if selected_event:
         appt: Appointment = get_appointment_from(selected_event)
-        patient_: Patient = get_patient_by_id(appt.patient_id)
-        index: int = patients.index(patient_)
+        # None for patients no longer active: the picker starts empty.
+        index = patients.index_of(appt.patient_id)
+        read_only = is_appointment_archived(appt)
+        if read_only:
+            st.caption("Mês arquivado: a sessão não pode mais ser editada.")
     elif selected_datetime:
         appt.appointment_date = selected_datetime.date()
         appt.appointment_time = selected_datetime.time()
@@ -55,25 +63,31 @@ def schedule_appointment(
         raise ValueError("One of selected_datetime and selected_event must be provided")
 
     with st.form("appointment_form", border=False):
-        selected_patient: Patient = st.selectbox(
+        selected_patient: Optional[PatientSummary] = st.selectbox(
             "Selecione um paciente",
-            patients,
-            format_func=lambda p: p.info.name,
+            patients.items,
+            format_func=lambda p: p.name,
             placeholder="Selecione um paciente",
             index=index,
+            disabled=read_only,
         )
 
-        appt.patient_id = selected_patient.id
+        if selected_patient is not None:
+            appt.patient_id = selected_patient.id
 
         col_1, col_2, col_3 = st.columns(3, vertical_alignment="center")
         with col_1:
             appt.appointment_date = st.date_input(
                 "Data da sessão",
                 value=appt.appointment_date,
+                disabled=read_only,
             )
         with col_2:
             appt.appointment_time = st.time_input(
-                "Horário de início", value=appt.appointment_time, step=300
+                "Horário de início",
+                value=appt.appointment_time,
+                step=300,
+                disabled=read_only,
             )
         with col_3:
             appt.duration = st.number_input(
@@ -83,13 +97,14 @@ def schedule_appointment(
                 value=appt.duration,
                 step=5,
                 format="%d",
+                disabled=read_only,
                 help="Duração da sessão em minutos: 1 sessão típica -> 45 min, 2 sessões -> 90 min, 3 sessões -> 135 min.",
             )
 
         col_1, _, col_2 = st.columns([1, 2, 2], vertical_alignment="center")
         with col_1:
             appt.is_free_of_charge = st.checkbox(
-                "É gratuita?", value=appt.is_free_of_charge
+                "É gratuita?", value=appt.is_free_of_charge, disabled=read_only
             )
         with col_2:
             translated_status: dict[str, str] = {
@@ -105,18 +120,24 @@ def schedule_appointment(
                 options=pills_options,
                 default="done",
                 format_func=lambda x: translated_status[x],
+                disabled=read_only,
                 help="Status da sessão. 'Realizada' contempla sessões que foram ou serão realizadas. 'A recuperar' contempla sessões que podem ser remarcadas. 'Cancelada' contempla sessões canceladas que não serão remarcadas.",
             )  # type: ignore
 
-        appt.notes = st.text_area("Observações", value=appt.notes)
+        appt.notes = st.text_area("Observações", value=appt.notes, disabled=read_only)
 
-        submitted = st.form_submit_button("Salvar", type="primary")
+        submitted = st.form_submit_button("Salvar", type="primary", disabled=read_only)
 
         if submitted:
             logfire.info(
                 f"USER-ACTION: User saved appointment {appt.id} for patient {appt.patient_id}"
             )
-            update_appointment(appt)
+            if update_appointment(appt).outcome is WriteOutcome.CONFLICT:
+                st.error(
+                    "Este registro foi modificado em outra sessão. "
+                    "Recarregue a página e tente novamente."
+                )
+                return
             st.toast("Alterações salvas.", icon=":material/event_available:")
             st.session_state.event = appt
             st.rerun()
@@ -125,11 +146,9 @@ def schedule_appointment(
 CALENDAR_OPTIONS: dict[str, Any] = {
     "editable": True,
     "selectable": True,
-    "headerToolbar": {
-        "left": "today prev,next",
-        "center": "title",
-        "right": "timeGridDay,timeGridWeek,dayGridMonth",
-    },
+    # Navigation happens in `render_navigation`, so the page knows which
+    # period is visible and loads only that one.
+    "headerToolbar": {"left": "", "center": "title", "right": ""},
     "slotMinTime": "08:00:00",
     "slotMaxTime": "19:30:00",
     "slotDuration": "01:00:00",
@@ -144,8 +163,21 @@ CALENDAR_OPTIONS: dict[str, Any] = {
     "locale": "pt-br",
     "timeZone": "America/Sao_Paulo",
     "weekends": False,
-    "initialView": "timeGridWeek",
+    "firstDay": 1,
+}
+CALENDAR_VIEWS: dict[CalendarView, str] = {
+    "timeGridDay": "Dia",
+    "timeGridWeek": "Semana",
+    "dayGridMonth": "Mês",
 }
+CALENDAR_CALLBACKS: list[str] = [
+    "dateClick",
+    "eventClick",
+    "eventChange",
+    "eventsSet",
+    "select",
+    "datesSet",
+]
 CUSTOM_CSS: str = """
     .fc-event-past {
         opacity: 0.8;
@@ -162,6 +194,76 @@ CUSTOM_CSS: str = """
 """
 
 
+def _move_calendar(steps: int) -> None:
+    view: CalendarView = st.session_state.get("calendar_view") or "timeGridWeek"
+    anchor: date = st.session_state.get("calendar_anchor", date.today())
+    st.session_state.calendar_anchor = (
+        shift_anchor(view, anchor, steps) if steps else date.today()
+    )
+
+
+def render_navigation() -> tuple[CalendarView, date]:
+    """Renders the period controls and returns the visible view and date."""
+    st.session_state.setdefault("calendar_anchor", date.today())
+    col_1, col_2, col_3, _, col_4 = st.columns(
+        [1, 1, 1, 4, 3], vertical_alignment="center"
+    )
+    with col_1:
+        st.button("Hoje", on_click=_move_calendar, args=(0,), use_container_width=True)
+    with col_2:
+        st.button(
+            ":material/chevron_left:",
+            on_click=_move_calendar,
+            args=(-1,),
+            help="Período anterior",
+            use_container_width=True,
+        )
+    with col_3:
+        st.button(
+            ":material/chevron_right:",
+            on_click=_move_calendar,
+            args=(1,),
+            help="Próximo período",
+            use_container_width=True,
+        )
+    with col_4:
+        view: Optional[CalendarView] = st.segmented_control(
+            "Visualização",
+            options=list(CALENDAR_VIEWS),
+            default="timeGridWeek",
+            format_func=lambda v: CALENDAR_VIEWS[v],
+            key="calendar_view",
+            label_visibility="collapsed",
+        )
+    return view or "timeGridWeek", st.session_state.calendar_anchor
+
+
+def follow_visible_range(
+    calendar_callback: dict[str, Any], view: CalendarView, anchor: date
+) -> None:
+    """
+    Moves to the period the calendar reports as visible (`datesSet`, or the
+    view attached to the other callbacks) when it is not the loaded one.
+    """
+    payload = calendar_callback.get(calendar_callback.get("callback", ""), {})
+    visible = payload if "start" in payload else payload.get("view", {})
+    start, end = (
+        visible.get("activeStart", visible.get("start")),
+        visible.get("activeEnd", visible.get("end")),
+    )
+    if not start or not end:
+        return
+    first = datetime.fromisoformat(start.replace("Z", "+00:00")).date()
+    last = datetime.fromisoformat(end.replace("Z", "+00:00")).date()
+    loaded = visible_period(view, anchor)
+    # The reported end is exclusive.
+    if loaded[0] <= first and last - timedelta(days=1) <= loaded[1]:
+        return
+    logfire.info(f"USER-ACTION: Calendar moved to the period starting {first}")
+    st.session_state.calendar_anchor = first
+    st.rerun()
+
+
 def render() -> None:
     logfire.info("PAGE-RENDER: Rendering schedule page")
     st.set_page_config(
@@ -174,16 +276,23 @@ def render() -> None:
 
     navbar.render()
 
-    # Always get the latest events just before rendering the calendar
+    view, anchor = render_navigation()
+
     logfire.info("DATA-FETCH: Loading calendar events for schedule page")
-    calendar_events: list[dict[str, Any]] = get_calendar_events()
+    calendar_events: list[dict[str, Any]] = get_calendar_events(view, anchor)
     logfire.info(f"DATA-FETCH: Loaded {len(calendar_events)} calendar events")
 
     calendar_callback = calendar(
         events=calendar_events,
-        options=CALENDAR_OPTIONS,
+        options={
+            **CALENDAR_OPTIONS,
+            "initialView": view,
+            "initialDate": anchor.isoformat(),
+        },
         custom_css=CUSTOM_CSS,
+        callbacks=CALENDAR_CALLBACKS,
     )
+    follow_visible_range(calendar_callback, view, anchor)
 
     selected_event: dict[str, Any] | None = calendar_callback.get("eventClick", {}).get(
         "event", None
@@ -1,19 +1,258 @@
+import atexit
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
 import duckdb
 import logfire
 import streamlit as st
+from pydantic import BaseModel
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 from data import database
+from data.db_utils import WriteOutcome, WriteResult
+from data.remote import CallTarget, RemoteDatabase, parse_address
+from data.shard_router import ShardRouter
+from data.write_behind import WriteBehindQueue, WriteConflict, WriteFailure
+
+POOL_SIZE: int = 4
+POOL_CHECKOUT_TIMEOUT_SECONDS: float = 5.0
+# Each logged-in psychologist gets their own database file here; without a
+# login everything goes to `database.DB_PATH` as before.
+SHARDS_DIRECTORY: str = "data/shards"
+MAX_OPEN_SHARDS: int = 8
+# "local" opens the database files in this process; "remote" sends every
+# data-layer call to the database server (`db_server.py`), which lets several
+# app processes share the files DuckDB only allows one process to write.
+DATABASE_BACKEND: str = os.environ.get("PSICOLOGIA_DB_BACKEND", "local")
+DATABASE_SERVER_ADDRESS: str = os.environ.get(
+    "PSICOLOGIA_DB_ADDRESS", "data/db_server.sock"
+)
+# Shared secret of the database server (see `server_authkey`).
+DATABASE_SERVER_AUTHKEY_VARIABLE: str = "PSICOLOGIA_DB_AUTHKEY"
+MIN_SERVER_AUTHKEY_LENGTH: int = 16
+# Opt in with PSICOLOGIA_WRITE_BEHIND=1: UI saves then return as soon as they
+# are queued and a background writer group-commits them (see
+# `data.write_behind`). Queued writes live in the process that owns the
+# files, so remote clients always write through.
+WRITE_BEHIND_ENABLED: bool = (
+    DATABASE_BACKEND == "local" and os.environ.get("PSICOLOGIA_WRITE_BEHIND") == "1"
+)
+WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0
+# Background CHECKPOINTs of each open shard (see `data.maintenance`), run by
+# whichever process owns the files.
+MAINTENANCE_ENABLED: bool = DATABASE_BACKEND == "local"
+
+T = TypeVar("T")
 
 logfire.configure()
 
 
 @st.cache_resource()
-def get_db_connection() -> duckdb.DuckDBPyConnection:
-    return database.connect(database.DB_PATH)
+def get_shard_router() -> ShardRouter:
+    router = ShardRouter(
+        SHARDS_DIRECTORY,
+        default_path=database.DB_PATH,
+        max_open_shards=MAX_OPEN_SHARDS,
+        pool_size=POOL_SIZE,
+        checkout_timeout=POOL_CHECKOUT_TIMEOUT_SECONDS,
+        write_behind=WRITE_BEHIND_ENABLED,
+        maintenance=MAINTENANCE_ENABLED,
+    )
+    atexit.register(router.close, WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS)
+    return router
+
+
+def server_authkey() -> bytes:
+    """
+    Returns the database server's shared secret, set per deployment in
+    `PSICOLOGIA_DB_AUTHKEY`. There is no default: requests are unpickled, so
+    whoever holds the key can run code on the server.
+
+    Raises:
+        RuntimeError: If the key is missing or shorter than
+            `MIN_SERVER_AUTHKEY_LENGTH` characters.
+    """
+    authkey = os.environ.get(DATABASE_SERVER_AUTHKEY_VARIABLE, "")
+    if len(authkey) < MIN_SERVER_AUTHKEY_LENGTH:
+        raise RuntimeError(
+            f"Set {DATABASE_SERVER_AUTHKEY_VARIABLE} to a secret of at least "
+            f"{MIN_SERVER_AUTHKEY_LENGTH} characters, e.g. the output of "
+            "`python -c 'import secrets; print(secrets.token_hex(32))'`."
+        )
+    return authkey.encode()
+
+
+@st.cache_resource()
+def get_remote_database() -> RemoteDatabase:
+    remote = RemoteDatabase(parse_address(DATABASE_SERVER_ADDRESS), server_authkey())
+    atexit.register(remote.close)
+    return remote
+
+
+def run(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs the data-layer `function(connection, *args, **kwargs)` on the current
+    user's shard, in this process or on the database server.
+    """
+    return _run(CallTarget.SHARD, function, *args, **kwargs)
+
+
+def run_as(
+    user_email: Optional[str], function: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """
+    Like `run`, on the shard of `user_email`: for work off the script thread,
+    e.g. prefetching, where the logged-in user cannot be read.
+    """
+    if DATABASE_BACKEND == "remote":
+        return get_remote_database().call(user_email, function, *args, **kwargs)
+    with get_shard_router().lease(user_email) as shard:
+        with shard.pool.cursor() as cursor:
+            return function(cursor, *args, **kwargs)
+
+
+def run_analytics(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Like `run`, on the read-only analytics snapshot (see `analytics_cursor`)."""
+    return _run(CallTarget.ANALYTICS, function, *args, **kwargs)
+
+
+def run_clinic(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Like `run`, across every shard: `function(connection, catalogs, *args,
+    **kwargs)` (see `clinic_cursor`).
+    """
+    return _run(CallTarget.CLINIC, function, *args, **kwargs)
+
+
+def _run(
+    target: CallTarget, function: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    if DATABASE_BACKEND == "remote":
+        return get_remote_database().call(
+            current_user_email(), function, *args, target=target, **kwargs
+        )
+    if target == CallTarget.CLINIC:
+        with clinic_cursor() as (connection, catalogs):
+            return function(connection, catalogs, *args, **kwargs)
+    cursors = analytics_cursor if target == CallTarget.ANALYTICS else db_cursor
+    with cursors() as connection:
+        return function(connection, *args, **kwargs)
+
+
+def current_user_email() -> Optional[str]:
+    """Returns the email of the logged-in psychologist, if any."""
+    try:
+        if st.user.is_logged_in:
+            return st.user.email  # type: ignore
+    except Exception:
+        # Outside a script run, or authentication is not configured.
+        pass
+    return None
+
+
+def get_write_behind() -> WriteBehindQueue:
+    """Returns the write-behind queue of the current user's shard."""
+    return get_shard_router().shard(current_user_email()).write_behind  # type: ignore
+
+
+def current_session_id() -> Optional[str]:
+    """Returns the id of the Streamlit session running the script, if any."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else None
+
+
+def defer_write(
+    table: str,
+    field_map: dict[str, Any],
+    model: BaseModel,
+    expected_version: Optional[int] = None,
+    patch: bool = False,
+) -> Optional[WriteResult]:
+    """
+    Queues a write on the write-behind queue for the current session; see
+    `WriteBehindQueue.submit` for `expected_version` and `patch`.
+
+    Returns:
+        Optional[WriteResult]: A queued result, or None when write-behind is
+        disabled and the caller must write synchronously.
+    """
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    with get_shard_router().lease(current_user_email()) as shard:
+        shard.write_behind.submit(  # type: ignore
+            table,
+            field_map,
+            model,
+            current_session_id(),
+            expected_version=expected_version,
+            patch=patch,
+        )
+    return WriteResult(WriteOutcome.QUEUED)
+
+
+def take_write_conflicts() -> list[WriteConflict]:
+    """Returns the current session's queued writes refused as conflicts."""
+    if not WRITE_BEHIND_ENABLED:
+        return []
+    return get_write_behind().take_conflicts(current_session_id())
+
+
+def take_write_failures() -> list[WriteFailure]:
+    """Returns the current session's queued writes that could not be committed."""
+    if not WRITE_BEHIND_ENABLED:
+        return []
+    return get_write_behind().take_failures(current_session_id())
+
+
+def wait_for_own_writes() -> None:
+    """Read barrier: waits until the current session's queued writes are committed."""
+    if WRITE_BEHIND_ENABLED:
+        get_write_behind().wait_for_session(current_session_id())
+
+
+@contextmanager
+def db_cursor() -> Iterator[duckdb.DuckDBPyConnection]:
+    """Checks out a cursor on the current user's shard from its pool."""
+    with get_shard_router().lease(current_user_email()) as shard:
+        with shard.pool.cursor() as cursor:
+            yield cursor
+
+
+@contextmanager
+def analytics_cursor() -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Yields a read-only cursor on a recent snapshot of the current user's
+    shard, for heavy aggregate reports that must not compete with edits.
+    """
+    with get_shard_router().lease(current_user_email()) as shard:
+        with shard.analytics.cursor() as cursor:
+            yield cursor
+
+
+@contextmanager
+def clinic_cursor() -> Iterator[
+    tuple[duckdb.DuckDBPyConnection, dict[Optional[str], str]]
+]:
+    """
+    Attaches every psychologist's shard for a clinic-wide admin query; see
+    `ShardRouter.attach_all`.
+    """
+    with get_shard_router().attach_all() as attached:
+        yield attached
 
 
 def initialize_database() -> None:
-    logfire.info("APP-LOGIC: Initializing database schema.")
-    connection = get_db_connection()
-    database.initialize(connection)
-    logfire.info("APP-LOGIC: Database schema initialized successfully.")
+    """
+    Opens the current user's shard, which bootstraps its schema once per
+    process; later reruns skip the DDL. With the remote backend the server
+    does this and only the connection to it is opened here.
+    """
+    if DATABASE_BACKEND == "remote":
+        get_remote_database()
+        logfire.info(
+            f"APP-LOGIC: Using the database server at '{DATABASE_SERVER_ADDRESS}'."
+        )
+        return
+    with get_shard_router().lease(current_user_email()) as shard:
+        logfire.info(f"APP-LOGIC: Database ready at '{shard.path}'.")
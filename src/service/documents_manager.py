@@ -4,15 +4,14 @@ import logfire
 
 from data import documents
 from data.models.document_models import Document, DocumentCategory
-from service.database_manager import get_db_connection
+from service.database_manager import run
 
 logfire.configure()
 
 
 def get_all_documents_for(patient_id: UUID) -> list[Document]:
     logfire.info(f"SERVICE-OP: Fetching all documents for patient {patient_id}")
-    connection = get_db_connection()
-    docs = documents.get_all_for_patient_id(connection, patient_id)
+    docs = run(documents.get_all_for_patient_id, patient_id, trusted=True)
     logfire.info(
         f"SERVICE-OP: Retrieved {len(docs)} documents for patient {patient_id}"
     )
@@ -43,6 +42,5 @@ def insert_document(document: Document) -> None:
     logfire.info(
         f"SERVICE-OP: Inserting document {document.id} for patient {document.patient_id}"
     )
-    connection = get_db_connection()
-    documents.insert(connection, document)
+    run(documents.insert, document)
     logfire.info(f"SERVICE-OP: Successfully inserted document {document.id}")
@@ -1,28 +1,118 @@
+from typing import Optional
+
 import logfire
 
-from data import monthly_invoice
-from data.models.invoice_models import MonthlyInvoice
-from service.database_manager import get_db_connection
+from data import archive, monthly_invoice
+from data.archive import ArchiveResult
+from data.db_utils import WriteOutcome, WriteResult
+from data.models.invoice_models import (
+    InvoicePeriodSummary,
+    MonthlyInvoice,
+    PsychologistRevenue,
+)
+from service.database_manager import (
+    defer_write,
+    run,
+    run_analytics,
+    run_clinic,
+    wait_for_own_writes,
+)
+
+# Months kept in the live tables; older closed months are archived.
+ARCHIVE_RETENTION_MONTHS: int = archive.DEFAULT_RETENTION_MONTHS
 
 logfire.configure()
 
 
-def update_invoice_on_db(month_invoice: MonthlyInvoice) -> None:
+def update_invoice_on_db(
+    month_invoice: MonthlyInvoice, original: Optional[MonthlyInvoice] = None
+) -> WriteResult:
+    """
+    Saves an invoice unless it changed since it was read. Given the invoice as
+    it was before editing, only the changed columns are written (a patch).
+    """
     logfire.info(
         f"SERVICE-OP: Updating monthly invoice {month_invoice.id} for patient {month_invoice.patient_id}"
     )
-    connection = get_db_connection()
-    monthly_invoice.update(connection, month_invoice)
-    logfire.info(f"SERVICE-OP: Successfully updated monthly invoice {month_invoice.id}")
+    field_map = monthly_invoice.monthly_invoice_field_map(month_invoice)
+    if original is not None:
+        before = monthly_invoice.monthly_invoice_field_map(original)
+        field_map = {
+            column: value
+            for column, value in field_map.items()
+            if column == "id" or before[column] != value
+        }
+        if len(field_map) == 1:
+            logfire.info(f"SERVICE-OP: Monthly invoice {month_invoice.id} unchanged")
+            return WriteResult(WriteOutcome.APPLIED, month_invoice.row_version)
+
+    queued = defer_write(
+        "monthly_invoices",
+        field_map,
+        month_invoice,
+        expected_version=month_invoice.row_version,
+        patch=original is not None,
+    )
+    if queued:
+        logfire.info(f"SERVICE-OP: Queued update of monthly invoice {month_invoice.id}")
+        return queued
+    if original is None:
+        result = run(monthly_invoice.save, month_invoice)
+    else:
+        changes = {k: v for k, v in field_map.items() if k != "id"}
+        result = run(
+            monthly_invoice.patch, month_invoice.id, changes, month_invoice.row_version
+        )
+    if result.applied:
+        month_invoice.row_version = result.row_version
+    logfire.info(
+        f"SERVICE-OP: Update of monthly invoice {month_invoice.id}: {result.outcome.value}"
+    )
+    return result
 
 
 def get_monthly_invoices(chosen_month: int, chosen_year: int) -> list[MonthlyInvoice]:
     logfire.info(
         f"SERVICE-OP: Fetching monthly invoices for {chosen_month}/{chosen_year}"
     )
-    connection = get_db_connection()
-    invoices = monthly_invoice.get_all_in_period(connection, chosen_month, chosen_year)
+    wait_for_own_writes()
+    invoices = run(monthly_invoice.get_all_in_period, chosen_month, chosen_year)
     logfire.info(
         f"SERVICE-OP: Retrieved {len(invoices)} invoices for {chosen_month}/{chosen_year}"
     )
     return invoices
+
+
+def get_invoice_period_summary(month: int, year: int) -> InvoicePeriodSummary:
+    """Totals of a month's invoices, read from the analytics snapshot."""
+    logfire.info(f"SERVICE-OP: Summarizing invoices for {month}/{year}")
+    summary = run_analytics(monthly_invoice.get_period_summary, month, year)
+    logfire.info(
+        f"SERVICE-OP: Summarized {summary.invoice_count} invoices for {month}/{year}"
+    )
+    return summary
+
+
+def get_clinic_revenue(year: int) -> list[PsychologistRevenue]:
+    """Clinic-wide revenue per psychologist and month, across every shard."""
+    logfire.info(f"SERVICE-OP: Fetching clinic revenue for {year}")
+    revenue = run_clinic(monthly_invoice.get_clinic_revenue, year)
+    logfire.info(f"SERVICE-OP: Retrieved {len(revenue)} clinic revenue rows")
+    return revenue
+
+
+def is_period_archived(month: int, year: int) -> bool:
+    """Archived months are closed: shown, but no longer editable."""
+    return run(monthly_invoice.is_archived, month, year)
+
+
+def archive_closed_periods(
+    retention_months: int = ARCHIVE_RETENTION_MONTHS,
+) -> ArchiveResult:
+    """Archives the closed months older than `retention_months`."""
+    before = archive.retention_cutoff(retention_months)
+    logfire.info(f"SERVICE-OP: Archiving closed periods before {before}")
+    wait_for_own_writes()
+    result = run(archive.archive_closed_periods, before)
+    logfire.info(f"SERVICE-OP: Archived {result.rows} up to {result.archived_before}")
+    return result
@@ -2,41 +2,101 @@ from typing import Optional
 from uuid import UUID
 
 import logfire
-import streamlit as st
 
-from data import patient
-from data.models.patient_models import Patient
-from service.database_manager import get_db_connection
+from data import change_feed, patient
+from data.db_utils import WriteResult
+from data.entity_cache import entity_cache
+from data.models.patient_models import Patient, PatientPage, PatientStatus
+from service.database_manager import (
+    WRITE_BEHIND_ENABLED,
+    current_session_id,
+    defer_write,
+    get_write_behind,
+    run,
+    wait_for_own_writes,
+)
 
 logfire.configure()
 
 
-def update_patient_on_db(patient_: Patient) -> None:
+def update_patient_on_db(patient_: Patient) -> WriteResult:
+    """
+    Saves a patient unless it changed since it was read; a conflict is
+    returned (or, when queued, reported by `take_write_conflicts`).
+    """
     logfire.info(
         f"SERVICE-OP: Updating patient {patient_.info.name} (ID: {patient_.id}) in database"
     )
-    connection = get_db_connection()
-    patient.insert(connection, patient_)
-    logfire.info(f"SERVICE-OP: Successfully updated patient {patient_.info.name}")
+    queued = defer_write(
+        "patients",
+        patient.patient_field_map(patient_),
+        patient_,
+        expected_version=patient_.row_version,
+    )
+    if queued:
+        logfire.info(f"SERVICE-OP: Queued update of patient {patient_.info.name}")
+        return queued
+    result = run(patient.save, patient_)
+    if result.applied:
+        patient_.row_version = result.row_version
+    logfire.info(
+        f"SERVICE-OP: Update of patient {patient_.info.name}: {result.outcome.value}"
+    )
+    return result
+
 
+def get_patient_counts() -> dict[PatientStatus, int]:
+    """Number of patients per status, for the group headers of the list."""
+    logfire.info("SERVICE-OP: Counting patients by status")
+    wait_for_own_writes()
+    return run(patient.count_by_status)
 
-def get_all_patients(
-    are_active: bool = False, status: Optional[str] = None
+
+def get_patients_page(
+    status: PatientStatus, after: Optional[tuple[str, UUID]] = None
+) -> PatientPage:
+    """The next page of patients of `status`; see `patient.get_page`."""
+    logfire.info(f"SERVICE-OP: Fetching a page of {status} patients")
+    wait_for_own_writes()
+    page = run(patient.get_page, status, after, trusted=True)
+    logfire.info(f"SERVICE-OP: Retrieved {len(page.patients)} {status} patients")
+    return page
+
+
+def search_patients(
+    query: str, limit: int = patient.DEFAULT_SEARCH_LIMIT
 ) -> list[Patient]:
-    logfire.info(
-        f"SERVICE-OP: Fetching all patients (active: {are_active}, status: {status})"
-    )
-    connection = get_db_connection()
-    patients = patient.get_all(connection, are_active, status)
-    logfire.info(f"SERVICE-OP: Retrieved {len(patients)} patients from database")
+    """Patients matching `query` by name, CPF/CNPJ, tutor or school."""
+    logfire.info(f"SERVICE-OP: Searching patients for '{query}'")
+    wait_for_own_writes()
+    patients = run(patient.search, query, limit, trusted=True)
+    logfire.info(f"SERVICE-OP: Found {len(patients)} patients for '{query}'")
     return patients
 
 
-@st.cache_data(ttl=3600)
+def patients_changed_since(since: int) -> bool:
+    """Tells whether patients were written after change-feed position `since`."""
+    return change_feed.changes_since(since, ("patients",)) != []
+
+
+def get_patients_sequence() -> int:
+    """Returns the change-feed position to pass to `patients_changed_since` later."""
+    return change_feed.current_sequence()
+
+
 def get_patient_by_id(patient_id: UUID) -> Patient:
+    if WRITE_BEHIND_ENABLED:
+        pending = get_write_behind().pending("patients", current_session_id())
+        if patient_id in pending:
+            return pending[patient_id].model_copy(deep=True)  # type: ignore
+    return entity_cache.get_or_load(
+        "patients", patient_id, lambda: _load_patient_by_id(patient_id)
+    )
+
+
+def _load_patient_by_id(patient_id: UUID) -> Patient:
     logfire.info(f"SERVICE-OP: Fetching patient by ID: {patient_id}")
-    connection = get_db_connection()
-    patient_data = patient.get_by_id(connection, patient_id)
+    patient_data = run(patient.get_by_id, patient_id)
     logfire.info(
         f"SERVICE-OP: Retrieved patient {patient_data.info.name} (ID: {patient_id})"
     )
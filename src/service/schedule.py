@@ -1,32 +1,62 @@
+import calendar
 import uuid
-from datetime import date, datetime, timedelta
-from typing import Any
+from datetime import date, timedelta
+from typing import Any, Literal
 
 import logfire
-import streamlit as st
 
 from data import appointment, patient
+from data.db_utils import WriteResult
+from data.entity_cache import entity_cache
 from data.models.appointment_models import Appointment
-from data.models.patient_models import Patient
-from service.database_manager import get_db_connection
-from service.patient_manager import get_patient_by_id
+from data.models.patient_models import PatientSummaries
+from data.range_cache import RangeCache
+from service.database_manager import (
+    WRITE_BEHIND_ENABLED,
+    current_session_id,
+    current_user_email,
+    defer_write,
+    get_write_behind,
+    run,
+    run_as,
+    wait_for_own_writes,
+)
 from utils.helpers import get_week_days
 
+CalendarView = Literal["timeGridDay", "timeGridWeek", "dayGridMonth"]
+
+# Calendar events by (user, first day, last day), across sessions; any
+# appointment or patient write drops them.
+calendar_cache: RangeCache[list[dict[str, Any]]] = RangeCache(
+    ("appointments", "patients")
+)
+
 logfire.configure()
 
 
-@st.cache_data(ttl=3600)
 def get_appointment_from(selected_event: dict[str, Any]) -> Appointment:
-    logfire.info(
-        f"SERVICE-OP: Fetching appointment from selected event: {selected_event.get('id', 'unknown')}"
+    event_id = get_id_from_event(selected_event)
+    if WRITE_BEHIND_ENABLED:
+        pending = get_write_behind().pending("appointments", current_session_id())
+        if event_id in pending:
+            return pending[event_id].model_copy(deep=True)  # type: ignore
+    return entity_cache.get_or_load(
+        "appointments", event_id, lambda: _load_appointment(event_id)
     )
-    connection = get_db_connection()
-    event_id: uuid.UUID = get_id_from_event(selected_event)
-    appt = appointment.get_by_id(connection, event_id)
+
+
+def _load_appointment(event_id: uuid.UUID) -> Appointment:
+    logfire.info(f"SERVICE-OP: Fetching appointment from selected event: {event_id}")
+    appt = run(appointment.get_by_id, event_id)
     logfire.info(f"SERVICE-OP: Retrieved appointment {appt.id} for event {event_id}")
     return appt
 
 
+def is_appointment_archived(appt: Appointment) -> bool:
+    """Archived months are closed: their appointments are shown, but not editable."""
+    return run(appointment.is_archived, appt.appointment_date)
+
+
 def get_id_from_event(selected_event: dict[str, Any]) -> uuid.UUID:
     event_id: str | None = selected_event.get("id", None)
     if not event_id:
@@ -34,45 +64,56 @@ def get_id_from_event(selected_event: dict[str, Any]) -> uuid.UUID:
     return uuid.UUID(event_id)
 
 
-@st.cache_data(hash_funcs={Appointment: lambda a: a.id}, ttl=3600)
-def _turn_weekly_appointments_into_calendar_events(
-    appointments: list[Appointment],
-) -> list[dict[str, Any]]:
+def visible_period(view: CalendarView, anchor: date) -> list[date]:
     """
-    Converts a list of Appointment objects into a format suitable for the calendar.
+    First and last day the calendar shows in `view` around `anchor`, with
+    weeks starting on Monday; months span the six-week grid around them.
     """
-
-    @st.cache_data(hash_funcs={Appointment: lambda a: a.id}, ttl=3600)
-    def _turn_appointment_into_event(appt: Appointment) -> dict[str, Any]:
-        """
-        Converts a single Appointment object into a calendar event dictionary.
-        """
-        patient = get_patient_by_id(appt.patient_id)
-        patient_name = patient.info.name if patient else "Paciente desconhecido"
-        return {
-            "id": str(appt.id),
-            "title": f"{patient_name} ({appt.notes})" if appt.notes else patient_name,
-            "start": datetime.combine(
-                appt.appointment_date, appt.appointment_time
-            ).isoformat(),
-            "end": (
-                datetime.combine(appt.appointment_date, appt.appointment_time)
-                + timedelta(minutes=appt.duration)
-            ).isoformat(),
-            "allDay": False,
-        }
-
-    return [_turn_appointment_into_event(appt) for appt in appointments]
-
-
-def get_calendar_events() -> list[dict[str, Any]]:
-    """Returns a list of calendar events for a given period."""
-    logfire.info("SERVICE-OP: Fetching calendar events")
-    connection = get_db_connection()
-    appointments: list[Appointment] = appointment.get_all(connection)
-    events = _turn_weekly_appointments_into_calendar_events(appointments)
+    if view == "timeGridDay":
+        return [anchor, anchor]
+    if view == "timeGridWeek":
+        monday = anchor - timedelta(days=anchor.weekday())
+        return [monday, monday + timedelta(days=6)]
+    first = anchor.replace(day=1)
+    grid_start = first - timedelta(days=first.weekday())
+    return [grid_start, grid_start + timedelta(days=41)]
+
+
+def shift_anchor(view: CalendarView, anchor: date, steps: int) -> date:
+    """Moves `anchor` by `steps` days, weeks or months, following `view`."""
+    if view == "timeGridDay":
+        return anchor + timedelta(days=steps)
+    if view == "timeGridWeek":
+        return anchor + timedelta(weeks=steps)
+    months = anchor.year * 12 + anchor.month - 1 + steps
+    year, month = divmod(months, 12)
+    day = min(anchor.day, calendar.monthrange(year, month + 1)[1])
+    return date(year, month + 1, day)
+
+
+def get_calendar_events(view: CalendarView, anchor: date) -> list[dict[str, Any]]:
+    """
+    Returns the calendar events the calendar shows in `view` around `anchor`,
+    and prefetches the periods before and after it in the background.
+    """
+    logfire.info(f"SERVICE-OP: Fetching calendar events for {view} at {anchor}")
+    wait_for_own_writes()
+    user_email = current_user_email()
+    period = visible_period(view, anchor)
+    events = calendar_cache.get_or_load(
+        (user_email, *period), lambda: run(appointment.get_calendar_events, period)
+    )
+    for steps in (-1, 1):
+        neighbour = visible_period(view, shift_anchor(view, anchor, steps))
+        calendar_cache.prefetch(
+            (user_email, *neighbour),
+            lambda neighbour=neighbour: run_as(
+                user_email, appointment.get_calendar_events, neighbour
+            ),
+        )
     logfire.info(
-        f"SERVICE-OP: Generated {len(events)} calendar events from {len(appointments)} appointments"
+        f"SERVICE-OP: Retrieved {len(events)} calendar events "
+        f"from {period[0]} to {period[1]}"
     )
     return events
 
@@ -80,38 +121,47 @@ def get_calendar_events() -> list[dict[str, Any]]:
 def copy_appointments_for_next_week() -> None:
     """Copies all appointments for the current week to the next week."""
     logfire.info("SERVICE-OP: Copying appointments for next week")
-    connection = get_db_connection()
-    next_week_appointments: list[Appointment] = appointment.get_all(
-        connection, period=get_week_days(date.today() + timedelta(days=7))
+    copied = run(
+        appointment.copy_week,
+        get_week_days(date.today()),
+        get_week_days(date.today() + timedelta(days=7)),
     )
-    this_week_appointments: list[Appointment] = appointment.get_all(
-        connection, period=get_week_days(date.today())
-    )
-    if next_week_appointments:
+    if not copied:
         logfire.info("SERVICE-OP: Next week already has appointments, skipping copy")
         return
-    logfire.info(
-        f"SERVICE-OP: Copying {len(this_week_appointments)} appointments to next week"
-    )
-    for appt in this_week_appointments:
-        appt.id = uuid.uuid4()
-        appt.appointment_date += timedelta(days=7)
-        appointment.insert(connection, appt)
-    logfire.info("SERVICE-OP: Successfully copied appointments to next week")
+    logfire.info(f"SERVICE-OP: Successfully copied {copied} appointments to next week")
 
 
-def get_patients() -> list[Patient] | None:
+def get_patients() -> PatientSummaries:
+    """Active patients for the appointment picker."""
     logfire.info("SERVICE-OP: Fetching active patients for schedule")
-    connection = get_db_connection()
-    patients = patient.get_all(connection, are_active=True)
-    logfire.info(f"SERVICE-OP: Retrieved {len(patients)} active patients")
+    patients = run(patient.get_summaries, are_active=True)
+    logfire.info(f"SERVICE-OP: Retrieved {len(patients.items)} active patients")
     return patients
 
 
-def update_appointment(appt: Appointment) -> None:
+def update_appointment(appt: Appointment) -> WriteResult:
+    """
+    Saves an appointment unless it changed since it was read; a conflict is
+    returned (or, when queued, reported by `take_write_conflicts`).
+    """
     logfire.info(
         f"SERVICE-OP: Updating appointment {appt.id} for patient {appt.patient_id}"
     )
-    connection = get_db_connection()
-    appointment.insert(connection, appt)
-    logfire.info(f"SERVICE-OP: Successfully updated appointment {appt.id}")
+    if WRITE_BEHIND_ENABLED and is_appointment_archived(appt):
+        # Queued writes skip `appointment.save`, which refuses these itself.
+        raise ValueError(f"Appointment {appt.id} is in an archived month.")
+    queued = defer_write(
+        "appointments",
+        appointment.appointment_field_map(appt),
+        appt,
+        expected_version=appt.row_version,
+    )
+    if queued:
+        logfire.info(f"SERVICE-OP: Queued update of appointment {appt.id}")
+        return queued
+    result = run(appointment.save, appt)
+    if result.applied:
+        appt.row_version = result.row_version
+    logfire.info(f"SERVICE-OP: Update of appointment {appt.id}: {result.outcome.value}")
+    return result
@@ -1,18 +1,22 @@
 import logfire
-import streamlit as st
 
 from data import psychologist_settings
+from data.entity_cache import entity_cache
 from data.models.psychologist_settings_models import PsychologistSettings
-from service.database_manager import get_db_connection
+from service.database_manager import run
 
 logfire.configure()
 
 
-@st.cache_data(ttl=3600)
 def get_by_(email: str) -> PsychologistSettings:
+    return entity_cache.get_or_load(
+        "psychologist_settings", email, lambda: _load_by_(email)
+    )
+
+
+def _load_by_(email: str) -> PsychologistSettings:
     logfire.info(f"SERVICE-OP: Fetching psychologist settings for email: {email}")
-    connection = get_db_connection()
-    settings = psychologist_settings.get_by_email(connection, email)
+    settings = run(psychologist_settings.get_by_email, email)
     logfire.info(f"SERVICE-OP: Retrieved settings for email: {email}")
     return settings
 
@@ -21,8 +25,7 @@ def insert(settings: PsychologistSettings) -> None:
     logfire.info(
         f"SERVICE-OP: Inserting psychologist settings for email: {settings.user_email}"
     )
-    connection = get_db_connection()
-    psychologist_settings.insert(connection, settings)
+    run(psychologist_settings.insert, settings)
     logfire.info(
         f"SERVICE-OP: Successfully inserted settings for email: {settings.user_email}"
     )